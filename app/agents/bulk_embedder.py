@@ -0,0 +1,103 @@
+# app/agents/bulk_embedder.py
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+import numpy as np
+
+from app.config.enhanced_config import get_config
+
+logger = logging.getLogger(__name__)
+
+_worker_embedder = None  # set in each pool process by _init_worker
+_pools = {}
+_lock = threading.Lock()
+_atexit_registered = False
+
+def _init_worker(model_name, backend, threads):
+    global _worker_embedder
+    # Cap per-process math threads before torch / onnxruntime create their pools,
+    # otherwise N processes x N threads oversubscribe the cores
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    from app.agents.rag_registry import _load_embedder
+    if backend == "torch":
+        import torch
+        torch.set_num_threads(threads)
+    _worker_embedder = _load_embedder(model_name, backend, threads=threads)
+
+def _embed_chunk(documents):
+    return np.asarray(_worker_embedder(documents), dtype=np.float32)
+
+class BulkEmbedder:
+    """Embedding function that spreads a batch over a pool of processes, one model copy each.
+
+    Documents are cut into embed_batch_size chunks and sent out with imap, so
+    vectors come back in input order and the caller's upserts stay aligned with
+    its ids. Meant for full rebuilds: pass whole pages, not single texts.
+    """
+
+    def __init__(self, model_name: str, backend: str, workers: int = None, chunk_size: int = None):
+        self.model_name = model_name
+        self.backend = backend
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size or get_config().rag.embed_batch_size
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        started = time.perf_counter()
+        self.pool = multiprocessing.get_context("spawn").Pool(
+            self.workers, initializer=_init_worker, initargs=(model_name, backend, threads)
+        )
+        # One tiny chunk per worker so model loading is not billed to the first page
+        self.pool.map(_embed_chunk, [["warm-up"]] * self.workers, chunksize=1)
+        self.startup_seconds = time.perf_counter() - started
+        self.texts = 0
+        self.seconds = 0.0
+        logger.info(f"Bulk embedder ready: {self.workers} processes x {threads} threads "
+                    f"({self.startup_seconds:.1f}s to load {model_name})")
+
+    def __call__(self, input):
+        started = time.perf_counter()
+        chunks = [input[i:i + self.chunk_size] for i in range(0, len(input), self.chunk_size)]
+        vectors = []
+        for block in self.pool.imap(_embed_chunk, chunks):
+            vectors.extend(block)
+        self.seconds += time.perf_counter() - started
+        self.texts += len(input)
+        return vectors
+
+    def name(self) -> str:
+        return f"bulk:{self.model_name}:{self.backend}"
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def get_stats(self):
+        return {
+            "workers": self.workers,
+            "startup_seconds": round(self.startup_seconds, 2),
+            "texts": self.texts,
+            "seconds": round(self.seconds, 2),
+            "texts_per_second": round(self.texts / self.seconds, 1) if self.seconds else None
+        }
+
+def get_bulk_embedder(model_name: str, backend: str, workers: int = None) -> BulkEmbedder:
+    """Shared pool for (model, backend, workers); kept between calls so time-boxed rebuild steps reuse it"""
+    global _atexit_registered
+    workers = workers or os.cpu_count() or 1
+    key = (model_name, backend, workers)
+    with _lock:
+        if key not in _pools:
+            _pools[key] = BulkEmbedder(model_name, backend, workers)
+            if not _atexit_registered:
+                atexit.register(close_bulk_embedders)
+                _atexit_registered = True
+        return _pools[key]
+
+def close_bulk_embedders():
+    with _lock:
+        for embedder in _pools.values():
+            embedder.close()
+        _pools.clear()
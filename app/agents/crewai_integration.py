@@ -166,6 +166,8 @@ from crewai.tools import tool
 from crewai import LLM
 from app.models.sample_data import SampleUser, SampleUserTask
 from app.agents.rag_agent import index_task_history, retrieve_similar_tasks
+from app.agents.rag_registry import start_warmup
+from app.config.enhanced_config import get_config
 from app.utils.task_utils import update_task_assignment
 
 logging.basicConfig(level=logging.INFO)
@@ -390,8 +392,13 @@ class TaskCrew:
         self.agents = self._create_agents()
         # Initialize RAG system
         try:
-            index_task_history()
-            logger.info("RAG system initialized successfully")
+            if get_config().rag.warmup_on_start:
+                # Model, index and history sync load in the background; early callers wait for it
+                start_warmup(sync_history=True)
+                logger.info("RAG warm-up started")
+            else:
+                index_task_history()
+                logger.info("RAG system initialized successfully")
         except Exception as e:
             logger.error(f"RAG initialization failed: {e}")
 
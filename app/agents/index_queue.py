@@ -0,0 +1,213 @@
+# app/agents/index_queue.py
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from app.config.enhanced_config import get_config
+from app.utils.async_processor import async_processor, TaskPriority
+
+logger = logging.getLogger(__name__)
+
+TASK_HISTORY_FILE = "app/data/task_history.json"
+
+def append_task_history(tasks, history_file=TASK_HISTORY_FILE):
+    """Append completed tasks to task_history.json with a single rewrite"""
+    try:
+        with open(history_file, "r") as f:
+            history = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        history = []
+
+    for task in tasks:
+        history.append({
+            "task_id": task.task_id,
+            "name": task.name,
+            "user_id": task.user_id,
+            "required_skills": task.required_skills,
+            "outcome": "success",
+            "completed_at": task.completed_at.isoformat() if task.completed_at else datetime.now().isoformat(),
+            "duration": (task.completed_at - task.started_at).days if task.started_at and task.completed_at else 0
+        })
+
+    os.makedirs(os.path.dirname(history_file), exist_ok=True)
+    tmp = f"{history_file}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp, history_file)
+
+class IndexQueue:
+    """Coalesces task completions into batched RAG upserts run on the AsyncProcessor.
+
+    A burst of completions becomes one flush: either flush_seconds after the first
+    pending completion, or as soon as max_batch task ids are waiting. Task ids are
+    de-duplicated while pending, and the flush reads the current task state from
+    MongoDB, so repeated edits of one task cost a single embedding.
+    """
+
+    def __init__(self, flush_seconds: float = None, max_batch: int = None, processor=async_processor):
+        rag_config = get_config().rag
+        self.flush_seconds = flush_seconds if flush_seconds is not None else rag_config.index_flush_seconds
+        self.max_batch = max_batch or rag_config.index_flush_batch
+        self.processor = processor
+        self._pending = OrderedDict()  # task_id -> time first enqueued
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one flush at a time (timer, size trigger, drain)
+        self._timer = None
+        self._submitted = False
+        self._atexit_registered = False
+        self.flushes = 0
+        self.indexed = 0
+        self.failures = 0
+        self.last_flush_at = None
+        self.last_flush_lag = 0.0
+        self.max_flush_lag = 0.0
+
+    def enqueue(self, task_id: str):
+        """Schedule a completed task for indexing and history append; returns immediately"""
+        with self._lock:
+            self._pending.setdefault(task_id, time.time())
+            if not self._atexit_registered:
+                atexit.register(self.drain)
+                self._atexit_registered = True
+            if len(self._pending) >= self.max_batch:
+                self._submit_locked()
+            elif self._timer is None and not self._submitted:
+                self._timer = threading.Timer(self.flush_seconds, self._on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            if self._pending:
+                self._submit_locked()
+
+    def _submit_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._submitted:
+            return
+        self._submitted = True
+        self.processor.start()
+        self.processor.submit_task(self._flush_job, priority=TaskPriority.HIGH)
+
+    def _flush_job(self):
+        with self._lock:
+            self._submitted = False
+        return self.flush()
+
+    def flush(self):
+        """Index everything pending now, in batches of max_batch; returns counts"""
+        totals = {"tasks": 0, "upserted": 0, "skipped": 0}
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = OrderedDict()
+                    while self._pending and len(batch) < self.max_batch:
+                        task_id, enqueued_at = self._pending.popitem(last=False)
+                        batch[task_id] = enqueued_at
+                if not batch:
+                    break
+                try:
+                    result = self._index_batch(list(batch))
+                except Exception as e:
+                    # Put the batch back (keeping its enqueue times) and retry on the next trigger
+                    logger.error(f"Indexing flush failed for {len(batch)} tasks: {e}")
+                    self.failures += 1
+                    with self._lock:
+                        for task_id, enqueued_at in batch.items():
+                            self._pending.setdefault(task_id, enqueued_at)
+                        if self._timer is None and not self._submitted:
+                            self._timer = threading.Timer(self.flush_seconds, self._on_timer)
+                            self._timer.daemon = True
+                            self._timer.start()
+                    break
+
+                now = time.time()
+                self.flushes += 1
+                self.indexed += result["tasks"]
+                self.last_flush_at = now
+                self.last_flush_lag = now - min(batch.values())
+                self.max_flush_lag = max(self.max_flush_lag, self.last_flush_lag)
+                for key in totals:
+                    totals[key] += result[key]
+        if totals["tasks"]:
+            logger.info(f"Indexing queue flushed {totals['tasks']} tasks ({totals['upserted']} upserted)")
+        return totals
+
+    def _index_batch(self, task_ids):
+        from app.models.sample_data import SampleUserTask
+        from app.agents.rag_registry import get_rag_system
+
+        tasks = list(SampleUserTask.objects(task_id__in=task_ids, status='completed'))
+        result = {"tasks": len(tasks), "upserted": 0, "skipped": len(task_ids) - len(tasks)}
+        if not tasks:
+            return result
+
+        rag_system = get_rag_system()
+        if rag_system is None:
+            raise RuntimeError("RAG system not initialized")
+        result["upserted"] = rag_system.index_tasks(tasks)["upserted"]
+        self._index_migration_target(tasks)
+        append_task_history(tasks)
+        return result
+
+    def _index_migration_target(self, tasks):
+        """Dual-write into the collection a model migration is building"""
+        from app.agents.rag_migration import target_system
+        try:
+            target = target_system()
+            if target is not None:
+                target.index_tasks(tasks)
+        except Exception as e:
+            # Not fatal: the migration's catch-up sync picks these tasks up before cutover
+            logger.warning(f"Indexing into the migration target failed: {e}")
+
+    def drain(self, timeout: float = 60.0):
+        """Flush synchronously until nothing is pending (called on shutdown)"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        deadline = time.time() + timeout
+        while self.pending_count() and time.time() < deadline:
+            before = self.failures
+            self.flush()
+            if self.failures != before:
+                break
+        remaining = self.pending_count()
+        if remaining:
+            logger.warning(f"Indexing queue shut down with {remaining} tasks not indexed")
+        return remaining
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def freshness_lag(self) -> float:
+        """Seconds the oldest completed-but-unindexed task has been waiting (0 when caught up)"""
+        with self._lock:
+            if not self._pending:
+                return 0.0
+            return time.time() - min(self._pending.values())
+
+    def get_stats(self):
+        return {
+            "pending": self.pending_count(),
+            "freshness_lag_seconds": round(self.freshness_lag(), 3),
+            "last_flush_lag_seconds": round(self.last_flush_lag, 3),
+            "max_flush_lag_seconds": round(self.max_flush_lag, 3),
+            "flushes": self.flushes,
+            "indexed": self.indexed,
+            "failures": self.failures,
+            "last_flush_at": datetime.fromtimestamp(self.last_flush_at).isoformat() if self.last_flush_at else None
+        }
+
+# Global indexing queue instance
+index_queue = IndexQueue()
@@ -11,6 +11,8 @@ from crewai import Agent, Task, Crew, LLM
 from crewai.tools import tool
 from app.models.sample_data import SampleUser, SampleUserTask
 from app.chatbot.cli_chatbot import TaskCLI
+from app.utils.cycle_metrics import last_cycle_summary
+from app.utils.deadline_index import deadline_index
 
 # Define tools at module level (outside any class)
 @tool
@@ -260,7 +262,8 @@ def system_status_tool(query: str = "") -> str:
                     "in_progress": in_progress_tasks,
                     "completed": completed_tasks
                 }
-            }
+            },
+            "last_supervisor_cycle": last_cycle_summary()
         })
     except Exception as e:
         return json.dumps({"error": f"Failed to get system status: {str(e)}"})
@@ -298,14 +301,14 @@ def assign_all_pending_tasks_tool(query: str = "") -> str:
 @tool
 def show_overdue_tasks_tool(query: str = "") -> str:
     """shows all overdue tasks to reassign"""
-    now = datetime.now()
-    overdue_tasks = SampleUserTask.objects(due_date__lt=now, status__nin=['completed', 'blocked'])
+    # Answered from the in-memory deadline index, no Mongo scan
+    overdue_tasks = deadline_index.overdue(exclude=['completed', 'blocked'])
     tasks_data = [{
-        "task_id": t.task_id,
-        "name": t.name,
-        "assigned_to": t.user_id or "Unassigned",
-        "due_date": t.due_date.strftime("%Y-%m-%d") if t.due_date else "N/A",
-        "status": t.status
+        "task_id": t["task_id"],
+        "name": t["name"],
+        "assigned_to": t["user_id"] or "Unassigned",
+        "due_date": t["due_date"].strftime("%Y-%m-%d") if t["due_date"] else "N/A",
+        "status": t["status"]
     } for t in overdue_tasks]
     return json.dumps({
         "action": "show_overdue_tasks",
@@ -364,42 +367,14 @@ def mark_overdue_tasks_failed(query: str = "") -> str:
     Returns a JSON object with the list of updated task IDs and a count.
     Use when the user says: "Mark all overdue tasks as failed" or similar.
     """
-    from datetime import datetime
-    from app.models.sample_data import SampleUserTask
-    import json
-
-    now = datetime.now()
-    overdue_tasks = SampleUserTask.objects(
-        due_date__lt=now,
-        status__nin=['completed', 'failed', 'blocked']
-    )
-    updated = []
-    for task in overdue_tasks:
-        task.status = 'failed'
-        task.save()
-        updated.append(task.task_id)
-    return json.dumps({
-        "action": "mark_overdue_failed",
-        "updated_tasks": updated,
-        "total_failed": len(updated)
-    })
-
-@tool
-def mark_overdue_tasks_failed(query: str = "") -> str:
-    """
-    Mark all overdue, incomplete tasks as failed.
-    Returns a JSON object with the list of updated task IDs and a count.
-    Use when the user says: "Mark all overdue tasks as failed" or similar.
-    """
-    from datetime import datetime
     from app.models.sample_data import SampleUserTask
     import json
 
-    now = datetime.now()
+    overdue_ids = deadline_index.overdue_task_ids(exclude=['completed', 'failed', 'blocked'])
+    # The in-memory index can lag other processes; re-check the status in Mongo
     overdue_tasks = SampleUserTask.objects(
-        due_date__lt=now,
-        status__nin=['completed', 'failed', 'blocked']
-    )
+        task_id__in=overdue_ids, status__nin=['completed', 'failed', 'blocked']
+    ) if overdue_ids else []
     updated = []
     for task in overdue_tasks:
         task.status = 'failed'
@@ -751,6 +726,9 @@ def confirm_edit_task_tool(confirm_query: str) -> str:
 
     setattr(task, field, new_value if field != "required_skills" else json.loads(new_value))
     task.save()
+    if field in ("name", "required_skills", "priority", "task_type"):
+        from app.agents.rag_agent import precompute_query_embedding
+        precompute_query_embedding(task)
     return json.dumps({
         "action": "edit_task_success",
         "task_id": task_id,
@@ -975,9 +953,14 @@ class ConversationalTaskOrchestrator:
 
         elif action == 'system_status':
             stats = data.get('statistics', {})
-            return f"""**System Status:**
+            response = f"""**System Status:**
 • Users: {stats.get('users', {}).get('available', 0)}/{stats.get('users', {}).get('total', 0)} available
 • Tasks: {stats.get('tasks', {}).get('pending', 0)} pending, {stats.get('tasks', {}).get('in_progress', 0)} in progress, {stats.get('tasks', {}).get('completed', 0)} completed"""
+            cycle = data.get('last_supervisor_cycle')
+            if cycle:
+                phases = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in cycle.get('phases', {}).items())
+                response += f"\n• Last supervisor cycle: {cycle.get('duration_seconds', 0):.2f}s ({phases})"
+            return response
 
         return str(data)
 
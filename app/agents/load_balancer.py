@@ -0,0 +1,184 @@
+# app/agents/load_balancer.py
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+from app.models.sample_data import SampleUser, SampleUserTask
+from app.utils.dsa_utils import skill_match_score
+from app.utils.deadline_index import deadline_index
+from app.utils.task_utils import reserve_user_capacity, release_user_capacity
+
+logger = logging.getLogger(__name__)
+
+OVERLOAD_THRESHOLD = 0.9
+UNDERUSE_THRESHOLD = 0.3
+MAX_MOVES_PER_CYCLE = 5
+
+def utilization_buckets(overload=OVERLOAD_THRESHOLD, underuse=UNDERUSE_THRESHOLD):
+    """Classify available users by utilization in a single server-side aggregation"""
+    pipeline = [
+        {'$match': {'availability_status': 'available', 'max_concurrent_tasks': {'$gt': 0}}},
+        {'$project': {
+            '_id': 0,
+            'user_id': 1,
+            'username': 1,
+            'skills': 1,
+            'current_ongoing_tasks': 1,
+            'max_concurrent_tasks': 1,
+            'utilization': {'$divide': ['$current_ongoing_tasks', '$max_concurrent_tasks']}
+        }},
+        {'$facet': {
+            'overloaded': [
+                {'$match': {'utilization': {'$gte': overload}}},
+                {'$sort': {'utilization': -1}}
+            ],
+            'underutilized': [
+                {'$match': {'utilization': {'$lte': underuse}}},
+                {'$sort': {'utilization': 1}}
+            ],
+            # Same edges as the two lists above ($bucket would put a user at exactly `underuse` in the middle)
+            'distribution': [
+                {'$group': {
+                    '_id': {'$switch': {
+                        'branches': [
+                            {'case': {'$lte': ['$utilization', underuse]}, 'then': 'underutilized'},
+                            {'case': {'$lt': ['$utilization', overload]}, 'then': 'balanced'},
+                            {'case': {'$lte': ['$utilization', 1]}, 'then': 'overloaded'}
+                        ],
+                        'default': 'over_capacity'
+                    }},
+                    'count': {'$sum': 1}
+                }}
+            ]
+        }}
+    ]
+    result = next(iter(SampleUser.objects.aggregate(pipeline)), None) or {}
+    return {
+        'overloaded': result.get('overloaded', []),
+        'underutilized': result.get('underutilized', []),
+        'distribution': {str(b['_id']): b['count'] for b in result.get('distribution', [])}
+    }
+
+def plan_rebalance(buckets=None, max_moves=MAX_MOVES_PER_CYCLE,
+                   overload=OVERLOAD_THRESHOLD, underuse=UNDERUSE_THRESHOLD):
+    """Propose moves of in_progress tasks from overloaded users to qualified underutilized users"""
+    buckets = buckets or utilization_buckets(overload, underuse)
+    sources = buckets['overloaded']
+    targets = buckets['underutilized']
+    if not sources or not targets:
+        return []
+
+    # Projected load per user, updated as moves are planned
+    load = {u['user_id']: u['current_ongoing_tasks'] for u in sources + targets}
+    capacity = {u['user_id']: u['max_concurrent_tasks'] for u in sources + targets}
+
+    tasks_by_user = defaultdict(list)
+    for task in SampleUserTask.objects(
+            status='in_progress', user_id__in=[u['user_id'] for u in sources]
+    ).only('task_id', 'name', 'user_id', 'required_skills', 'progress').order_by('progress'):
+        tasks_by_user[task.user_id].append(task)
+
+    moves = []
+    for source in sources:
+        # Least progressed tasks first: they lose the least when changing hands
+        for task in tasks_by_user[source['user_id']]:
+            if len(moves) >= max_moves:
+                return moves
+            if load[source['user_id']] / capacity[source['user_id']] < overload:
+                break
+
+            best = None
+            for target in targets:
+                # Judge the target after the move, so a rebalance never creates a new overloaded user
+                if (load[target['user_id']] + 1) / capacity[target['user_id']] >= overload:
+                    continue
+                score = skill_match_score(target.get('skills') or {}, task.required_skills)
+                if score > 0 and (best is None or score > best[1]):
+                    best = (target, score)
+            if best is None:
+                continue
+
+            target, score = best
+            load[source['user_id']] -= 1
+            load[target['user_id']] += 1
+            moves.append({
+                'task_id': task.task_id,
+                'task_name': task.name,
+                'from_user': source['user_id'],
+                'to_user': target['user_id'],
+                'match_score': score
+            })
+    return moves
+
+def execute_moves(moves):
+    """Commit planned moves: reserve a slot with each target, then move the tasks in one bulk write"""
+    if not moves:
+        return []
+
+    # Atomic check-and-increment: assignments since planning may have filled the target
+    reserved = [m for m in moves if reserve_user_capacity(m['to_user'])]
+    if not reserved:
+        logger.info(f"Rebalance applied 0/{len(moves)} planned moves (targets at capacity)")
+        return []
+
+    now = datetime.now(timezone.utc)
+    task_ops = [
+        UpdateOne(
+            # Only move tasks still held by the planned source user
+            {'task_id': m['task_id'], 'user_id': m['from_user'], 'status': 'in_progress'},
+            {
+                '$set': {'user_id': m['to_user'], 'updated_at': now},
+                '$inc': {'reassigned_count': 1},
+                '$push': {'assignment_log': {
+                    'timestamp': now,
+                    'action': 'reassigned',
+                    'details': {
+                        'from': m['from_user'],
+                        'to': m['to_user'],
+                        'method': 'rebalance',
+                        'reason': f"Workload rebalance (match score {m['match_score']})"
+                    }
+                }}
+            }
+        ) for m in reserved
+    ]
+    SampleUserTask._get_collection().bulk_write(task_ops, ordered=False)
+
+    planned = {m['task_id']: m for m in reserved}
+    applied = []
+    for task in SampleUserTask.objects(task_id__in=list(planned)).only(
+            'task_id', 'name', 'user_id', 'status', 'due_date'):
+        move = planned[task.task_id]
+        if task.user_id == move['to_user']:
+            applied.append(move)
+            deadline_index.track(task)
+
+    # The source frees a slot for every move that landed; the rest hand the target's slot back
+    landed = {move['task_id'] for move in applied}
+    for move in reserved:
+        release_user_capacity(move['from_user'] if move['task_id'] in landed else move['to_user'])
+
+    logger.info(f"Rebalance applied {len(applied)}/{len(moves)} planned moves")
+    return applied
+
+def rebalance(dry_run=True, max_moves=MAX_MOVES_PER_CYCLE):
+    """Compute utilization buckets, plan moves and (unless dry_run) commit them"""
+    buckets = utilization_buckets()
+    moves = plan_rebalance(buckets, max_moves=max_moves)
+    applied = [] if dry_run else execute_moves(moves)
+    return {
+        'dry_run': dry_run,
+        'distribution': buckets['distribution'],
+        'overloaded': [
+            {k: u[k] for k in ('user_id', 'username', 'current_ongoing_tasks', 'max_concurrent_tasks')}
+            for u in buckets['overloaded']
+        ],
+        'underutilized': [
+            {k: u[k] for k in ('user_id', 'username', 'current_ongoing_tasks', 'max_concurrent_tasks')}
+            for u in buckets['underutilized']
+        ],
+        'planned_moves': moves,
+        'applied_moves': applied
+    }
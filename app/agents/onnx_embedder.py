@@ -0,0 +1,83 @@
+# app/agents/onnx_embedder.py
+import logging
+import os
+import threading
+from typing import List
+
+import numpy as np
+from chromadb.api.types import EmbeddingFunction
+
+logger = logging.getLogger(__name__)
+
+ONNX_MODEL_NAME = "all-MiniLM-L6-v2"  # the only model chromadb ships as ONNX
+MAX_TOKENS = 256  # same truncation as the sentence-transformers model
+BATCH_SIZE = 32
+
+def _onnx_model_dir() -> str:
+    """Download (once) chromadb's ONNX export of all-MiniLM-L6-v2 and return its folder"""
+    from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+    reference = ONNXMiniLM_L6_V2()
+    reference(["warm up"])  # triggers the download and extraction when missing
+    return os.path.join(str(reference.DOWNLOAD_PATH), reference.EXTRACTED_FOLDER_NAME)
+
+def _quantized_model(model_dir: str) -> str:
+    """int8 (dynamic, weights only) copy of model.onnx, created next to it on first use"""
+    source = os.path.join(model_dir, "model.onnx")
+    target = os.path.join(model_dir, "model_int8.onnx")
+    if not os.path.exists(target):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        logger.info(f"Quantizing {source} to int8")
+        tmp = f"{target}.{os.getpid()}.tmp"
+        quantize_dynamic(source, tmp, weight_type=QuantType.QInt8)
+        os.replace(tmp, target)
+    return target
+
+class OnnxMiniLMEmbeddingFunction(EmbeddingFunction):
+    """all-MiniLM-L6-v2 on ONNX Runtime: mean pooling + L2 norm, like the PyTorch model.
+
+    quantized=False gives vectors matching SentenceTransformerEmbeddingFunction to
+    float rounding, so it can serve the existing collection. quantized=True uses
+    int8 weights; its vectors drift slightly, so callers keep it in a separate
+    collection (see rag_registry.embedding_identity).
+    """
+
+    def __init__(self, quantized: bool = False, threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = _onnx_model_dir()
+        model_path = _quantized_model(model_dir) if quantized else os.path.join(model_dir, "model.onnx")
+        self.quantized = quantized
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_TOKENS)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self._lock = threading.Lock()  # the tokenizer's padding/truncation state is shared
+
+    def _forward(self, texts: List[str]) -> np.ndarray:
+        with self._lock:
+            encoded = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        hidden = self.session.run(None, feeds)[0]  # (batch, tokens, 384)
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        vectors = [self._forward(input[i:i + BATCH_SIZE]) for i in range(0, len(input), BATCH_SIZE)]
+        return list(np.concatenate(vectors).astype(np.float32)) if vectors else []
+
+    def name(self) -> str:
+        return "onnx_mini_lm_l6_v2_int8" if self.quantized else "onnx_mini_lm_l6_v2"
@@ -0,0 +1,100 @@
+# app/agents/quantization.py
+import numpy as np
+
+SCORE_CHUNK = 65536  # rows decoded per step, keeps temporary float copies small
+
+class ScalarQuantizer:
+    """Per-dimension int8 codes: v ~= codes * scale + offset (4x smaller than float32)"""
+
+    kind = "int8"
+
+    def __init__(self, scale=None, offset=None):
+        self.scale = scale
+        self.offset = offset
+
+    def fit(self, vectors: np.ndarray) -> "ScalarQuantizer":
+        low = vectors.min(axis=0)
+        high = vectors.max(axis=0)
+        self.scale = np.maximum((high - low) / 255.0, 1e-12).astype(np.float32)
+        self.offset = (low + 128.0 * self.scale).astype(np.float32)
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((np.asarray(vectors, dtype=np.float32) - self.offset) / self.scale)
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Approximate dot products of queries (m, d) with every encoded row -> (m, n)"""
+        weighted = (queries * self.scale).astype(np.float32)
+        bias = queries @ self.offset
+        out = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_CHUNK):
+            chunk = codes[start:start + SCORE_CHUNK].astype(np.float32)
+            out[:, start:start + len(chunk)] = weighted @ chunk.T
+        return out + bias[:, None]
+
+    def to_dict(self):
+        return {"kind": self.kind, "scale": self.scale, "offset": self.offset}
+
+class PCAReducer:
+    """Projection onto the top principal components: v ~= mean + components.T @ codes"""
+
+    kind = "pca"
+
+    def __init__(self, dim: int = 64, mean=None, components=None):
+        self.dim = dim
+        self.mean = mean
+        self.components = components
+
+    def fit(self, vectors: np.ndarray) -> "PCAReducer":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.mean = vectors.mean(axis=0)
+        _, _, vt = np.linalg.svd(vectors - self.mean, full_matrices=False)
+        self.components = vt[:self.dim].astype(np.float32)
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return ((np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T).astype(np.float32)
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        projected = queries @ self.components.T
+        bias = queries @ self.mean
+        return (projected @ codes.T) + bias[:, None]
+
+    def to_dict(self):
+        return {"kind": self.kind, "dim": np.array(self.dim), "mean": self.mean, "components": self.components}
+
+def make_quantizer(kind: str, pca_dim: int = 64):
+    if kind == "int8":
+        return ScalarQuantizer()
+    if kind == "pca":
+        return PCAReducer(pca_dim)
+    raise ValueError(f"Unknown vector storage {kind!r} (expected float32, int8 or pca)")
+
+def load_quantizer(path: str):
+    data = np.load(path)
+    kind = str(data["kind"])
+    if kind == "int8":
+        return ScalarQuantizer(data["scale"], data["offset"])
+    return PCAReducer(int(data["dim"]), data["mean"], data["components"])
+
+def save_quantizer(quantizer, path: str):
+    with open(path, "wb") as f:
+        np.savez(f, **quantizer.to_dict())
+
+def rerank_top_k(queries: np.ndarray, approx: np.ndarray, fetch_rows, k: int, candidates: int):
+    """Take the best `candidates` rows by approximate score, re-score them exactly, keep k.
+
+    fetch_rows(row_indexes) must return the float32 vectors for those rows.
+    Returns (row indexes, exact scores) per query, best first.
+    """
+    results = []
+    for query, row_scores in zip(queries, approx):
+        shortlist_size = min(candidates, len(row_scores))
+        shortlist = np.argpartition(-row_scores, shortlist_size - 1)[:shortlist_size] \
+            if shortlist_size < len(row_scores) else np.arange(len(row_scores))
+        shortlist = shortlist[np.isfinite(row_scores[shortlist])]
+        exact = np.asarray(fetch_rows(shortlist), dtype=np.float32) @ query if len(shortlist) else np.array([])
+        order = np.argsort(-exact)[:k]
+        results.append((shortlist[order], exact[order]))
+    return results
@@ -195,191 +195,738 @@
 #     return rag_system.retrieve_similar_tasks(task, top_k)
 
 # app/agents/rag_agent.py
-import chromadb
-from chromadb.utils import embedding_functions
 from app.models.sample_data import SampleUserTask
 import json
 import logging
 import hashlib
 from datetime import datetime
+from app.utils.cycle_metrics import timed_phase
+from app.config.enhanced_config import get_config
+from app.agents.rag_registry import (
+    get_rag_system, get_chroma_client, get_embedder, embedding_identity, resolve_backend
+)
+from app.utils.result_cache import VersionedLRUCache
+from app.utils.lexical import bm25_scores
+from app.agents.vector_backends import ChromaBackend, NumpyBackend, select_backend
+import math
+import os
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# How long a collection version read from Mongo is trusted before re-checking
+VERSION_TTL_SECONDS = 5
+# Candidates fetched per requested result when hybrid re-ranking is on
+HYBRID_CANDIDATE_FACTOR = 4
+DELETE_BATCH = 500
+# Fields _build_row reads; full syncs project to these
+INDEX_FIELDS = ("task_id", "name", "user_id", "required_skills", "task_type", "priority",
+                "started_at", "created_at", "completed_at", "actual_effort_hours")
+COLLECTION_METADATA = {"hnsw:space": "cosine"}
+HNSW_KEYS = ("hnsw:M", "hnsw:construction_ef", "hnsw:search_ef")
+
+def collection_metadata():
+    """Metadata for new task history collections: distance space plus the HNSW parameters the operator set.
+
+    Unset parameters are left out so Chroma applies its own defaults.
+    """
+    rag_config = get_config().rag
+    configured = {
+        "hnsw:M": rag_config.hnsw_m,
+        "hnsw:construction_ef": rag_config.hnsw_construction_ef,
+        "hnsw:search_ef": rag_config.hnsw_search_ef
+    }
+    return {**COLLECTION_METADATA, **{key: value for key, value in configured.items() if value is not None}}
+
+def skill_signature(required_skills):
+    """Order- and case-insensitive key for a skill set (levels ignored: they vary within a domain)"""
+    names = sorted({str(skill).strip().lower() for skill in (required_skills or {})})
+    return hashlib.sha1("|".join(names).encode()).hexdigest()[:16]
+
+def _and(*clauses):
+    clauses = [c for c in clauses if c]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def build_where(filters):
+    """Chroma `where` clause from retrieval filters, or None.
+
+    Supported keys: task_type, priority (value or list), min_skills / max_skills,
+    completed_after / completed_before (datetimes, matched on completed_ts).
+    """
+    if not filters:
+        return None
+    clauses = []
+    for field in ("task_type", "priority"):
+        value = filters.get(field)
+        if isinstance(value, (list, tuple, set)):
+            clauses.append({field: {"$in": list(value)}})
+        elif value:
+            clauses.append({field: value})
+    if filters.get("min_skills") is not None:
+        clauses.append({"skills_count": {"$gte": int(filters["min_skills"])}})
+    if filters.get("max_skills") is not None:
+        clauses.append({"skills_count": {"$lte": int(filters["max_skills"])}})
+    if filters.get("completed_after"):
+        clauses.append({"completed_ts": {"$gte": int(filters["completed_after"].timestamp())}})
+    if filters.get("completed_before"):
+        clauses.append({"completed_ts": {"$lte": int(filters["completed_before"].timestamp())}})
+    return _and(*clauses)
+
 class RAGSystem:
-    def __init__(self):
+    def __init__(self, client=None, embedder=None, model_name=None, embedding_backend=None, index_dir=None):
         try:
-            self.client = chromadb.PersistentClient(path="./chroma_db")
-            self.embedder = embedding_functions.SentenceTransformerEmbeddingFunction(
-                model_name="all-MiniLM-L6-v2"
-            )
+            # Client and model come from the process-wide registry unless injected
+            self.model_name = model_name or get_config().rag.embedding_model
+            self.embedding_backend = resolve_backend(self.model_name, embedding_backend)
+            self.client = client or get_chroma_client()
+            self.embedder = embedder or get_embedder(self.model_name, embedding_backend)
 
-            # Unique collection name based on embedding model
-            self.model_hash = hashlib.md5("all-MiniLM-L6-v2".encode()).hexdigest()[:8]
+            # Unique collection name per embedding space (model, and int8 ONNX apart)
+            self.embedding_identity = embedding_identity(self.model_name, embedding_backend)
+            self.model_hash = hashlib.md5(self.embedding_identity.encode()).hexdigest()[:8]
             self.collection_name = f"task_history_{self.model_hash}"
 
-            self.collection = self.client.get_or_create_collection(
-                name=self.collection_name,
-                embedding_function=self.embedder,
-                metadata={"hnsw:space": "cosine"}
-            )
+            self.chroma_collection = self._open_collection()
+            # Chroma or the in-process NumPy index, by config / collection size
+            self.index_dir = index_dir or self._default_index_dir(client)
+            self.collection = select_backend(self.chroma_collection, self.embedder, self.collection_name,
+                                             self.index_dir)
+
+            # Query results keyed by (query text hash, n_results, collection version)
+            rag_config = get_config().rag
+            self.result_cache = VersionedLRUCache(rag_config.result_cache_entries, rag_config.result_cache_max_bytes)
+            self._version_lock = threading.Lock()
+            self._version = 0
+            self._version_checked = 0.0
+            self._generation = 0  # bumped when compaction replaces the Chroma collection
             logger.info(f"RAG system initialized with collection: {self.collection_name}")
         except Exception as e:
             logger.error(f"Failed to initialize RAG system: {e}")
             raise
 
-    def index_completed_tasks(self):
-        """Index completed tasks with robust error handling"""
+    @staticmethod
+    def _default_index_dir(client):
+        """Configured NumPy index dir; next to an injected client's store, so scratch stores never share the live one"""
+        if client is None:
+            return get_config().rag.numpy_index_dir
         try:
-            # Get all completed tasks
-            completed_tasks = list(SampleUserTask.objects(status='completed'))
+            persist_directory = client.get_settings().persist_directory
+        except Exception:
+            persist_directory = None
+        if not persist_directory:
+            raise ValueError("Pass index_dir with a client that has no persist directory")
+        return os.path.join(persist_directory, "vector_index")
 
-            if not completed_tasks:
-                logger.warning("No completed tasks found to index")
-                return
-
-            documents, metadatas, ids = [], [], []
-
-            for task in completed_tasks:
-                try:
-                    # Create document text
-                    skills_text = ", ".join([f"{skill}:{level}" for skill, level in task.required_skills.items()])
-                    doc_text = f"Task: {task.name}\nSkills Required: {skills_text}\nType: {task.task_type or 'feature'}\nPriority: {task.priority}"
-
-                    # Calculate duration if possible
-                    duration_days = 0
-                    if task.started_at and task.completed_at:
-                        duration_days = (task.completed_at - task.started_at).days
-                    elif task.created_at and task.completed_at:
-                        duration_days = (task.completed_at - task.created_at).days
-
-                    # Create metadata
-                    metadata = {
-                        "task_id": str(task.task_id),
-                        "user_id": str(task.user_id) if task.user_id else "unknown",
-                        "priority": str(task.priority),
-                        "task_type": str(task.task_type) if task.task_type else "feature",
-                        "duration_days": int(duration_days),
-                        "effort_hours": float(task.actual_effort_hours) if task.actual_effort_hours else 0.0,
-                        "skills_count": len(task.required_skills),
-                        "completed_date": task.completed_at.isoformat() if task.completed_at else datetime.utcnow().isoformat()
-                    }
+    def _open_collection(self):
+        metadata = collection_metadata()
+        # No embedding function: vectors are always passed in (see ChromaBackend)
+        collection = self.client.get_or_create_collection(
+            name=self.collection_name,
+            embedding_function=None,
+            metadata=metadata
+        )
+        # HNSW parameters are fixed when the graph is created; an existing collection keeps its own
+        configured = [key for key in HNSW_KEYS if key in metadata]
+        current = {key: (collection.metadata or {}).get(key) for key in configured}
+        if any(current[key] != metadata[key] for key in configured):
+            logger.info(f"{self.collection_name} HNSW settings {current} differ from config; "
+                        f"the next compaction rebuilds it with the configured ones")
+        return collection
 
-                    documents.append(doc_text)
-                    metadatas.append(metadata)
-                    ids.append(str(task.task_id))
+    def _reopen_collection(self):
+        """Pick up a Chroma collection rebuilt by compaction (possibly in another process)"""
+        self.chroma_collection = self._open_collection()
+        if isinstance(self.collection, ChromaBackend):
+            self.collection = ChromaBackend(self.chroma_collection, self.embedder)
 
-                except Exception as e:
-                    logger.warning(f"Failed to process task {task.task_id}: {e}")
-                    continue
+    def _version_key(self):
+        return f"rag_version:{self.collection_name}"
 
-            if documents:
-                # Upsert to collection
-                self.collection.upsert(
-                    documents=documents,
-                    metadatas=metadatas,
-                    ids=ids
-                )
-                logger.info(f"Successfully indexed {len(documents)} completed tasks")
+    def collection_version(self):
+        """Version of the collection contents, shared across processes through SystemState"""
+        with self._version_lock:
+            if time.time() - self._version_checked < VERSION_TTL_SECONDS:
+                return self._version
+        try:
+            from app.models.sample_data import SystemState
+            state = SystemState.get_value(self._version_key(), {})
+            stored = state.get("version", 0)
+            generation = state.get("generation", 0)
+        except Exception as e:
+            logger.warning(f"Could not read collection version: {e}")
+            stored = generation = None
+        with self._version_lock:
+            if stored is not None:
+                self._version = max(self._version, stored)
+            if generation is not None and generation > self._generation:
+                self._reopen_collection()
+                self._generation = generation
+            self._version_checked = time.time()
+            return self._version
+
+    def bump_version(self, **counters):
+        """Invalidate cached query results after the collection changed.
+
+        Extra keyword arguments are added to counters kept in the same state
+        document (e.g. deleted=n for compaction bookkeeping).
+        """
+        try:
+            from app.models.sample_data import SystemState
+            increments = {f"inc__value__{name}": amount for name, amount in counters.items()}
+            state = SystemState.objects(key=self._version_key()).modify(
+                upsert=True, new=True, inc__value__version=1, set__updated_at=datetime.utcnow(), **increments
+            )
+            version = state.value.get("version", 0)
+        except Exception as e:
+            logger.warning(f"Could not persist collection version: {e}")
+            version = None
+        with self._version_lock:
+            self._version = max(self._version + 1, version or 0)
+            self._version_checked = time.time()
+
+    @staticmethod
+    def _build_row(task):
+        """Document text and metadata for one completed task, with a content hash of both"""
+        skills_text = ", ".join([f"{skill}:{level}" for skill, level in task.required_skills.items()])
+        doc_text = f"Task: {task.name}\nSkills Required: {skills_text}\nType: {task.task_type or 'feature'}\nPriority: {task.priority}"
+
+        # Calculate duration if possible
+        duration_days = 0
+        if task.started_at and task.completed_at:
+            duration_days = (task.completed_at - task.started_at).days
+        elif task.created_at and task.completed_at:
+            duration_days = (task.completed_at - task.created_at).days
+
+        metadata = {
+            "task_id": str(task.task_id),
+            "user_id": str(task.user_id) if task.user_id else "unknown",
+            "priority": str(task.priority),
+            "task_type": str(task.task_type) if task.task_type else "feature",
+            "duration_days": int(duration_days),
+            "effort_hours": float(task.actual_effort_hours) if task.actual_effort_hours else 0.0,
+            "skills_count": len(task.required_skills),
+            # Exact skill-set lookups (see _exact_matches) filter on this instead of searching
+            "skill_signature": skill_signature(task.required_skills),
+            "completed_date": task.completed_at.isoformat() if task.completed_at else "",
+            # Numeric copy of completed_date so `where` can range-filter on it
+            "completed_ts": int(task.completed_at.timestamp()) if task.completed_at else 0
+        }
+        # Hash before the completed_date fallback so a missing date doesn't look like a change
+        metadata["content_hash"] = hashlib.sha1(
+            json.dumps([doc_text, metadata], sort_keys=True).encode()
+        ).hexdigest()
+        if not metadata["completed_date"]:
+            metadata["completed_date"] = datetime.utcnow().isoformat()
+        return str(task.task_id), doc_text, metadata
+
+    def _stored_hashes(self, ids):
+        """content_hash currently stored for each id (ids not in the collection are omitted)"""
+        hashes = {}
+        for i in range(0, len(ids), 500):
+            stored = self.collection.get(ids=ids[i:i + 500], include=["metadatas"])
+            for row_id, meta in zip(stored["ids"], stored["metadatas"]):
+                hashes[row_id] = (meta or {}).get("content_hash")
+        return hashes
+
+    def _upsert_changed(self, rows, bulk_embedder=None, force=False):
+        """Upsert the rows whose content hash differs from the stored one (all rows with force).
+
+        Embeddings are computed in embed_batch_size slices and written in
+        upserts of at most index_page_size rows, so neither the model nor the
+        store ever sees an unbounded batch. A bulk_embedder gets each upsert's
+        documents at once and parallelises them itself.
+        """
+        rag_config = get_config().rag
+        embedder = self.embedder
+        if force:
+            changed = rows
+            cache = getattr(self.embedder, "cache", None)
+            if cache is not None and bulk_embedder is None:
+                from app.utils.embedding_cache import CachedEmbeddingFunction
+                # Re-embed for real; the cache is only refreshed
+                embedder = CachedEmbeddingFunction(self.embedder.embedder, self.embedding_identity, cache, read=False)
+        else:
+            stored = self._stored_hashes([row_id for row_id, _, _ in rows])
+            changed = [row for row in rows if stored.get(row[0]) != row[2]["content_hash"]]
+        page_size = max(rag_config.index_page_size, len(changed)) if bulk_embedder else rag_config.index_page_size
+        embed_seconds = 0.0
+        for start in range(0, len(changed), page_size):
+            chunk = changed[start:start + page_size]
+            documents = [doc for _, doc, _ in chunk]
+            started = time.perf_counter()
+            if bulk_embedder is not None:
+                embeddings = bulk_embedder(documents)
             else:
-                logger.warning("No valid documents to index")
+                embeddings = []
+                for i in range(0, len(documents), rag_config.embed_batch_size):
+                    embeddings.extend(embedder(documents[i:i + rag_config.embed_batch_size]))
+            embed_seconds += time.perf_counter() - started
+            self.collection.upsert(
+                [row_id for row_id, _, _ in chunk], documents, [meta for _, _, meta in chunk],
+                embeddings=embeddings
+            )
+        if changed:
+            self.bump_version()
+        return {"total": len(rows), "upserted": len(changed), "unchanged": len(rows) - len(changed),
+                "embed_seconds": embed_seconds}
+
+    def _build_rows(self, tasks):
+        rows = []
+        for task in tasks:
+            try:
+                rows.append(self._build_row(task))
+            except Exception as e:
+                logger.warning(f"Failed to process task {task.task_id}: {e}")
+        return rows
+
+    def index_task(self, task):
+        """Index a single completed task; skips the embedding when its content is unchanged"""
+        upserted = self.index_tasks([task])["upserted"] > 0
+        if upserted:
+            logger.info(f"Indexed completed task {task.task_id}")
+        return upserted
+
+    def index_tasks(self, tasks):
+        """Index a batch of completed tasks with a single upsert (used by the indexing queue)"""
+        return self._upsert_changed(self._build_rows(tasks))
+
+    def _bulk_embedder(self, workers, force=False):
+        """Process-pool embedder for this model, behind the embedding cache when one is configured.
+
+        With force the cache is write-through only, so a forced rebuild measures the pool, not cache reads.
+        """
+        from app.agents.bulk_embedder import get_bulk_embedder
+        from app.utils.embedding_cache import CachedEmbeddingFunction
+
+        bulk = get_bulk_embedder(self.model_name, self.embedding_backend, workers)
+        cache = getattr(self.embedder, "cache", None)
+        if cache is None:
+            return bulk
+        return CachedEmbeddingFunction(bulk, self.embedding_identity, cache, read=not force)
+
+    def _checkpoint_key(self):
+        return f"rag_index_checkpoint:{self.collection_name}"
+
+    def index_completed_tasks(self, progress=None, resume=True, time_budget=None, workers=None, force=False):
+        """Stream completed tasks into the index, re-embedding only rows whose content hash changed.
+
+        Tasks are read page by page (keyset on task_id, projected to the fields
+        _build_row uses), so memory stays flat whatever the history size. After
+        each page the last task_id is checkpointed in SystemState; an
+        interrupted run resumes from there. progress, if given, is called with
+        a dict of counters after every page. With time_budget (seconds) the run
+        stops after the page that exceeds it and leaves the checkpoint in place;
+        "complete" in the result says whether the end was reached.
+
+        workers > 1 embeds through a process pool (bulk rebuilds; pages grow so
+        every worker gets several batches) and force re-embeds unchanged rows.
+        The result carries the run's embedding throughput.
+        """
+        from app.models.sample_data import SystemState
+        from app.agents.rag_retention import retention_query
+
+        try:
+            rag_config = get_config().rag
+            page_size = rag_config.index_page_size
+            bulk_embedder = None
+            if workers and workers > 1:
+                bulk_embedder = self._bulk_embedder(workers, force)
+                page_size = max(page_size, workers * rag_config.embed_batch_size * 4)
+            query = retention_query()
+            checkpoint = SystemState.get_value(self._checkpoint_key()) if resume else None
+            counters = {"total": SampleUserTask.objects(**query).count(), "processed": 0, "upserted": 0,
+                        "unchanged": 0, "resumed_from": None, "complete": False,
+                        "workers": workers if bulk_embedder else 1, "embedded": 0, "embed_seconds": 0.0}
+            last_id = None
+            if checkpoint:
+                last_id = checkpoint["last_task_id"]
+                counters.update(processed=checkpoint["processed"], upserted=checkpoint["upserted"],
+                                unchanged=checkpoint["unchanged"], resumed_from=last_id)
+                logger.info(f"Resuming index sync after task {last_id} ({checkpoint['processed']} done)")
+            if not counters["total"]:
+                logger.warning("No completed tasks found to index")
+
+            started = time.time()
+            while True:
+                page_query = SampleUserTask.objects(**query)
+                if last_id is not None:
+                    page_query = page_query.filter(task_id__gt=last_id)
+                page = list(page_query.only(*INDEX_FIELDS).order_by("task_id").limit(page_size))
+                if not page:
+                    break
+
+                result = self._upsert_changed(self._build_rows(page), bulk_embedder, force)
+                last_id = page[-1].task_id
+                counters["processed"] += len(page)
+                counters["upserted"] += result["upserted"]
+                counters["unchanged"] += result["unchanged"]
+                counters["embedded"] += result["upserted"]
+                counters["embed_seconds"] += result["embed_seconds"]
+                SystemState.set_value(self._checkpoint_key(), {
+                    "last_task_id": last_id,
+                    **{k: counters[k] for k in ("processed", "upserted", "unchanged")}
+                })
+                elapsed = time.time() - started
+                if progress:
+                    progress({**counters, "elapsed_seconds": round(elapsed, 2)})
+                if time_budget is not None and elapsed >= time_budget:
+                    return self._throughput(counters, elapsed)
+
+            # Finished: the next run starts from the beginning
+            SystemState.objects(key=self._checkpoint_key()).delete()
+            counters["complete"] = True
+            self._throughput(counters, time.time() - started)
+            logger.info(f"Indexed completed tasks: {counters['upserted']} upserted, {counters['unchanged']} unchanged "
+                        f"in {counters['elapsed_seconds']}s ({counters['embed_rows_per_second']} rows/s embedding, "
+                        f"{counters['workers']} worker(s))")
+            return counters
 
         except Exception as e:
             logger.error(f"Task indexing failed: {str(e)}", exc_info=True)
             raise
 
-    def retrieve_similar_tasks(self, task, top_k=3):
-        """Retrieve similar tasks with improved error handling"""
+    @staticmethod
+    def _throughput(counters, elapsed):
+        # embedded / embed_seconds cover this run only (a resumed run's earlier pages are not timed)
+        counters["elapsed_seconds"] = round(elapsed, 2)
+        counters["embed_seconds"] = round(counters["embed_seconds"], 2)
+        counters["embed_rows_per_second"] = (
+            round(counters["embedded"] / counters["embed_seconds"], 1) if counters["embed_seconds"] else None
+        )
+        return counters
+
+    def delete_tasks(self, task_ids):
+        """Remove rows from the active store (and the Chroma copy when the NumPy index is active, and any migration target)"""
+        stores = [self.collection]
+        if not isinstance(self.collection, ChromaBackend):
+            # select_backend copies from whichever store has more rows; keep Chroma from resurrecting these
+            stores.append(ChromaBackend(self.chroma_collection, self.embedder))
+        for store in stores:
+            for i in range(0, len(task_ids), DELETE_BATCH):
+                store.delete(list(task_ids[i:i + DELETE_BATCH]))
+        if task_ids:
+            self.bump_version(deleted=len(task_ids))
+        logger.info(f"Deleted {len(task_ids)} rows from {self.collection_name}")
+        # A collection being built by a migration would otherwise bring the rows back at cutover
         try:
-            if not task:
-                logger.error("No task provided for similarity search")
-                return []
-
-            # Validate task object
-            if not hasattr(task, 'name') or not hasattr(task, 'required_skills'):
-                logger.error("Invalid task object - missing required attributes")
-                return []
-
-            if not task.name or not task.required_skills:
-                logger.error("Task name or required_skills is empty")
-                return []
-
-            # Create query text
-            skills_text = ", ".join([f"{skill}:{level}" for skill, level in task.required_skills.items()])
-            query_text = f"Task: {task.name}\nSkills Required: {skills_text}\nType: {task.task_type or 'feature'}\nPriority: {task.priority}"
-
-            logger.info(f"Searching for similar tasks with query: {query_text[:100]}...")
-
-            # Query the collection
-            results = self.collection.query(
-                query_texts=[query_text],
-                n_results=min(top_k, 10),  # Limit to reasonable number
-                include=["documents", "metadatas", "distances"]
-            )
+            from app.agents.rag_migration import target_system
+            target = target_system()
+            if target is not None and target is not self and target.collection_name != self.collection_name:
+                target.delete_tasks(task_ids)
+        except Exception as e:
+            logger.warning(f"Could not delete rows from the migration target: {e}")
+        return len(task_ids)
 
-            # Validate results structure
-            if not results or not isinstance(results, dict):
-                logger.warning("Empty or invalid results from ChromaDB")
-                return []
-
-            # Safely extract results
-            documents = results.get("documents", [[]])[0] if results.get("documents") else []
-            metadatas = results.get("metadatas", [[]])[0] if results.get("metadatas") else []
-            distances = results.get("distances", [[]])[0] if results.get("distances") else []
-
-            if not documents:
-                logger.info("No similar tasks found")
-                return []
-
-            # Process results
-            similar_tasks = []
-            for i, (doc, meta, distance) in enumerate(zip(documents, metadatas, distances)):
-                try:
-                    # Skip if this is the same task
-                    if meta.get("task_id") == task.task_id:
-                        continue
-
-                    similarity_score = round(1 - distance, 3) if distance is not None else 0.0
-
-                    similar_task = {
-                        "task_id": meta.get("task_id", "unknown"),
-                        "user_id": meta.get("user_id", "unknown"),
-                        "score": similarity_score,
-                        "document": doc[:300] if doc else "",  # Truncate for readability
-                        "metadata": {
-                            "priority": meta.get("priority", "unknown"),
-                            "task_type": meta.get("task_type", "unknown"),
-                            "duration_days": meta.get("duration_days", 0),
-                            "effort_hours": meta.get("effort_hours", 0.0),
-                            "skills_count": meta.get("skills_count", 0)
-                        }
-                    }
+    def deleted_since_compaction(self):
+        try:
+            from app.models.sample_data import SystemState
+            return SystemState.get_value(self._version_key(), {}).get("deleted", 0)
+        except Exception as e:
+            logger.warning(f"Could not read deletion counter: {e}")
+            return 0
+
+    def compact(self):
+        """Rebuild the stores without deleted rows (fresh HNSW graph for Chroma)"""
+        from app.models.sample_data import SystemState
+
+        before = self.disk_usage()
+        if isinstance(self.collection, NumpyBackend):
+            self.collection.compact()
+
+        # Chroma keeps deleted vectors in its HNSW graph; copying live rows into a new
+        # collection (stored embeddings, no inference) and renaming it drops them
+        rebuild_name = f"{self.collection_name}_rebuild"
+        try:
+            leftover = ChromaBackend(self.client.get_collection(rebuild_name, embedding_function=None), self.embedder)
+        except Exception:
+            leftover = None
+        if leftover is not None:
+            # An earlier run stopped between delete and rename: the leftover is the full copy
+            if self.chroma_collection.count() == 0:
+                ChromaBackend(self.chroma_collection, self.embedder).import_from(leftover)
+            self.client.delete_collection(rebuild_name)
+        rebuilt = ChromaBackend(self.client.create_collection(
+            name=rebuild_name, embedding_function=None, metadata=collection_metadata()
+        ), self.embedder)
+        rebuilt.import_from(ChromaBackend(self.chroma_collection, self.embedder))
+        self.client.delete_collection(self.collection_name)
+        rebuilt.collection.modify(name=self.collection_name)
+        self._reopen_collection()
+
+        # Other processes reopen their handle when they see the new generation
+        state = SystemState.objects(key=self._version_key()).modify(
+            upsert=True, new=True, inc__value__version=1, inc__value__generation=1,
+            set__value__deleted=0, set__updated_at=datetime.utcnow()
+        )
+        with self._version_lock:
+            self._version = max(self._version + 1, state.value.get("version", 0))
+            self._generation = state.value.get("generation", 0)
+            self._version_checked = time.time()
+        after = self.disk_usage()
+        logger.info(f"Compacted {self.collection_name}: {before} -> {after}")
+        return {"before": before, "after": after}
+
+    def disk_usage(self):
+        """Bytes on disk for the Chroma directory (all collections) and the NumPy index"""
+        usage = {"rows": self.collection.count(), "chroma_bytes": _dir_bytes(get_config().rag.chroma_path)}
+        if isinstance(self.collection, NumpyBackend):
+            usage["numpy_bytes"] = self.collection.disk_bytes()
+        return usage
+
+    def recency_weight(self, completed_ts, now=None):
+        """Ranking multiplier for an outcome completed at completed_ts (1.0 when decay is off)"""
+        rag_config = get_config().rag
+        if not rag_config.decay_half_life_days or not completed_ts:
+            return 1.0
+        age_days = max(0.0, ((now or time.time()) - completed_ts) / 86400)
+        decay = math.pow(0.5, age_days / rag_config.decay_half_life_days)
+        return rag_config.decay_min_weight + (1 - rag_config.decay_min_weight) * decay
 
-                    similar_tasks.append(similar_task)
+    @staticmethod
+    def _query_text(task):
+        skills_text = ", ".join([f"{skill}:{level}" for skill, level in task.required_skills.items()])
+        return f"Task: {task.name}\nSkills Required: {skills_text}\nType: {task.task_type or 'feature'}\nPriority: {task.priority}"
 
-                except Exception as e:
-                    logger.warning(f"Failed to process similarity result {i}: {e}")
+    def precompute_query_embedding(self, query_text):
+        """Embed a task's query text into the embedding cache, so lookups skip the model; False without a cache"""
+        if getattr(self.embedder, "cache", None) is None:
+            return False
+        self.embedder([query_text])
+        return True
+
+    def warm_up(self):
+        """Run a throwaway embedding and query so the first real lookup pays no load cost"""
+        # The raw model, not the embedding cache: a cached vector would skip inference
+        model = getattr(self.embedder, "embedder", self.embedder)
+        vector = model(["warm-up task requiring python, docker"])[0]
+        self.collection.query(query_embeddings=[vector], n_results=1, include=["distances"])
+
+    def _is_queryable(self, task):
+        """Validate a task before using it as a similarity query"""
+        if not task:
+            logger.error("No task provided for similarity search")
+            return False
+
+        # Validate task object
+        if not hasattr(task, 'name') or not hasattr(task, 'required_skills'):
+            logger.error("Invalid task object - missing required attributes")
+            return False
+
+        if not task.name or not task.required_skills:
+            logger.error("Task name or required_skills is empty")
+            return False
+        return True
+
+    def _format_results(self, task, documents, metadatas, distances, top_k, hybrid_weight=0.0):
+        """Turn one query's raw Chroma rows into the similar-task records callers expect"""
+        lexical = [0.0] * len(documents)
+        if hybrid_weight:
+            raw = bm25_scores(self._query_text(task), documents)
+            top = max(raw, default=0.0)
+            lexical = [score / top if top else 0.0 for score in raw]
+
+        similar_tasks = []
+        now = time.time()
+        for i, (doc, meta, distance) in enumerate(zip(documents, metadatas, distances)):
+            try:
+                # Skip if this is the same task
+                if meta.get("task_id") == task.task_id:
                     continue
 
-            # Sort by similarity score and return top results
-            similar_tasks.sort(key=lambda x: x["score"], reverse=True)
-            final_results = similar_tasks[:top_k]
+                similarity_score = round(1 - distance, 3) if distance is not None else 0.0
+
+                similar_task = {
+                    "task_id": meta.get("task_id", "unknown"),
+                    "user_id": meta.get("user_id", "unknown"),
+                    "score": similarity_score,
+                    "document": doc[:300] if doc else "",  # Truncate for readability
+                    "metadata": {
+                        "priority": meta.get("priority", "unknown"),
+                        "task_type": meta.get("task_type", "unknown"),
+                        "duration_days": meta.get("duration_days", 0),
+                        "effort_hours": meta.get("effort_hours", 0.0),
+                        "skills_count": meta.get("skills_count", 0)
+                    }
+                }
+                if hybrid_weight:
+                    similar_task["lexical_score"] = round(lexical[i], 3)
+                    similar_task["hybrid_score"] = round(
+                        (1 - hybrid_weight) * similarity_score + hybrid_weight * lexical[i], 3
+                    )
+                # Stale outcomes rank lower; the raw similarity stays in "score"
+                weight = self.recency_weight(meta.get("completed_ts"), now)
+                similar_task["recency_weight"] = round(weight, 3)
+                similar_task["rank_score"] = round(
+                    weight * similar_task["hybrid_score" if hybrid_weight else "score"], 3
+                )
+
+                similar_tasks.append(similar_task)
+
+            except Exception as e:
+                logger.warning(f"Failed to process similarity result {i}: {e}")
+                continue
+
+        # Sort by recency-weighted similarity (or hybrid) score and return top results
+        similar_tasks.sort(key=lambda x: x["rank_score"], reverse=True)
+        return similar_tasks[:top_k]
+
+    def _exact_matches(self, task, where, where_key, version):
+        """The newest rows with the same skill signature (and task type, if configured).
+
+        Metadata-filtered gets, no embedding and no ANN search: the metadata of
+        every match is read to sort on completed_ts, then documents are loaded
+        for the newest signature_fetch_limit only. Cached with the query results
+        under the collection version.
+        """
+        rag_config = get_config().rag
+        signature = skill_signature(task.required_skills)
+        task_type = (task.task_type or "feature") if rag_config.signature_by_type else None
+        key = ("signature", signature, task_type, where_key, version)
+        rows = self.result_cache.get(key)
+        if rows is None:
+            # A limited get returns an arbitrary subset, so rank all matches before cutting
+            found = self.collection.get(
+                where=_and({"skill_signature": signature}, {"task_type": task_type} if task_type else None, where),
+                include=["metadatas"]
+            )
+            newest = [row_id for row_id, _ in sorted(
+                zip(found["ids"], found["metadatas"]),
+                key=lambda pair: (pair[1] or {}).get("completed_ts", 0), reverse=True
+            )[:rag_config.signature_fetch_limit]]
+            loaded = self.collection.get(ids=newest, include=["documents", "metadatas"]) if newest else None
+            by_id = dict(zip(loaded["ids"], zip(loaded["documents"], loaded["metadatas"]))) if loaded else {}
+            pairs = [by_id[row_id] for row_id in newest if row_id in by_id]
+            rows = ([doc for doc, _ in pairs], [meta for _, meta in pairs])
+            self.result_cache.put(key, rows)
+        documents, metadatas = rows
+        return documents, metadatas
+
+    def retrieve_similar_tasks_batch(self, tasks, top_k=3, filters=None, hybrid_weight=None):
+        """Similar tasks for many tasks with one embedding pass and one Chroma query.
+
+        filters narrows the search inside Chroma (see build_where). hybrid_weight
+        (0..1, default from config) blends a BM25 score over the returned
+        candidates into the ranking. Returns one result list per input task, in
+        order (empty for invalid tasks).
+
+        With rag.signature_lookup on, historical tasks with exactly the same
+        skill set come first (match="exact"); only tasks with fewer than top_k
+        such hits are embedded and searched (match="vector" for the rest).
+        """
+        if hybrid_weight is None:
+            hybrid_weight = get_config().rag.hybrid_weight
+        results_per_task = [[] for _ in tasks]
+        try:
+            queryable = [i for i, task in enumerate(tasks) if self._is_queryable(task)]
+            if not queryable:
+                return results_per_task
+
+            n_results = min(top_k, 10)  # Limit to reasonable number
+            if hybrid_weight or get_config().rag.decay_half_life_days:
+                # Re-ranking (lexical blend, recency decay) needs candidates beyond top_k
+                n_results *= HYBRID_CANDIDATE_FACTOR
+            where = build_where(filters)
+            where_key = json.dumps(where, sort_keys=True) if where else None
+            version = self.collection_version()
+
+            # Exact skill-set hits first; tasks with enough of them skip the vector search
+            exact_by_task = {}
+            if get_config().rag.signature_lookup:
+                for i in queryable:
+                    documents, metadatas = self._exact_matches(tasks[i], where, where_key, version)
+                    exact = self._format_results(tasks[i], documents, metadatas, [0.0] * len(documents),
+                                                 top_k, 0.0)
+                    for record in exact:
+                        record["match"] = "exact"
+                    exact_by_task[i] = exact
+                    if len(exact) >= top_k:
+                        results_per_task[i] = exact
+                queryable = [i for i in queryable if len(exact_by_task.get(i, [])) < top_k]
+
+            # Raw rows are cached per query text; excluding the task itself happens per caller
+            rows_by_task, misses = {}, {}
+            for i in queryable:
+                query_text = self._query_text(tasks[i])
+                key = (hashlib.sha1(query_text.encode()).hexdigest(), n_results, where_key, version)
+                cached = self.result_cache.get(key)
+                if cached is not None:
+                    rows_by_task[i] = cached
+                else:
+                    misses.setdefault(key, (query_text, []))[1].append(i)
+
+            if misses:
+                # One batch; texts precomputed at create/edit time come straight from the embedding cache
+                embeddings = self.embedder([query_text for query_text, _ in misses.values()])
+                logger.info(f"Searching for similar tasks for {len(misses)} queries "
+                            f"({len(queryable) - sum(len(v[1]) for v in misses.values())} cached)")
+
+                # Query the collection
+                query_kwargs = {"where": where} if where else {}
+                results = self.collection.query(
+                    query_embeddings=embeddings,
+                    n_results=n_results,
+                    include=["documents", "metadatas", "distances"],
+                    **query_kwargs
+                )
+
+                # Validate results structure
+                if not results or not isinstance(results, dict):
+                    logger.warning("Empty or invalid results from ChromaDB")
+                    results = {}
+
+                # Safely extract results
+                documents = results.get("documents") or [[] for _ in misses]
+                metadatas = results.get("metadatas") or [[] for _ in misses]
+                distances = results.get("distances") or [[] for _ in misses]
 
-            logger.info(f"Found {len(final_results)} similar tasks")
-            return final_results
+                for row, (key, (_, indexes)) in enumerate(misses.items()):
+                    rows = (documents[row], metadatas[row], distances[row])
+                    if results:
+                        self.result_cache.put(key, rows)
+                    for i in indexes:
+                        rows_by_task[i] = rows
+
+            for i, (documents, metadatas, distances) in rows_by_task.items():
+                exact = exact_by_task.get(i, [])
+                seen = {record["task_id"] for record in exact}
+                vector = [record for record in self._format_results(
+                    tasks[i], documents, metadatas, distances, top_k + len(exact), hybrid_weight
+                ) if record["task_id"] not in seen]
+                for record in vector:
+                    record["match"] = "vector"
+                results_per_task[i] = (exact + vector)[:top_k]
+
+            logger.info(f"Found similar tasks for {sum(1 for r in results_per_task if r)}/{len(tasks)} tasks")
+            return results_per_task
 
         except Exception as e:
             logger.error(f"Similarity search failed: {str(e)}", exc_info=True)
-            return []
+            return results_per_task
+
+    def retrieve_similar_tasks(self, task, top_k=3, filters=None, hybrid_weight=None):
+        """Retrieve similar tasks with improved error handling"""
+        return self.retrieve_similar_tasks_batch([task], top_k, filters, hybrid_weight)[0]
 
     def get_collection_stats(self):
         """Get statistics about the indexed collection"""
         try:
             count = self.collection.count()
-            return {
+            stats = {
                 "collection_name": self.collection_name,
+                "backend": self.collection.name,
+                "embedding": self.embedding_identity,
                 "indexed_tasks": count,
                 "status": "healthy" if count > 0 else "empty"
             }
+            cache = getattr(self.embedder, "cache", None)
+            if cache is not None:
+                stats["embedding_cache"] = cache.get_stats()
+            stats["collection_version"] = self.collection_version()
+            stats["result_cache"] = self.result_cache.get_stats()
+            return stats
         except Exception as e:
             logger.error(f"Failed to get collection stats: {e}")
             return {
@@ -389,16 +936,20 @@ class RAGSystem:
                 "error": str(e)
             }
 
-# Create singleton instance
-try:
-    rag_system = RAGSystem()
-except Exception as e:
-    logger.error(f"Failed to create RAG system: {e}")
-    rag_system = None
+def _dir_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
 
 # Public interface functions
 def index_task_history():
     """Index completed tasks into RAG system"""
+    rag_system = get_rag_system()
     if rag_system is None:
         logger.error("RAG system not initialized")
         return False
@@ -410,21 +961,86 @@ def index_task_history():
         logger.error(f"Failed to index task history: {e}")
         return False
 
-def retrieve_similar_tasks(task, top_k=3):
+def index_task(task):
+    """Index one completed task into RAG system"""
+    rag_system = get_rag_system()
+    if rag_system is None:
+        logger.error("RAG system not initialized")
+        return False
+
+    try:
+        return rag_system.index_task(task)
+    except Exception as e:
+        logger.error(f"Failed to index task {task.task_id}: {e}")
+        return False
+
+def shadow_read(tasks, top_k, filters, hybrid_weight, results):
+    """Hand a sample of live queries to the running model migration (no-op otherwise)"""
+    from app.agents.rag_migration import submit_shadow_read
+    try:
+        submit_shadow_read(tasks, top_k, filters, hybrid_weight, results)
+    except Exception as e:
+        logger.warning(f"Shadow read skipped: {e}")
+
+def _precompute_query_embedding(query_text):
+    rag_system = get_rag_system()
+    if rag_system is None:
+        return False
+    return rag_system.precompute_query_embedding(query_text)
+
+def precompute_query_embedding(task):
+    """Queue the task's RAG query vector for the embedding cache after a create/edit; never blocks the caller.
+
+    Retrieval embeds on the fly when the vector is not cached yet (or the job failed).
+    """
+    if not task.name or not task.required_skills:
+        return None
+    from app.utils.async_processor import async_processor, TaskPriority
+    async_processor.start()
+    return async_processor.submit_task(_precompute_query_embedding, RAGSystem._query_text(task),
+                                       priority=TaskPriority.LOW)
+
+def retrieve_similar_tasks(task, top_k=3, filters=None, hybrid_weight=None):
     """Retrieve similar tasks from RAG system"""
+    rag_system = get_rag_system()
     if rag_system is None:
         logger.error("RAG system not initialized")
         return []
 
     try:
-        return rag_system.retrieve_similar_tasks(task, top_k)
+        with timed_phase("rag_retrieval"):
+            results = rag_system.retrieve_similar_tasks(task, top_k, filters, hybrid_weight)
+        shadow_read([task], top_k, filters, hybrid_weight, [results])
+        return results
     except Exception as e:
         logger.error(f"Failed to retrieve similar tasks: {e}")
         return []
 
+def retrieve_similar_tasks_batch(tasks, top_k=3, filters=None, hybrid_weight=None):
+    """Retrieve similar tasks for several tasks in one round-trip (one result list per task)"""
+    rag_system = get_rag_system()
+    if rag_system is None:
+        logger.error("RAG system not initialized")
+        return [[] for _ in tasks]
+
+    try:
+        with timed_phase("rag_retrieval"):
+            results = rag_system.retrieve_similar_tasks_batch(tasks, top_k, filters, hybrid_weight)
+        shadow_read(tasks, top_k, filters, hybrid_weight, results)
+        return results
+    except Exception as e:
+        logger.error(f"Failed to retrieve similar tasks: {e}")
+        return [[] for _ in tasks]
+
 def get_rag_stats():
     """Get RAG system statistics"""
+    rag_system = get_rag_system()
     if rag_system is None:
         return {"status": "not_initialized"}
 
-    return rag_system.get_collection_stats()
\ No newline at end of file
+    from app.agents.index_queue import index_queue
+    from app.agents.rag_migration import migration_status
+    stats = rag_system.get_collection_stats()
+    stats["indexing_queue"] = index_queue.get_stats()
+    stats["migration"] = migration_status()
+    return stats
\ No newline at end of file
@@ -0,0 +1,258 @@
+# app/agents/rag_migration.py
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+from app.config.enhanced_config import get_config
+from app.utils.async_processor import async_processor, TaskPriority
+
+logger = logging.getLogger(__name__)
+
+# Embedding model migration, driven by the "rag_migration" scheduler job:
+#   building  the target collection is filled in time-boxed steps (resumable checkpoint)
+#             while queries keep hitting the active one; completions are dual-written
+#   shadow    a sample of live queries (topped up with replayed tasks) also runs
+#             against the target and the answers are compared
+#   done      final catch-up sync, then one SystemState write switches every process
+#   held      overlap stayed below migration_min_overlap; waits for a forced cutover
+MIGRATION_KEY = "rag_migration"
+SHADOW_KEY = "rag_migration_shadow"  # counters incremented by every process
+STATE_TTL_SECONDS = 5
+REPLAY_BATCH = 20
+
+_lock = threading.Lock()
+_step_lock = threading.Lock()  # one step at a time (scheduler job, CLI)
+_state = None
+_state_checked = 0.0
+_target = None
+
+def _same(a, b):
+    return bool(a and b) and a["model"] == b["model"] and a["backend"] == b["backend"]
+
+def _label(embedding):
+    return f"{embedding['model']} ({embedding['backend']})"
+
+def migration_state(max_age=STATE_TTL_SECONDS):
+    """Stored migration state (None before the first migration), cached briefly for the query path"""
+    global _state, _state_checked
+    if time.time() - _state_checked < max_age:
+        return _state
+    from app.models.sample_data import SystemState
+    try:
+        _state = SystemState.get_value(MIGRATION_KEY)
+    except Exception as e:
+        logger.warning(f"Could not read migration state: {e}")
+    _state_checked = time.time()
+    return _state
+
+def _save(state):
+    global _state, _state_checked
+    from app.models.sample_data import SystemState
+    state["updated_at"] = datetime.now(timezone.utc).isoformat()
+    SystemState.set_value(MIGRATION_KEY, state)
+    _state, _state_checked = state, time.time()
+
+def target_system():
+    """RAGSystem for the collection being built, or None when no migration is running"""
+    global _target
+    state = migration_state()
+    if not state or state.get("phase") not in ("building", "shadow", "held"):
+        _target = None
+        return None
+    target = state["target"]
+    with _lock:
+        if _target is None or (_target.model_name, _target.embedding_backend) != (target["model"], target["backend"]):
+            from app.agents.rag_agent import RAGSystem
+            _target = RAGSystem(model_name=target["model"], embedding_backend=target["backend"])
+        return _target
+
+def overlap_at_k(expected, actual, k):
+    """Share of the top-k task ids both result lists agree on"""
+    expected_ids = {row["task_id"] for row in expected[:k]}
+    actual_ids = {row["task_id"] for row in actual[:k]}
+    if not expected_ids and not actual_ids:
+        return 1.0
+    return len(expected_ids & actual_ids) / max(len(expected_ids), len(actual_ids))
+
+def _record_shadow(active_results, target_results, top_k, source):
+    from app.models.sample_data import SystemState
+
+    pairs = [(a, b) for a, b in zip(active_results, target_results) if a or b]
+    if not pairs:
+        return
+    overlap = sum(overlap_at_k(a, b, top_k) for a, b in pairs)
+    # The assignment reads the best match's user, so count agreement on that separately
+    same_user = sum(1 for a, b in pairs if a and b and a[0]["user_id"] == b[0]["user_id"])
+    SystemState.objects(key=SHADOW_KEY).modify(
+        upsert=True, new=True, set__updated_at=datetime.now(timezone.utc),
+        inc__value__queries=len(pairs), inc__value__overlap_sum=overlap,
+        inc__value__top_user_agree=same_user, **{f"inc__value__{source}": len(pairs)}
+    )
+
+def _compare(tasks, top_k, filters, hybrid_weight, active_results, source):
+    try:
+        target = target_system()
+        if target is None:
+            return
+        target_results = target.retrieve_similar_tasks_batch(tasks, top_k, filters, hybrid_weight)
+        _record_shadow(active_results, target_results, top_k, source)
+    except Exception as e:
+        logger.warning(f"Shadow comparison failed: {e}")
+
+def submit_shadow_read(tasks, top_k, filters, hybrid_weight, results):
+    """During the shadow window, compare a sample of live queries against the target off the request path"""
+    state = migration_state()
+    if not state or state.get("phase") != "shadow":
+        return
+    if random.random() >= get_config().rag.shadow_sample_rate:
+        return
+    async_processor.start()
+    async_processor.submit_task(_compare, list(tasks), top_k, filters, hybrid_weight, results, "live",
+                                priority=TaskPriority.LOW)
+
+def shadow_summary():
+    from app.models.sample_data import SystemState
+
+    counters = SystemState.get_value(SHADOW_KEY, {})
+    queries = counters.get("queries", 0)
+    return {
+        "queries": queries,
+        "live": counters.get("live", 0),
+        "replayed": counters.get("replayed", 0),
+        "overlap_at_k": round(counters.get("overlap_sum", 0.0) / queries, 3) if queries else None,
+        "top_user_agreement": round(counters.get("top_user_agree", 0) / queries, 3) if queries else None
+    }
+
+def _replay(state, count):
+    """Top up a quiet shadow window: run recent tasks through both collections"""
+    from app.agents.rag_registry import get_rag_system
+    from app.models.sample_data import SampleUserTask
+
+    active = get_rag_system()
+    if active is None:
+        return
+    top_k = 3
+    skip = state.get("replay_offset", 0)
+    tasks = list(SampleUserTask.objects().order_by("-created_at").skip(skip).limit(count))
+    if len(tasks) < count:
+        state["replay_exhausted"] = True
+    if not tasks:
+        return
+    state["replay_offset"] = skip + len(tasks)
+    _compare(tasks, top_k, None, None, active.retrieve_similar_tasks_batch(tasks, top_k), "replayed")
+
+def _build(state, time_budget):
+    target = target_system()
+    before = state.get("processed", 0)
+    started = time.time()
+    # A full build of a new collection: worth the process pool when one is configured
+    counters = target.index_completed_tasks(time_budget=time_budget, workers=get_config().rag.bulk_index_workers)
+    elapsed = time.time() - started
+
+    state["build_seconds"] = state.get("build_seconds", 0.0) + elapsed
+    state["built"] = state.get("built", 0) + max(counters["processed"] - before, 0)
+    state.update(processed=counters["processed"], total=counters["total"], upserted=counters["upserted"])
+    rate = state["built"] / state["build_seconds"] if state["build_seconds"] else 0.0
+    state["rows_per_second"] = round(rate, 1)
+    state["eta_seconds"] = round((counters["total"] - counters["processed"]) / rate) if rate else None
+
+    if counters["complete"]:
+        from app.models.sample_data import SystemState
+        SystemState.objects(key=SHADOW_KEY).delete()
+        state.update(phase="shadow", shadow_started_at=time.time(), eta_seconds=None)
+        logger.info(f"Migration to {_label(state['target'])}: collection built, starting the shadow window")
+
+def _shadow(state, time_budget):
+    rag_config = get_config().rag
+    summary = shadow_summary()
+    if summary["queries"] < rag_config.shadow_min_queries:
+        _replay(state, min(REPLAY_BATCH, rag_config.shadow_min_queries - summary["queries"]))
+        summary = shadow_summary()
+    state["shadow"] = summary
+    window_left = state["shadow_started_at"] + rag_config.shadow_seconds - time.time()
+    # Without live traffic the replayed tasks are all there is; do not wait for more
+    enough = summary["queries"] >= rag_config.shadow_min_queries or state.get("replay_exhausted")
+    if window_left > 0 or not enough:
+        state["eta_seconds"] = max(round(window_left), 0)
+        return
+
+    # Catch up on tasks changed since the build (queue completions were dual-written)
+    counters = target_system().index_completed_tasks(time_budget=time_budget)
+    state["processed"], state["total"] = counters["processed"], counters["total"]
+    if counters["complete"]:
+        _cutover(state)
+
+def _cutover(state, force=False):
+    from app.agents.rag_registry import set_active_embedding
+
+    min_overlap = get_config().rag.migration_min_overlap
+    overlap = state.get("shadow", {}).get("overlap_at_k")
+    if not force and min_overlap and overlap is not None and overlap < min_overlap:
+        state["phase"] = "held"
+        logger.warning(f"Migration to {_label(state['target'])} held: overlap@k {overlap} below {min_overlap}")
+        return
+    # One write moves every process over; the source collection is kept for rollback
+    set_active_embedding(state["target"])
+    state.update(phase="done", finished_at=time.time(), eta_seconds=0)
+    logger.info(f"Migration cutover: queries now served by {_label(state['target'])}")
+
+def migration_step(time_budget=None):
+    """Advance the migration from the active to the configured embedding by one time-boxed step.
+
+    Idle when they are the same. Returns the stored state (or {"phase": "idle"}).
+    """
+    from app.agents.rag_registry import active_embedding, configured_embedding
+
+    if not _step_lock.acquire(blocking=False):
+        return {**(migration_state(0) or {}), "busy": True}
+    try:
+        time_budget = time_budget if time_budget is not None else get_config().rag.migration_step_seconds
+        source, target = active_embedding(), configured_embedding()
+        state = migration_state(0)
+        if _same(source, target):
+            if state and state.get("phase") in ("building", "shadow", "held"):
+                # Config reverted to the active embedding mid-migration
+                state["phase"] = "cancelled"
+                _save(state)
+                logger.info(f"Migration to {_label(state['target'])} cancelled")
+            return {"phase": "idle"}
+
+        if not state or not _same(state.get("target"), target) or state.get("phase") in ("done", "cancelled"):
+            state = {"source": source, "target": target, "phase": "building", "started_at": time.time(),
+                     "processed": 0, "total": None, "built": 0, "build_seconds": 0.0, "eta_seconds": None}
+            _save(state)
+            logger.info(f"Starting embedding migration {_label(source)} → {_label(target)}")
+
+        if state["phase"] == "building":
+            _build(state, time_budget)
+        elif state["phase"] == "shadow":
+            _shadow(state, time_budget)
+        _save(state)
+        return state
+    finally:
+        _step_lock.release()
+
+def force_cutover():
+    """Cut over a held migration regardless of the shadow overlap"""
+    with _step_lock:
+        state = migration_state(0)
+        if not state or state.get("phase") != "held":
+            return state
+        _cutover(state, force=True)
+        _save(state)
+        return state
+
+def migration_status():
+    """Phase, progress and ETA of the current (or last) migration, for status screens"""
+    state = migration_state()
+    if not state:
+        return {"phase": "idle"}
+    status = {key: state.get(key) for key in ("phase", "processed", "total", "rows_per_second", "eta_seconds")}
+    status["source"], status["target"] = _label(state["source"]), _label(state["target"])
+    if state.get("total"):
+        status["percent"] = round(100.0 * state["processed"] / state["total"], 1)
+    if state.get("shadow"):
+        status["shadow"] = state["shadow"]
+    return status
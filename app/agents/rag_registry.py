@@ -0,0 +1,203 @@
+# app/agents/rag_registry.py
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from app.config.enhanced_config import get_config
+
+logger = logging.getLogger(__name__)
+
+# One embedding model, one Chroma client and one RAGSystem per process, created on
+# first use rather than at import. Everything that needs RAG goes through here.
+_lock = threading.RLock()
+_embedders = {}
+_client = None
+_rag_system = None
+_active = None
+_active_checked = 0.0
+_warmup = None  # Future resolved once the background warm-up query has run
+_warmup_thread = None
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+# SystemState key holding the embedding queries are served from; only a migration cutover changes it
+ACTIVE_EMBEDDING_KEY = "rag_active_embedding"
+ACTIVE_CHECK_SECONDS = 10
+# Longest a caller waits for a running warm-up before loading on its own
+WARMUP_WAIT_SECONDS = 120
+
+def resolve_backend(model_name: str, backend: str = None) -> str:
+    """Configured embedding backend, falling back to torch where no ONNX export exists"""
+    backend = backend or get_config().rag.embedding_backend
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r} (expected one of {EMBEDDING_BACKENDS})")
+    if backend != "torch":
+        from app.agents.onnx_embedder import ONNX_MODEL_NAME
+        if model_name != ONNX_MODEL_NAME:
+            logger.warning(f"No ONNX export for {model_name}, using the torch backend")
+            return "torch"
+    return backend
+
+def embedding_identity(model_name: str = None, backend: str = None) -> str:
+    """Name that keys collections and caches: backends with interchangeable vectors share it.
+
+    torch and fp32 ONNX run the same weights, so they share the existing collection.
+    The int8 model drifts slightly and gets its own collection (filled on next sync).
+    """
+    model_name = model_name or get_config().rag.embedding_model
+    backend = resolve_backend(model_name, backend)
+    return f"{model_name}:{backend}" if backend == "onnx-int8" else model_name
+
+def _load_embedder(model_name: str, backend: str, threads: int = None):
+    if backend == "torch":
+        from chromadb.utils import embedding_functions
+        return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name)
+    from app.agents.onnx_embedder import OnnxMiniLMEmbeddingFunction
+    return OnnxMiniLMEmbeddingFunction(
+        quantized=backend == "onnx-int8", threads=threads if threads is not None else get_config().rag.onnx_threads
+    )
+
+def get_embedder(model_name: str = None, backend: str = None):
+    """Shared embedding function for model_name (defaults to the configured model and backend)"""
+    model_name = model_name or get_config().rag.embedding_model
+    backend = resolve_backend(model_name, backend)
+    key = (model_name, backend)
+    embedder = _embedders.get(key)
+    if embedder is not None:
+        return embedder
+    with _lock:
+        if key not in _embedders:
+            logger.info(f"Loading embedding model {model_name} ({backend})")
+            embedder = _load_embedder(model_name, backend)
+            rag_config = get_config().rag
+            if rag_config.enable_embedding_cache:
+                from app.utils.embedding_cache import EmbeddingCache, CachedEmbeddingFunction
+                # One directory per vector space so every cache file has a single vector size
+                identity = embedding_identity(model_name, backend)
+                cache_dir = os.path.join(
+                    rag_config.embedding_cache_dir, hashlib.md5(identity.encode()).hexdigest()[:8]
+                )
+                embedder = CachedEmbeddingFunction(embedder, identity, EmbeddingCache(cache_dir))
+            _embedders[key] = embedder
+        return _embedders[key]
+
+def get_chroma_client():
+    """Shared Chroma PersistentClient for the configured path"""
+    global _client
+    if _client is not None:
+        return _client
+    with _lock:
+        if _client is None:
+            import chromadb
+            _client = chromadb.PersistentClient(path=get_config().rag.chroma_path)
+        return _client
+
+def configured_embedding():
+    """Embedding model and backend from config (the migration target when it differs from the active one)"""
+    model_name = get_config().rag.embedding_model
+    return {"model": model_name, "backend": resolve_backend(model_name)}
+
+def active_embedding():
+    """Embedding model and backend the shared RAGSystem serves queries from.
+
+    Stored in SystemState so every process switches together at a migration
+    cutover; the first call records the configured embedding. Re-read at most
+    every ACTIVE_CHECK_SECONDS.
+    """
+    global _active, _active_checked
+    if _active is not None and time.time() - _active_checked < ACTIVE_CHECK_SECONDS:
+        return _active
+    try:
+        from app.models.sample_data import SystemState
+        active = SystemState.get_value(ACTIVE_EMBEDDING_KEY)
+        if not active:
+            active = configured_embedding()
+            SystemState.set_value(ACTIVE_EMBEDDING_KEY, active)
+    except Exception as e:
+        logger.warning(f"Could not read the active embedding, using {'the last known' if _active else 'config'}: {e}")
+        active = _active or configured_embedding()
+    _active, _active_checked = active, time.time()
+    return active
+
+def set_active_embedding(embedding):
+    """Switch every process to embedding (a migration cutover)"""
+    global _active, _active_checked
+    from app.models.sample_data import SystemState
+    SystemState.set_value(ACTIVE_EMBEDDING_KEY, embedding)
+    _active, _active_checked = embedding, time.time()
+
+def get_rag_system():
+    """Shared RAGSystem, or None when it cannot be initialized (failure is logged, retried on next call)"""
+    global _rag_system
+    if _warmup is not None and not _warmup.done() and threading.current_thread() is not _warmup_thread:
+        wait_until_ready(WARMUP_WAIT_SECONDS)
+    active = active_embedding()
+    key = (active["model"], active["backend"])
+    rag_system = _rag_system
+    if rag_system is not None and (rag_system.model_name, rag_system.embedding_backend) == key:
+        return rag_system
+    with _lock:
+        if _rag_system is None or (_rag_system.model_name, _rag_system.embedding_backend) != key:
+            from app.agents.rag_agent import RAGSystem
+            try:
+                previous = _rag_system
+                _rag_system = RAGSystem(model_name=active["model"], embedding_backend=active["backend"])
+            except Exception as e:
+                logger.error(f"Failed to create RAG system: {e}")
+                return previous
+            if previous is not None:
+                # Cut over to another embedding: the old model is no longer needed here
+                _embedders.pop((previous.model_name, previous.embedding_backend), None)
+                logger.info(f"RAG system switched from {previous.embedding_identity} to {_rag_system.embedding_identity}")
+        return _rag_system
+
+def start_warmup(sync_history: bool = False) -> Future:
+    """Load the model, tokenizer and on-disk index in a background thread; returns the readiness future.
+
+    Until the future resolves, get_rag_system() callers wait on it instead of
+    loading a second copy. With sync_history the startup history sync runs in
+    the same thread once the system is ready.
+    """
+    global _warmup, _warmup_thread
+    with _lock:
+        if _warmup is None:
+            _warmup = Future()
+            _warmup_thread = threading.Thread(target=_run_warmup, args=(_warmup, sync_history),
+                                              name="rag-warmup", daemon=True)
+            _warmup_thread.start()
+        return _warmup
+
+def _run_warmup(future, sync_history):
+    started = time.time()
+    try:
+        rag_system = get_rag_system()
+        if rag_system is None:
+            raise RuntimeError("RAG system could not be initialized")
+        rag_system.warm_up()
+    except Exception as e:
+        logger.error(f"RAG warm-up failed: {e}")
+        future.set_exception(e)
+        return
+    elapsed = time.time() - started
+    logger.info(f"RAG warm-up finished in {elapsed:.1f}s")
+    future.set_result(elapsed)
+    if sync_history:
+        from app.agents.rag_agent import index_task_history
+        index_task_history()
+
+def wait_until_ready(timeout: float = None) -> bool:
+    """Block until a started warm-up has finished; False if it failed or timed out"""
+    future = _warmup
+    if future is None:
+        return True
+    try:
+        future.result(timeout)
+        return True
+    except Exception:
+        return False
+
+def is_loaded() -> bool:
+    """True once the shared RAGSystem exists (for status screens that must not trigger a load)"""
+    return _rag_system is not None
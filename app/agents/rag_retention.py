@@ -0,0 +1,167 @@
+# app/agents/rag_retention.py
+import logging
+import statistics
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.config.enhanced_config import get_config
+
+logger = logging.getLogger(__name__)
+
+SCAN_PAGE = 1000
+DEDUPE_BLOCK = 1024  # rows compared at once within one user's history
+LATENCY_SAMPLES = 20
+
+def retention_query():
+    """Mongo filter for the completed tasks the retention policy keeps in the RAG history.
+
+    The row cap becomes a completed_at cutoff (completed_at of the Nth newest
+    task), so callers can page through the result in any order.
+    """
+    from app.models.sample_data import SampleUserTask
+
+    rag_config = get_config().rag
+    query = {"status": "completed", "rag_excluded__ne": True}
+    if rag_config.retention_max_age_days:
+        query["completed_at__gte"] = datetime.now(timezone.utc) - timedelta(days=rag_config.retention_max_age_days)
+    if rag_config.retention_max_rows:
+        nth = SampleUserTask.objects(**query).order_by("-completed_at").skip(
+            rag_config.retention_max_rows - 1).only("completed_at").first()
+        if nth is not None and nth.completed_at:
+            query["completed_at__gte"] = nth.completed_at
+    return query
+
+def _scan(backend, include):
+    offset = 0
+    while True:
+        page = backend.get(include=include, limit=SCAN_PAGE, offset=offset)
+        if not page["ids"]:
+            return
+        yield page
+        offset += len(page["ids"])
+
+def expired_and_overflow(backend, max_age_days, max_rows, now=None):
+    """Row ids older than max_age_days, then ids beyond the newest max_rows"""
+    now = now or time.time()
+    cutoff = now - max_age_days * 86400 if max_age_days else None
+    rows = []
+    for page in _scan(backend, ["metadatas"]):
+        for row_id, meta in zip(page["ids"], page["metadatas"]):
+            rows.append((row_id, (meta or {}).get("completed_ts") or 0))
+
+    expired = [row_id for row_id, ts in rows if cutoff and ts and ts < cutoff]
+    expired_set = set(expired)
+    overflow = []
+    if max_rows:
+        remaining = sorted((r for r in rows if r[0] not in expired_set), key=lambda r: r[1], reverse=True)
+        overflow = [row_id for row_id, _ in remaining[max_rows:]]
+    return expired, overflow
+
+def near_duplicates(backend, threshold, skip=()):
+    """Older rows of the same user whose embedding is within `threshold` cosine of a newer one.
+
+    Only compared within one user's history: the same task done by different
+    people is evidence about who can do it, not a duplicate.
+    """
+    skip = set(skip)
+    by_user = defaultdict(lambda: {"ids": [], "ts": [], "vectors": []})
+    for page in backend.export_batches():
+        for row_id, meta, vector in zip(page["ids"], page["metadatas"], page["embeddings"]):
+            if row_id in skip:
+                continue
+            group = by_user[(meta or {}).get("user_id", "unknown")]
+            group["ids"].append(row_id)
+            group["ts"].append((meta or {}).get("completed_ts") or 0)
+            group["vectors"].append(vector)
+
+    duplicates = []
+    for group in by_user.values():
+        if len(group["ids"]) < 2:
+            continue
+        order = np.argsort(group["ts"])[::-1]  # newest first
+        vectors = np.asarray(group["vectors"], dtype=np.float32)[order]
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        ids = [group["ids"][i] for i in order]
+        for start in range(1, len(ids), DEDUPE_BLOCK):
+            block = vectors[start:start + DEDUPE_BLOCK]
+            sims = block @ vectors[:start + len(block)].T
+            # Only compare against newer rows (lower index in newest-first order)
+            sims[np.arange(len(block))[:, None] <= np.arange(start + len(block))[None, :] - start] = -1.0
+            for offset in np.flatnonzero(sims.max(axis=1) >= threshold):
+                duplicates.append(ids[start + offset])
+    return duplicates
+
+def query_latency(rag_system, samples=LATENCY_SAMPLES, n_results=10):
+    """p50/p95 query latency (ms) using stored embeddings as queries, so no model time is included"""
+    page = rag_system.collection.get(include=["embeddings"], limit=samples)
+    if not page["ids"]:
+        return {"p50_ms": 0.0, "p95_ms": 0.0}
+    latencies = []
+    for vector in page["embeddings"]:
+        started = time.perf_counter()
+        rag_system.collection.query(query_embeddings=[vector], n_results=n_results)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 2)
+    }
+
+def plan_retention(rag_system):
+    """Which rows the configured policy would remove, by reason"""
+    rag_config = get_config().rag
+    expired, overflow = expired_and_overflow(
+        rag_system.collection, rag_config.retention_max_age_days, rag_config.retention_max_rows
+    )
+    duplicates = []
+    if rag_config.dedupe_similarity:
+        duplicates = near_duplicates(rag_system.collection, rag_config.dedupe_similarity, skip=expired + overflow)
+    return {"expired": expired, "overflow": overflow, "duplicates": duplicates}
+
+def run_retention(dry_run=False, compact=None):
+    """Apply retention, dedupe and (when enough was deleted, or compact=True) compaction.
+
+    Returns a report with the planned deletions and before/after size and
+    query latency. compact=None lets the deleted-row ratio decide.
+    """
+    from app.agents.rag_registry import get_rag_system
+    from app.models.sample_data import SampleUserTask
+
+    rag_system = get_rag_system()
+    if rag_system is None:
+        logger.error("RAG system not initialized")
+        return {"status": "not_initialized"}
+
+    plan = plan_retention(rag_system)
+    report = {
+        "dry_run": dry_run,
+        "expired": len(plan["expired"]),
+        "overflow": len(plan["overflow"]),
+        "duplicates": len(plan["duplicates"]),
+        "before": {**rag_system.disk_usage(), **query_latency(rag_system)}
+    }
+    if dry_run:
+        return report
+
+    to_delete = plan["expired"] + plan["overflow"] + plan["duplicates"]
+    if plan["duplicates"]:
+        # Keep full syncs from re-indexing them (age/count limits are re-applied by retention_query)
+        SampleUserTask.objects(task_id__in=plan["duplicates"]).update(set__rag_excluded=True)
+    rag_system.delete_tasks(to_delete)
+
+    deleted = rag_system.deleted_since_compaction()
+    live = rag_system.collection.count()
+    ratio = deleted / (deleted + live) if deleted + live else 0.0
+    if compact is None:
+        compact = deleted > 0 and ratio >= get_config().rag.compaction_deleted_ratio
+    report["deleted_ratio"] = round(ratio, 3)
+    report["compacted"] = bool(compact)
+    if compact:
+        rag_system.compact()
+
+    report["after"] = {**rag_system.disk_usage(), **query_latency(rag_system)}
+    logger.info(f"Retention removed {len(to_delete)} rows (compacted: {report['compacted']})")
+    return report
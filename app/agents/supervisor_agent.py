@@ -29,67 +29,254 @@ def supervise():
         reassign_task(task.task_id)'''
 # app/agents/supervisor_agent.py
 
-from app.models.sample_data import SampleUserTask
+from app.models.sample_data import SampleUser, SampleUserTask, SystemState
 from app.agents.task_assign import assign_task
-from app.agents.task_reassign import reassign_task
-from app.agents.rag_agent import retrieve_similar_tasks
-from datetime import datetime, timedelta
+from app.agents.task_reassign import reassign_task, format_rag_context
+from app.agents.rag_agent import retrieve_similar_tasks_batch
+from config import RAG_ENABLED
+from app.config.enhanced_config import get_config
+from app.utils import cycle_metrics
+from app.utils.cycle_metrics import timed_phase, task_scope
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from mongoengine.queryset.visitor import Q
 from app.utils.task_utils import check_overdue_tasks
 
-def supervise():
-    check_overdue_tasks() #newly added 13.6
-    """Periodically checks and assigns/reassigns tasks with RAG integration."""
+WATERMARK_KEY = "supervisor_watermark"
+OVERDUE_HORIZON = timedelta(days=2)
+REASSIGN_COOLDOWN_SECONDS = 86400
+
+def _as_utc(value):
+    """Mongo may hand back naive datetimes for legacy documents"""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def _load_watermark():
+    """Load the persisted high-water mark and the tasks deferred by the previous cycle"""
+    state = SystemState.get_value(WATERMARK_KEY, {}) or {}
+    return {
+        "mark": _as_utc(state.get("mark")),
+        "deferred_pending": list(state.get("deferred_pending", [])),
+        "deferred_overdue": list(state.get("deferred_overdue", []))
+    }
+
+def _save_watermark(mark, deferred_pending, deferred_overdue):
+    SystemState.set_value(WATERMARK_KEY, {
+        "mark": mark,
+        "deferred_pending": sorted(set(deferred_pending)),
+        "deferred_overdue": sorted(set(deferred_overdue))
+    })
+
+def _changed_since(mark):
+    """Tasks written after the mark; legacy documents without updated_at fall back to created_at"""
+    return Q(updated_at__gt=mark) | (Q(updated_at=None) & Q(created_at__gt=mark))
+
+def _select_candidates(state, mark, horizon):
+    """Fetch the pending and overdue tasks this cycle has to look at"""
+    if mark is None:
+        print("🧭 No watermark found - running full scan")
+        users_changed = SampleUser.objects.count()
+        pending_tasks = list(SampleUserTask.objects(status='pending'))
+        overdue_tasks = list(SampleUserTask.objects(status='in_progress', due_date__lt=horizon))
+        return pending_tasks, overdue_tasks, users_changed
+
+    print(f"🧭 Incremental scan since {mark.isoformat()}")
+    users_changed = SampleUser.objects(updated_at__gt=mark).count()
+    pending_filter = _changed_since(mark)
+    # Pending tasks that found no candidate are only worth retrying once a user changed
+    if users_changed and state["deferred_pending"]:
+        pending_filter = pending_filter | Q(task_id__in=state["deferred_pending"])
+    pending_tasks = list(SampleUserTask.objects(Q(status='pending') & pending_filter))
+
+    # Overdue-ness is time driven, so also pick up tasks that crossed the horizon since the mark
+    overdue_filter = (
+        _changed_since(mark)
+        | Q(due_date__gte=mark + OVERDUE_HORIZON)
+        | Q(task_id__in=state["deferred_overdue"])
+    )
+    overdue_tasks = list(SampleUserTask.objects(
+        Q(status='in_progress') & Q(due_date__lt=horizon) & overdue_filter
+    ))
+    return pending_tasks, overdue_tasks, users_changed
+
+def _handle_pending(task, similar_tasks=None):
+    """Assign one pending task; returns an outcome record for the cycle report"""
+    lines = [f"  - Assigning task {task.task_id} ({task.name})"]
+    with task_scope(task.task_id):
+        result = assign_task(task.task_id, similar_tasks=similar_tasks)
+    lines.append(f"    ✅ Assignment result: {result.get('status', 'failed')}")
+    outcome = "assigned" if result.get('status') == 'success' else "failed"
+    return {"task_id": task.task_id, "kind": "pending", "outcome": outcome, "result": result, "lines": lines}
+
+def _handle_overdue(task, now, similar_tasks=None):
+    """Reassign one overdue task unless it is in cooldown; returns an outcome record"""
+    with task_scope(task.task_id):
+        return _reassign_overdue(task, now, similar_tasks or [])
+
+def _in_cooldown(task, now):
+    """True if the task was reassigned less than REASSIGN_COOLDOWN_SECONDS ago"""
+    last_reassign = next(
+        (log['timestamp'] for log in reversed(task.assignment_log)
+         if log.get('action') == 'reassigned'), None)
+    return bool(last_reassign) and (now - _as_utc(last_reassign)).total_seconds() < REASSIGN_COOLDOWN_SECONDS
+
+def _reassign_overdue(task, now, similar_tasks):
+    lines = [f"\n🔍 Analyzing task {task.task_id} ({task.name})"]
+
+    # Check last reassignment time
+    if _in_cooldown(task, now):
+        lines.append("  ⏩ Skipping: Reassigned within last 24 hours")
+        return {"task_id": task.task_id, "kind": "overdue", "outcome": "skipped_cooldown", "result": {}, "lines": lines}
+
+    # RAG Integration (retrieved for the whole cycle in one batch)
+    lines.append("  🔎 Querying RAG system for similar tasks...")
+
+    if similar_tasks:
+        lines.append(f"  📚 Found {len(similar_tasks)} historical matches:")
+        for st in similar_tasks:
+            lines.append(f"    - {st['task_id']} (User: {st['user_id']}, Outcome: {st.get('outcome', 'unknown')})")
+    else:
+        lines.append("  ℹ️ No similar historical tasks found")
+
+    # Reassign with RAG context
+    lines.append(f"  🔄 Initiating reassignment for {task.task_id}")
+    # Hand the batched matches through so reassign_task doesn't query RAG again
+    result = reassign_task(task.task_id, rag_context=format_rag_context(similar_tasks))
+
+    if result.get('status') == 'success':
+        lines.append(f"    ✅ Reassigned to {result['user_id']} via {result['method']}")
+        outcome = "reassigned"
+    else:
+        lines.append(f"    ❌ Reassignment failed: {result.get('error', 'Unknown error')}")
+        outcome = "failed"
+    return {"task_id": task.task_id, "kind": "overdue", "outcome": outcome, "result": result, "lines": lines}
+
+def _run_handlers(jobs, parallel, max_workers):
+    """Run (handler, args) pairs sequentially or on a bounded thread pool, yielding outcomes"""
+    if not parallel or len(jobs) <= 1:
+        for handler, args in jobs:
+            yield handler(*args)
+        return
+
+    # Bounded concurrency: at most max_workers LLM/RAG round-trips in flight.
+    # User capacity stays consistent through the atomic reservations in task_utils.
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="supervisor") as pool:
+        # Each worker runs in a copy of the caller's context so timers land on this cycle
+        futures = {
+            pool.submit(contextvars.copy_context().run, handler, *args): (handler, args[0])
+            for handler, args in jobs
+        }
+        for future in as_completed(futures):
+            handler, task = futures[future]
+            try:
+                yield future.result()
+            except Exception as e:
+                kind = "pending" if handler is _handle_pending else "overdue"
+                yield {"task_id": task.task_id, "kind": kind, "outcome": "failed",
+                       "result": {"error": str(e)}, "lines": [f"  ❌ {task.task_id}: {e}"]}
+
+def _run_cycle(recorder, report, full_scan, parallel, max_workers):
+    """One supervisor cycle; fills report in place so a failure still leaves partial counters"""
+    with timed_phase("overdue_check"):
+        check_overdue_tasks() #newly added 13.6
     print("\n=== SUPERVISOR CYCLE STARTED ===")
     print(f"[{datetime.now().isoformat()}] Checking system status...")
 
-    # Check for unassigned pending tasks
-    pending_tasks = SampleUserTask.objects(status='pending')
-    print(f"\n🔄 Found {len(pending_tasks)} pending tasks:")
-    for task in pending_tasks:
-        print(f"  - Assigning task {task.task_id} ({task.name})")
-        result = assign_task(task.task_id)
-        print(f"    ✅ Assignment result: {result.get('status', 'failed')}")
+    # Taken before any query so writes racing with this cycle land after the new mark
+    cycle_start = datetime.now(timezone.utc)
+    with timed_phase("mongo_query"):
+        state = _load_watermark()
+    mark = None if full_scan else state["mark"]
+    horizon = cycle_start + OVERDUE_HORIZON
 
-    # Check for overdue in_progress tasks
-    now = datetime.utcnow()
-    overdue_tasks = SampleUserTask.objects(
-        status='in_progress',
-        due_date__lt=now + timedelta(days=2)
-    )
-    print(f"\n⏰ Found {len(overdue_tasks)} overdue tasks:")
+    with timed_phase("mongo_query"):
+        pending_tasks, overdue_tasks, users_changed = _select_candidates(state, mark, horizon)
+        tasks_total = SampleUserTask.objects.count()
+        users_total = SampleUser.objects.count()
 
-    for task in overdue_tasks:
-        print(f"\n🔍 Analyzing task {task.task_id} ({task.name})")
+    deferred_pending = [] if mark is None or users_changed else [
+        t for t in state["deferred_pending"] if t not in {p.task_id for p in pending_tasks}
+    ]
+    deferred_overdue = []
+    report.update({
+        "mode": "full" if mark is None else "incremental",
+        "watermark": mark.isoformat() if mark else None,
+        "tasks_scanned": len(pending_tasks) + len(overdue_tasks),
+        "tasks_total": tasks_total,
+        "users_scanned": users_changed,
+        "users_total": users_total,
+        "assigned": 0,
+        "reassigned": 0,
+        "skipped_cooldown": 0,
+        "failed": 0
+    })
 
-        # Check last reassignment time
-        last_reassign = next(
-            (log['timestamp'] for log in reversed(task.assignment_log)
-             if log.get('action') == 'reassigned'), None)
+    if parallel and max_workers is None:
+        max_workers = get_config().async_config.max_workers
+    report["parallel"] = bool(parallel)
+    report["max_workers"] = max_workers if parallel else 1
 
-        if last_reassign and (now - last_reassign).total_seconds() < 86400:
-            print("  ⏩ Skipping: Reassigned within last 24 hours")
-            continue
+    print(f"\n🔄 Found {len(pending_tasks)} pending tasks:")
+    print(f"⏰ Found {len(overdue_tasks)} overdue tasks:")
+    now = datetime.now(timezone.utc)
+
+    # One embedding pass and one Chroma query for every task that needs RAG context
+    rag_tasks = (list(pending_tasks) if RAG_ENABLED else []) + [
+        task for task in overdue_tasks if not _in_cooldown(task, now)
+    ]
+    similar = {}
+    if rag_tasks:
+        similar = dict(zip([task.task_id for task in rag_tasks], retrieve_similar_tasks_batch(rag_tasks, top_k=3)))
+
+    jobs = [(_handle_pending, (task, similar.get(task.task_id))) for task in pending_tasks]
+    jobs += [(_handle_overdue, (task, now, similar.get(task.task_id))) for task in overdue_tasks]
 
-        # RAG Integration
-        print("  🔎 Querying RAG system for similar tasks...")
-        similar_tasks = retrieve_similar_tasks(task, top_k=3)
+    for outcome in _run_handlers(jobs, parallel, max_workers):
+        print("\n".join(outcome["lines"]))
+        report[outcome["outcome"]] += 1
+        # Tasks not settled this cycle are re-checked next cycle even if unchanged
+        if outcome["outcome"] in ("skipped_cooldown", "failed"):
+            if outcome["kind"] == "overdue":
+                deferred_overdue.append(outcome["task_id"])
+            else:
+                deferred_pending.append(outcome["task_id"])
 
-        if similar_tasks:
-            print(f"  📚 Found {len(similar_tasks)} historical matches:")
-            for st in similar_tasks:
-                print(f"    - {st['task_id']} (User: {st['user_id']}, Outcome: {st['outcome']})")
-            rag_context = "\nHistorical context considered in reassignment"
-        else:
-            print("  ℹ️ No similar historical tasks found")
-            rag_context = ""
+    with timed_phase("mongo_save"):
+        _save_watermark(cycle_start, deferred_pending, deferred_overdue)
+    report["new_watermark"] = cycle_start.isoformat()
+    recorder.incr("tasks_scanned", report["tasks_scanned"])
+    for counter in ("assigned", "reassigned", "skipped_cooldown", "failed"):
+        recorder.incr(counter, report[counter])
 
-        # Reassign with RAG context
-        print(f"  🔄 Initiating reassignment for {task.task_id}")
-        result = reassign_task(task.task_id, rag_context=rag_context)
+def supervise(full_scan=False, parallel=False, max_workers=None):
+    """Periodically checks and assigns/reassigns tasks with RAG integration.
 
-        if result.get('status') == 'success':
-            print(f"    ✅ Reassigned to {result['user_id']} via {result['method']}")
-        else:
-            print(f"    ❌ Reassignment failed: {result.get('error', 'Unknown error')}")
+    Only tasks written since the last persisted watermark are fetched, plus
+    tasks that crossed the overdue horizon since then and tasks the previous
+    cycle had to defer. Pass full_scan=True to ignore the watermark.
+    With parallel=True tasks are processed concurrently, bounded by
+    max_workers (defaults to AsyncConfig.max_workers).
+    Returns a cycle report with documents scanned vs total; the same report,
+    with per-phase and per-task timings, is kept by app.utils.cycle_metrics.
+    """
+    recorder = cycle_metrics.start_cycle("supervisor")
+    report = {}
+    try:
+        _run_cycle(recorder, report, full_scan, parallel, max_workers)
+    except Exception as e:
+        # The cycle is still recorded, with whatever counters it reached
+        report["error"] = str(e)
+        raise
+    finally:
+        record = cycle_metrics.finish_cycle(recorder, report)
+        report["duration_seconds"] = record["duration_seconds"]
+        report["phases"] = {phase: data["seconds"] for phase, data in record["phases"].items()}
 
+    print(f"\n📉 Scanned {report['tasks_scanned']}/{report['tasks_total']} task documents "
+          f"({report['users_scanned']}/{report['users_total']} users changed)")
+    print(f"⏱️ Cycle took {report['duration_seconds']:.2f}s: "
+          + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in report["phases"].items()))
     print("\n=== SUPERVISOR CYCLE COMPLETED ===")
+    return report
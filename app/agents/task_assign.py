@@ -4,12 +4,14 @@ from app.models.sample_data import SampleUser, SampleUserTask
 from app.utils.dsa_utils import filter_users_for_task
 from app.agents.mistral_llm import query_mistral_llm
 from app.agents.rag_agent import retrieve_similar_tasks
+from app.utils.task_utils import reserve_user_capacity, release_user_capacity
+from app.utils.cycle_metrics import timed_phase, count
 from config import RAG_ENABLED
 from datetime import datetime
 import time
 import json
 
-def assign_task(task_id, force_user_id=None):
+def assign_task(task_id, force_user_id=None, similar_tasks=None):
     task = SampleUserTask.objects(task_id=task_id).first()
     if not task:
         return {"error": "Task not found"}
@@ -44,7 +46,9 @@ def assign_task(task_id, force_user_id=None):
     # RAG: Retrieve similar tasks
     rag_context = ""
     if RAG_ENABLED:
-        similar_tasks = retrieve_similar_tasks(task, top_k=3)
+        # Batch callers (the supervisor) pass results they already retrieved
+        if similar_tasks is None:
+            similar_tasks = retrieve_similar_tasks(task, top_k=3)
         if similar_tasks:
             rag_context = "\nSimilar historical tasks:\n"
             for t in similar_tasks:
@@ -67,7 +71,9 @@ Recommend the best user for this task based on:
 Response format: {{ "user_id": "U1001", "reason": "Detailed explanation..." }}
 """
     start_time = time.time()
-    llm_response = query_mistral_llm(prompt)
+    count("llm_calls")
+    with timed_phase("llm"):
+        llm_response = query_mistral_llm(prompt)
     processing_time = time.time() - start_time
     try:
         result = json.loads(llm_response)
@@ -77,6 +83,7 @@ Response format: {{ "user_id": "U1001", "reason": "Detailed explanation..." }}
         return finalize_assignment(task, user, "llm_recommended", result["reason"], candidate_info, processing_time)
     except Exception as e:
         # Fallback: choose candidate with highest match score
+        count("fallbacks")
         best_candidate = max(candidates, key=lambda x: x[1])
         user = best_candidate[0]
         reason = f"Algorithmic fallback - Highest match score: {best_candidate[1]}"
@@ -84,18 +91,30 @@ Response format: {{ "user_id": "U1001", "reason": "Detailed explanation..." }}
 
 def finalize_assignment(task, user, method, reason="", candidates=None, processing_time=0):
     """Assign task to user and update logs."""
-    task.user_id = user.user_id
-    task.status = 'in_progress'
-    task.started_at = datetime.utcnow()
-    user.current_ongoing_tasks += 1
-    user.save()
-    task.add_log_entry("assigned", {
-        "method": method,
-        "reason": reason,
-        "processing_time": processing_time,
-        "candidates": candidates
-    })
-    task.save()
+    with timed_phase("save"):
+        return _save_assignment(task, user, method, reason, candidates, processing_time)
+
+def _save_assignment(task, user, method, reason, candidates, processing_time):
+    # Atomic check-and-increment; another worker may have filled the user since candidates were ranked
+    if not reserve_user_capacity(user.user_id):
+        return {"error": f"User {user.user_id} reached capacity before assignment could be saved"}
+    previous = (task.user_id, task.status, task.started_at)
+    try:
+        task.user_id = user.user_id
+        task.status = 'in_progress'
+        task.started_at = datetime.utcnow()
+        task.add_log_entry("assigned", {
+            "method": method,
+            "reason": reason,
+            "processing_time": processing_time,
+            "candidates": candidates
+        })
+        task.save()
+    except Exception:
+        # The slot was taken for an assignment that never got saved
+        release_user_capacity(user.user_id)
+        task.user_id, task.status, task.started_at = previous
+        raise
     return {
         "status": "success",
         "user_id": user.user_id,
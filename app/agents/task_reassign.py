@@ -4,6 +4,8 @@ from app.models.sample_data import SampleUser, SampleUserTask
 from app.utils.dsa_utils import filter_users_for_task
 from app.agents.mistral_llm import query_mistral_llm
 from app.agents.rag_agent import retrieve_similar_tasks
+from app.utils.task_utils import reserve_user_capacity, release_user_capacity
+from app.utils.cycle_metrics import timed_phase, count
 from datetime import datetime, timedelta
 import time
 import json
@@ -88,7 +90,9 @@ def handle_auto_reassignment(task, rag_context):
         # Prepare and execute LLM request
         prompt = build_llm_prompt(task, candidates, rag_context)
         start_time = time.time()
-        llm_response = query_mistral_llm(prompt, task)
+        count("llm_calls")
+        with timed_phase("llm"):
+            llm_response = query_mistral_llm(prompt, task)
         processing_time = time.time() - start_time
 
         try:
@@ -103,6 +107,7 @@ def handle_auto_reassignment(task, rag_context):
             
         except Exception as e:
             logger.warning("🔄 Falling back to algorithmic selection")
+            count("fallbacks")
             best_candidate = max(candidates, key=lambda x: x[1])
             return finalize_reassignment(task, best_candidate[0], "algorithmic",
                                        "Fallback to highest match score", rag_context, processing_time)
@@ -135,20 +140,20 @@ Response format: {{ "user_id": "UXXXX", "reason": "Detailed explanation..." }}""
 
 def finalize_reassignment(task, user, method, reason, rag_context, processing_time=0):
     """Finalize the reassignment and update all records"""
+    with timed_phase("save"):
+        return _save_reassignment(task, user, method, reason, rag_context, processing_time)
+
+def _save_reassignment(task, user, method, reason, rag_context, processing_time):
+    old_user_id = task.user_id
+    moved = old_user_id != user.user_id
+    # Reserve the new slot atomically; the old one is freed only once the task is saved
+    if moved:
+        if not reserve_user_capacity(user.user_id):
+            raise ValueError(f"User {user.user_id} reached capacity before reassignment could be saved")
+        logger.info(f"🔒 Reserved capacity for {user.user_id}")
+
+    previous = (task.user_id, task.reassigned_count, len(task.assignment_log))
     try:
-        old_user_id = task.user_id
-        old_user = SampleUser.objects(user_id=old_user_id).first()
-
-        # Update user workloads first
-        if old_user:
-            old_user.current_ongoing_tasks = max(0, old_user.current_ongoing_tasks - 1)
-            old_user.save()
-            logger.info(f"🔓 Freed capacity for {old_user.user_id}")
-
-        user.current_ongoing_tasks += 1
-        user.save()
-        logger.info(f"🔒 Updated workload for {user.user_id}: {user.current_ongoing_tasks}")
-
         # Update task record
         task.user_id = user.user_id
         task.reassigned_count += 1
@@ -159,19 +164,26 @@ def finalize_reassignment(task, user, method, reason, rag_context, processing_ti
             "rag_context": rag_context
         })
         task.save()
-
-        logger.info(f"✅ Successfully reassigned {task.task_id} to {user.user_id}")
-        return {
-            "status": "success",
-            "user_id": user.user_id,
-            "method": method,
-            "processing_time": f"{processing_time:.2f}s"
-        }
-
     except Exception as e:
         logger.error(f"Finalization failed: {str(e)}")
+        # Nothing was saved: give the reserved slot back and undo the in-memory changes
+        if moved:
+            release_user_capacity(user.user_id)
+        task.user_id, task.reassigned_count, log_length = previous
+        del task.assignment_log[log_length:]
         raise
 
+    if moved and old_user_id and release_user_capacity(old_user_id):
+        logger.info(f"🔓 Freed capacity for {old_user_id}")
+
+    logger.info(f"✅ Successfully reassigned {task.task_id} to {user.user_id}")
+    return {
+        "status": "success",
+        "user_id": user.user_id,
+        "method": method,
+        "processing_time": f"{processing_time:.2f}s"
+    }
+
 def format_rag_context(similar_tasks):
     """Format RAG results for LLM consumption"""
     if not similar_tasks:
@@ -0,0 +1,557 @@
+# app/agents/vector_backends.py
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from app.agents.quantization import load_quantizer, make_quantizer, rerank_top_k, save_quantizer
+
+logger = logging.getLogger(__name__)
+
+GROW_ROWS = 4096  # minimum number of rows added when the NumPy vector file grows
+EXPORT_PAGE = 1000
+VECTOR_FILE = "vectors.f32"
+MIN_QUANTIZE_ROWS = 1000  # below this the float matrix is small enough to scan directly
+QUANTIZER_FIT_ROWS = 50_000
+ENCODE_CHUNK = 65536
+
+class VectorBackend:
+    """What RAGSystem needs from a vector store.
+
+    Method names and result shapes follow the Chroma collection API (lists of
+    lists per query, cosine distances), so the Chroma collection and the NumPy
+    index are interchangeable under RAGSystem.
+    """
+
+    name = "base"
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]],
+               embeddings: Optional[Sequence[Sequence[float]]] = None):
+        raise NotImplementedError
+
+    def get(self, ids: List[str] = None, include: List[str] = None, where: Dict = None,
+            limit: int = None, offset: int = None) -> Dict[str, list]:
+        raise NotImplementedError
+
+    def query(self, query_texts: List[str] = None, n_results: int = 10, include: List[str] = None,
+              where: Dict = None, query_embeddings: Sequence[Sequence[float]] = None) -> Dict[str, list]:
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]):
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def export_batches(self, page_size: int = EXPORT_PAGE) -> Iterator[Dict[str, list]]:
+        """All rows with their stored embeddings, page by page (used to switch backends)"""
+        offset = 0
+        while True:
+            page = self.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                return
+            yield page
+            offset += len(page["ids"])
+
+    def import_from(self, other: "VectorBackend") -> int:
+        """Copy every row of another backend, reusing its embeddings (no model inference)"""
+        copied = 0
+        for page in other.export_batches():
+            self.upsert(page["ids"], page["documents"], page["metadatas"], embeddings=page["embeddings"])
+            copied += len(page["ids"])
+        logger.info(f"Imported {copied} rows from {other.name} into {self.name}")
+        return copied
+
+class ChromaBackend(VectorBackend):
+    """The Chroma PersistentClient collection (HNSW, persisted by Chroma).
+
+    Collections are opened without an embedding function: Chroma >= 1.0 persists
+    the function's name and refuses to reopen a collection with a different one
+    (torch vs ONNX for the same weights). Vectors always come from `embedder` here.
+    """
+
+    name = "chroma"
+
+    def __init__(self, collection, embedder=None):
+        self.collection = collection
+        self.embedder = embedder
+
+    def upsert(self, ids, documents, metadatas, embeddings=None):
+        if embeddings is None:
+            embeddings = self.embedder(list(documents))
+        self.collection.upsert(ids=ids, documents=documents, metadatas=metadatas,
+                               embeddings=[list(map(float, e)) for e in embeddings])
+
+    def get(self, ids=None, include=None, where=None, limit=None, offset=None):
+        kwargs = {k: v for k, v in (("ids", ids), ("where", where), ("limit", limit), ("offset", offset))
+                  if v is not None}
+        return self.collection.get(include=include or ["metadatas", "documents"], **kwargs)
+
+    def query(self, query_texts=None, n_results=10, include=None, where=None, query_embeddings=None):
+        kwargs = {"where": where} if where else {}
+        if query_embeddings is None:
+            query_embeddings = self.embedder(list(query_texts))
+        return self.collection.query(query_embeddings=[list(map(float, e)) for e in query_embeddings],
+                                     n_results=n_results, include=include or ["metadatas", "documents", "distances"],
+                                     **kwargs)
+
+    def delete(self, ids):
+        if ids:
+            self.collection.delete(ids=ids)
+
+    def count(self):
+        return self.collection.count()
+
+class NumpyBackend(VectorBackend):
+    """Exact cosine search over a memory-mapped float32 matrix.
+
+    Vectors are L2-normalised on write, so a query is one matrix-vector product
+    plus np.argpartition for the top-k. Ids, metadata and documents live in a
+    SQLite table next to the matrix; metadata is kept in memory for `where`
+    filtering, documents are read only for returned rows. Other processes'
+    writes are picked up through SQLite's data_version before each read.
+
+    With storage='int8' or 'pca' the scan runs over compact in-memory codes
+    instead; the best rerank_factor * k rows are then re-scored against the
+    float32 vectors on disk, so only those pages are ever read.
+    """
+
+    name = "numpy"
+
+    def __init__(self, directory: str, embedder, storage: str = "float32", pca_dim: int = 64,
+                 rerank_factor: int = 10):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.embedder = embedder
+        self.storage = storage
+        self.pca_dim = pca_dim
+        self.rerank_factor = rerank_factor
+        self._quantizer_path = os.path.join(directory, f"quantizer_{storage}.npz")
+        self._quantizer = None
+        self._codes = None
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            os.path.join(directory, "rows.sqlite"),
+            timeout=30,
+            check_same_thread=False,
+            isolation_level=None  # explicit BEGIN/COMMIT below
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rows (id TEXT PRIMARY KEY, row INTEGER NOT NULL, "
+            "document TEXT, metadata TEXT)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._vec_path = None
+        self.dim = None
+        self._matrix = None
+        self._data_version = None
+        self._load()
+
+    # --- loading -----------------------------------------------------------
+
+    def _load(self):
+        """(Re)read ids and metadata from SQLite and map the vector file"""
+        with self._lock:
+            stored = dict(self._conn.execute("SELECT name, value FROM meta WHERE name IN ('dim', 'vectors')"))
+            self.dim = int(stored["dim"]) if "dim" in stored else None
+            # compact() writes a new vector file and switches to it in the same commit as the row renumbering
+            self._vec_path = os.path.join(self.directory, stored.get("vectors", VECTOR_FILE))
+            if not os.path.exists(self._vec_path):
+                open(self._vec_path, "ab").close()
+            self._row_of: Dict[str, int] = {}
+            self._ids: Dict[int, str] = {}
+            self._metadata: Dict[int, Dict[str, Any]] = {}
+            for row_id, row, metadata in self._conn.execute("SELECT id, row, metadata FROM rows"):
+                self._row_of[row_id] = row
+                self._ids[row] = row_id
+                self._metadata[row] = json.loads(metadata) if metadata else {}
+            self._n_rows = max(self._ids, default=-1) + 1
+            self._alive = np.zeros(self._n_rows, dtype=bool)
+            if self._ids:
+                self._alive[list(self._ids)] = True
+            self._columns = {}
+            self._matrix = None
+            self._map(self._n_rows)
+            self._codes = None
+            self._build_codes()
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _read_rows(self, start: int, stop: int) -> np.ndarray:
+        """Float rows read with plain file I/O, so bulk passes don't leave the whole memmap resident"""
+        with open(self._vec_path, "rb") as f:
+            f.seek(start * self.dim * 4)
+            return np.fromfile(f, dtype=np.float32, count=(stop - start) * self.dim).reshape(-1, self.dim)
+
+    def _fetch_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Float vectors for the given rows, read in file order"""
+        order = np.argsort(rows)
+        out = np.empty((len(rows), self.dim), dtype=np.float32)
+        out[order] = self._matrix[rows[order]]
+        return out
+
+    def _build_codes(self):
+        """Fit (or load) the quantizer and encode every row; no-op for float32 storage"""
+        if self.storage == "float32" or self.dim is None or self._n_rows < MIN_QUANTIZE_ROWS:
+            return
+        if self._quantizer is None and os.path.exists(self._quantizer_path):
+            self._quantizer = load_quantizer(self._quantizer_path)
+        if self._quantizer is None:
+            sample = self._read_rows(0, min(self._n_rows, QUANTIZER_FIT_ROWS))
+            self._quantizer = make_quantizer(self.storage, self.pca_dim).fit(sample)
+            save_quantizer(self._quantizer, self._quantizer_path)
+        self._codes = np.concatenate([
+            self._quantizer.encode(self._read_rows(start, min(start + ENCODE_CHUNK, self._n_rows)))
+            for start in range(0, self._n_rows, ENCODE_CHUNK)
+        ])
+
+    def _refresh(self):
+        # data_version only moves for commits made by other connections (processes)
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._load()
+
+    def _set_rows(self, ids, rows, metadatas, vectors):
+        """Apply this process's own committed writes to the in-memory view"""
+        self._n_rows = max(self._n_rows, max(rows) + 1)
+        if self._codes is not None:
+            if len(self._codes) < self._n_rows:
+                grown = np.zeros((self._n_rows, self._codes.shape[1]), dtype=self._codes.dtype)
+                grown[:len(self._codes)] = self._codes
+                self._codes = grown
+            self._codes[rows] = self._quantizer.encode(vectors)
+        if len(self._alive) < self._n_rows:
+            self._alive = np.concatenate([self._alive, np.zeros(self._n_rows - len(self._alive), dtype=bool)])
+        for row_id, row, meta in zip(ids, rows, metadatas):
+            self._row_of[row_id] = row
+            self._ids[row] = row_id
+            self._metadata[row] = meta or {}
+            self._alive[row] = True
+        self._columns = {}
+
+    def _map(self, min_rows: int):
+        if self.dim is None:
+            return
+        if self._matrix is not None and self._matrix.shape[0] >= min_rows:
+            return
+        rows = os.path.getsize(self._vec_path) // (self.dim * 4)
+        if rows < min_rows:
+            raise RuntimeError(f"Vector file {self._vec_path} is truncated ({rows} < {min_rows} rows)")
+        self._matrix = np.memmap(self._vec_path, dtype=np.float32, mode="r+", shape=(rows, self.dim)) if rows else None
+
+    # --- writes ------------------------------------------------------------
+
+    @staticmethod
+    def _normalise(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def upsert(self, ids, documents, metadatas, embeddings=None):
+        if not ids:
+            return
+        vectors = self._normalise(embeddings if embeddings is not None else self.embedder(list(documents)))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have compacted (new file, renumbered rows) since our last read
+                self._refresh()
+                if self.dim is None:
+                    stored = self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+                    self.dim = int(stored[0]) if stored else vectors.shape[1]
+                    self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('dim', ?)", (str(self.dim),))
+                if vectors.shape[1] != self.dim:
+                    raise ValueError(f"Embedding dim {vectors.shape[1]} does not match index dim {self.dim}")
+
+                placeholders = ",".join("?" * len(ids))
+                existing = dict(self._conn.execute(
+                    f"SELECT id, row FROM rows WHERE id IN ({placeholders})", list(ids)
+                ).fetchall())
+                next_row = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+                rows = []
+                for row_id in ids:
+                    if row_id in existing:
+                        rows.append(existing[row_id])
+                    else:
+                        existing[row_id] = next_row
+                        rows.append(next_row)
+                        next_row += 1
+
+                current_rows = os.path.getsize(self._vec_path) // (self.dim * 4)
+                if current_rows < next_row:
+                    with open(self._vec_path, "r+b") as f:
+                        f.truncate(max(next_row, current_rows * 2, GROW_ROWS) * self.dim * 4)
+                self._map(next_row)
+                self._matrix[rows] = vectors
+                self._matrix.flush()
+
+                # Rows become visible only after their vectors are on disk
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO rows (id, row, document, metadata) VALUES (?, ?, ?, ?)",
+                    [(row_id, row, doc, json.dumps(meta or {}))
+                     for row_id, row, doc, meta in zip(ids, rows, documents, metadatas)]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._refresh()
+            self._set_rows(ids, rows, metadatas, vectors)
+            if self._codes is None:
+                self._build_codes()
+
+    def delete(self, ids):
+        if not ids:
+            return
+        with self._lock:
+            placeholders = ",".join("?" * len(ids))
+            # Freed rows are not reused until compact() rewrites the file
+            self._conn.execute(f"DELETE FROM rows WHERE id IN ({placeholders})", list(ids))
+            self._refresh()
+            for row_id in ids:
+                row = self._row_of.pop(row_id, None)
+                if row is not None:
+                    self._ids.pop(row, None)
+                    self._metadata.pop(row, None)
+                    self._alive[row] = False
+            self._columns = {}
+
+    def compact(self):
+        """Rewrite the vector file with live rows only and renumber them (drops deleted rows)"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                before = {"rows": int(self._n_rows), "live_rows": len(self._row_of), "disk_bytes": self.disk_bytes()}
+                if self.dim is None or self._n_rows == len(self._row_of):
+                    self._conn.execute("COMMIT")
+                    return {"before": before, "after": before}
+
+                live = sorted(self._ids)  # old row numbers, file order
+                generation = int(self._conn.execute(
+                    "SELECT COALESCE(MAX(CAST(value AS INTEGER)), 0) FROM meta WHERE name = 'generation'"
+                ).fetchone()[0]) + 1
+                new_name = f"vectors.{generation}.f32"
+                new_path = os.path.join(self.directory, new_name)
+                out = np.memmap(new_path, dtype=np.float32, mode="w+", shape=(max(len(live), 1), self.dim))
+                for start in range(0, len(live), ENCODE_CHUNK):
+                    chunk = np.asarray(live[start:start + ENCODE_CHUNK])
+                    out[start:start + len(chunk)] = self._fetch_rows(chunk)
+                out.flush()
+                del out
+
+                self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS renumber (old INTEGER PRIMARY KEY, new INTEGER)")
+                self._conn.execute("DELETE FROM renumber")
+                self._conn.executemany("INSERT INTO renumber VALUES (?, ?)",
+                                       [(int(old), new) for new, old in enumerate(live)])
+                self._conn.execute("UPDATE rows SET row = (SELECT new FROM renumber WHERE old = rows.row)")
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('vectors', ?)", (new_name,))
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('generation', ?)", (str(generation),))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+            old_path = self._vec_path
+            self._load()
+            if old_path != self._vec_path:
+                # Readers in other processes keep their mapping of the unlinked file until they reload
+                os.remove(old_path)
+            after = {"rows": int(self._n_rows), "live_rows": len(self._row_of), "disk_bytes": self.disk_bytes()}
+            logger.info(f"Compacted {self.directory}: {before['rows']} -> {after['rows']} rows")
+            return {"before": before, "after": after}
+
+    def disk_bytes(self):
+        return sum(
+            os.path.getsize(os.path.join(self.directory, name)) for name in os.listdir(self.directory)
+            if os.path.isfile(os.path.join(self.directory, name))
+        )
+
+    # --- reads -------------------------------------------------------------
+
+    def count(self):
+        with self._lock:
+            self._refresh()
+            return len(self._row_of)
+
+    def _column(self, field: str, numeric: bool) -> np.ndarray:
+        """One metadata field across all rows (NaN / None where missing), cached until the next write"""
+        key = (field, numeric)
+        if key not in self._columns:
+            values = [self._metadata.get(row, {}).get(field) for row in range(self._n_rows)]
+            if numeric:
+                self._columns[key] = np.array(
+                    [v if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan for v in values],
+                    dtype=np.float64
+                )
+            else:
+                column = np.empty(self._n_rows, dtype=object)
+                column[:] = values
+                self._columns[key] = column
+        return self._columns[key]
+
+    def _field_mask(self, field: str, condition) -> np.ndarray:
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        mask = np.ones(self._n_rows, dtype=bool)
+        for op, operand in condition.items():
+            if op in ("$gt", "$gte", "$lt", "$lte"):
+                column = self._column(field, numeric=True)
+                with np.errstate(invalid="ignore"):
+                    mask &= {"$gt": np.greater, "$gte": np.greater_equal,
+                             "$lt": np.less, "$lte": np.less_equal}[op](column, operand)
+            elif op in ("$in", "$nin"):
+                column = self._column(field, numeric=False)
+                members = np.frompyfunc(lambda v, allowed=set(operand): v in allowed, 1, 1)(column).astype(bool)
+                mask &= members if op == "$in" else ~members
+            elif op in ("$eq", "$ne"):
+                column = self._column(field, numeric=False)
+                equal = np.frompyfunc(lambda v, target=operand: v == target, 1, 1)(column).astype(bool)
+                mask &= equal if op == "$eq" else ~equal
+            else:
+                raise ValueError(f"Unsupported where operator {op}")
+        return mask
+
+    def _clause_mask(self, clause) -> np.ndarray:
+        if "$and" in clause:
+            return np.logical_and.reduce([self._clause_mask(c) for c in clause["$and"]])
+        if "$or" in clause:
+            return np.logical_or.reduce([self._clause_mask(c) for c in clause["$or"]])
+        mask = np.ones(self._n_rows, dtype=bool)
+        for field, condition in clause.items():
+            mask &= self._field_mask(field, condition)
+        return mask
+
+    def _where_rows(self, where) -> np.ndarray:
+        """Boolean mask over rows: alive and matching the Chroma-style where clause (vectorised per field)"""
+        mask = self._alive[:self._n_rows].copy()
+        if where:
+            mask &= self._clause_mask(where)
+        return mask
+
+    def _documents(self, rows: List[int]) -> Dict[int, str]:
+        if not rows:
+            return {}
+        placeholders = ",".join("?" * len(rows))
+        return dict(self._conn.execute(
+            f"SELECT row, document FROM rows WHERE row IN ({placeholders})", [int(r) for r in rows]
+        ).fetchall())
+
+    def get(self, ids=None, include=None, where=None, limit=None, offset=None):
+        include = include or ["metadatas", "documents"]
+        with self._lock:
+            self._refresh()
+            if ids is not None:
+                rows = [self._row_of[i] for i in ids if i in self._row_of]
+            else:
+                rows = list(np.flatnonzero(self._where_rows(where)))
+            if ids is not None and where:
+                mask = self._where_rows(where)
+                rows = [r for r in rows if mask[r]]
+            rows = rows[offset or 0:]
+            if limit is not None:
+                rows = rows[:limit]
+
+            result = {"ids": [self._ids[r] for r in rows]}
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadata[r] for r in rows]
+            if "documents" in include:
+                docs = self._documents(rows)
+                result["documents"] = [docs.get(r) for r in rows]
+            if "embeddings" in include:
+                result["embeddings"] = [np.array(self._matrix[r]) for r in rows]
+            return result
+
+    def query(self, query_texts=None, n_results=10, include=None, where=None, query_embeddings=None):
+        include = include or ["metadatas", "documents", "distances"]
+        if query_embeddings is None:
+            query_embeddings = self.embedder(list(query_texts))
+        queries = self._normalise(query_embeddings)
+
+        with self._lock:
+            self._refresh()
+            empty = {"ids": [[] for _ in queries], "metadatas": [[] for _ in queries],
+                     "documents": [[] for _ in queries], "distances": [[] for _ in queries]}
+            if self._matrix is None or not self._n_rows:
+                return empty
+
+            mask = self._where_rows(where)
+            candidates = np.flatnonzero(mask)
+            if not len(candidates):
+                return empty
+            k = min(n_results, len(candidates))
+
+            if self._codes is not None:
+                # Approximate scan over the codes, exact float re-rank of the shortlist
+                approx = self._quantizer.scores(queries, self._codes[:self._n_rows])
+                approx[:, ~mask] = -np.inf
+                ranked = rerank_top_k(queries, approx, self._fetch_rows, k, k * self.rerank_factor)
+            else:
+                # Whole matrix when nearly everything matches (contiguous read), otherwise only the slice
+                whole = len(candidates) > 0.5 * self._n_rows
+                matrix = self._matrix[:self._n_rows] if whole else self._matrix[candidates]
+                scores = queries @ np.asarray(matrix).T  # (n_queries, rows)
+                if whole:
+                    scores[:, ~mask] = -np.inf
+                    candidates = np.arange(self._n_rows)
+                ranked = []
+                for row_scores in scores:
+                    top = np.argpartition(-row_scores, k - 1)[:k] if k < len(row_scores) else np.arange(len(row_scores))
+                    top = top[np.argsort(-row_scores[top])]
+                    top = top[np.isfinite(row_scores[top])]
+                    ranked.append((candidates[top], row_scores[top]))
+
+            result = {"ids": [], "metadatas": [], "documents": [], "distances": []}
+            for top_rows, top_scores in ranked:
+                rows = [int(r) for r in top_rows]
+                docs = self._documents(rows) if "documents" in include else {}
+                result["ids"].append([self._ids[r] for r in rows])
+                result["metadatas"].append([self._metadata[r] for r in rows])
+                result["documents"].append([docs.get(r) for r in rows])
+                # Same convention as Chroma's cosine space: distance = 1 - cosine similarity
+                result["distances"].append([float(1.0 - score) for score in top_scores])
+            return result
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Bytes the scan touches per query: the codes when quantized, else the float matrix"""
+        float_bytes = self._n_rows * (self.dim or 0) * 4
+        return {
+            "storage": self.storage if self._codes is not None else "float32",
+            "rows": self._n_rows,
+            "dead_rows": self._n_rows - len(self._row_of),
+            "float_bytes": float_bytes,
+            "scan_bytes": int(self._codes.nbytes) if self._codes is not None else float_bytes
+        }
+
+def select_backend(collection, embedder, collection_name: str, index_dir: str = None):
+    """Pick the backend from config: 'chroma', 'numpy', or 'auto' (NumPy below numpy_max_rows).
+
+    When the chosen backend holds fewer rows than the other one (first switch,
+    or the history outgrew the threshold) the missing rows are copied over
+    with their stored embeddings. index_dir defaults to rag.numpy_index_dir.
+    """
+    from app.config.enhanced_config import get_config
+
+    rag_config = get_config().rag
+    chroma = ChromaBackend(collection, embedder)
+    choice = rag_config.vector_backend
+    numpy_dir = os.path.join(index_dir or rag_config.numpy_index_dir, collection_name)
+    if choice == "chroma" and not os.path.exists(numpy_dir):
+        return chroma
+
+    numpy_backend = NumpyBackend(numpy_dir, embedder, storage=rag_config.vector_storage,
+                                 pca_dim=rag_config.pca_dim, rerank_factor=rag_config.rerank_factor)
+    if choice == "auto":
+        size = max(chroma.count(), numpy_backend.count())
+        choice = "numpy" if size < rag_config.numpy_max_rows else "chroma"
+
+    chosen, other = (numpy_backend, chroma) if choice == "numpy" else (chroma, numpy_backend)
+    if chosen.count() < other.count():
+        chosen.import_from(other)
+    logger.info(f"Vector backend: {chosen.name} ({chosen.count()} rows)")
+    return chosen
@@ -2,19 +2,34 @@
 from datetime import datetime, timedelta
 from app.models.sample_data import SampleUser, SampleUserTask
 from app.agents.crewai_integration import TaskCrew
-from app.agents.rag_agent import RAGSystem
-from app.utils.task_utils import check_overdue_tasks
+from app.agents.rag_registry import get_rag_system
+from app.agents.rag_agent import precompute_query_embedding
+from app.utils.task_utils import check_overdue_tasks, release_user_capacity
+from app.utils.scheduler import start_background_jobs
+from app.config.enhanced_config import get_config
+from app.utils.cycle_metrics import last_cycle_summary
+from app.agents.load_balancer import rebalance, execute_moves
+from app.agents.index_queue import index_queue
+from app.agents.rag_migration import migration_status
 import json
 import os
+import time
 
 class TaskCLI:
     def __init__(self):
         self.crew = TaskCrew()
-        self.rag = RAGSystem()
         self.running = True
 
+    @property
+    def rag(self):
+        # Shared with TaskCrew, the crew tools and the supervisor
+        return get_rag_system()
+
     def start(self):
         print("🚀 Task Management System 2.0")
+        if get_config().enable_background_tasks:
+            # Periodic overdue marking, RAG reindex, workload reconciliation and cache cleanup
+            start_background_jobs()
         self._main_loop()
 
     def _main_loop(self):
@@ -22,8 +37,8 @@ class TaskCLI:
             print("\n===== Main Menu =====")
             print("1. Assign Task\n2. Reassign Task\n3. Create Task\n4. Create User")
             print("5. List Users\n6. List Tasks\n7. Edit User\n8. Edit Task")
-            print("9. Supervise\n10. System Status\n11. Exit")
-            choice = input("Choice (1-11): ")
+            print("9. Supervise\n10. System Status\n11. RAG Maintenance\n12. Exit")
+            choice = input("Choice (1-12): ")
 
             try:
                 {
@@ -37,7 +52,8 @@ class TaskCLI:
                     '8': self._edit_task,
                     '9': self._supervise,
                     '10': self._system_status,
-                    '11': self._exit
+                    '11': self._rag_maintenance,
+                    '12': self._exit
                 }[choice]()
             except KeyError:
                 print("Invalid choice!")
@@ -67,6 +83,8 @@ class TaskCLI:
             task_type=input("Task type: ")
         )
         task.save()
+        # Embed the similarity query in the background instead of on every assignment lookup
+        precompute_query_embedding(task)
         print(f"Created task {task.task_id}")
 
     def _create_user(self):
@@ -255,6 +273,8 @@ class TaskCLI:
             self._handle_task_completion(task)
 
         task.save()
+        # Name, priority or skills may have changed the similarity query (a cache hit otherwise)
+        precompute_query_embedding(task)
         print(f"✅ Task {task.task_id} updated successfully")
 
     def _edit_all_task_fields(self, task):
@@ -282,55 +302,21 @@ class TaskCLI:
             self._handle_task_completion(task)
 
         task.save()
+        precompute_query_embedding(task)
         print(f"✅ Task {task.task_id} updated successfully")
 
     def _handle_task_completion(self, task):
-        """Handle task completion and update task history"""
+        """Handle task completion; RAG indexing and the history file update happen in the background"""
         task.completed_at = datetime.now()
 
-        # Update RAG system with completed task
-        self.rag.index_completed_tasks()
-
-        # Update task_history.json
-        self._update_task_history_file(task)
+        # The caller saves the task; the flush reloads it from Mongo and is coalesced with
+        # other completions into one batched upsert + task_history.json rewrite
+        index_queue.enqueue(task.task_id)
 
         # Free up user capacity
-        if task.user_id:
-            user = SampleUser.objects(user_id=task.user_id).first()
-            if user:
-                user.current_ongoing_tasks = max(0, user.current_ongoing_tasks - 1)
-                user.save()
-
-        print(f"📝 Task {task.task_id} marked as completed and added to history")
+        release_user_capacity(task.user_id)
 
-    def _update_task_history_file(self, task):
-        """Update task_history.json with completed task"""
-        history_file = "app/data/task_history.json"
-
-        # Load existing history
-        try:
-            with open(history_file, "r") as f:
-                history = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            history = []
-
-        # Add new completed task
-        task_record = {
-            "task_id": task.task_id,
-            "name": task.name,
-            "user_id": task.user_id,
-            "required_skills": task.required_skills,
-            "outcome": "success",
-            "completed_at": task.completed_at.isoformat() if task.completed_at else datetime.now().isoformat(),
-            "duration": (task.completed_at - task.started_at).days if task.started_at and task.completed_at else 0
-        }
-
-        history.append(task_record)
-
-        # Save updated history
-        os.makedirs(os.path.dirname(history_file), exist_ok=True)
-        with open(history_file, "w") as f:
-            json.dump(history, f, indent=2)
+        print(f"📝 Task {task.task_id} marked as completed and queued for history indexing")
 
     def _delete_task(self, task):
         """Delete task with confirmation"""
@@ -338,10 +324,7 @@ class TaskCLI:
         if confirm.lower() == 'yes':
             # Free up user capacity if task was assigned
             if task.user_id and task.status == 'in_progress':
-                user = SampleUser.objects(user_id=task.user_id).first()
-                if user:
-                    user.current_ongoing_tasks = max(0, user.current_ongoing_tasks - 1)
-                    user.save()
+                release_user_capacity(task.user_id)
 
             task.delete()
             print(f"🗑️ Task {task.task_id} deleted successfully")
@@ -368,26 +351,29 @@ class TaskCLI:
         print(f"Users: {available_users}/{total_users} available")
         print(f"Tasks: {pending_tasks} pending, {in_progress_tasks} in progress, {completed_tasks} completed")
 
-        # Check for workload imbalances
-        overloaded_users = []
-        underutilized_users = []
-
-        for user in SampleUser.objects(availability_status='available'):
-            utilization = user.current_ongoing_tasks / user.max_concurrent_tasks
-            if utilization >= 0.9:
-                overloaded_users.append(user)
-            elif utilization <= 0.3:
-                underutilized_users.append(user)
+        # Check for workload imbalances (utilization buckets are computed in Mongo)
+        plan = rebalance(dry_run=True)
+        overloaded_users = plan['overloaded']
+        underutilized_users = plan['underutilized']
 
         if overloaded_users:
             print(f"\n⚠️ Overloaded users ({len(overloaded_users)}):")
             for user in overloaded_users:
-                print(f"  - {user.username} ({user.current_ongoing_tasks}/{user.max_concurrent_tasks})")
+                print(f"  - {user['username']} ({user['current_ongoing_tasks']}/{user['max_concurrent_tasks']})")
 
         if underutilized_users:
             print(f"\n💡 Underutilized users ({len(underutilized_users)}):")
             for user in underutilized_users:
-                print(f"  - {user.username} ({user.current_ongoing_tasks}/{user.max_concurrent_tasks})")
+                print(f"  - {user['username']} ({user['current_ongoing_tasks']}/{user['max_concurrent_tasks']})")
+
+        if plan['planned_moves']:
+            print(f"\n⚖️ Proposed rebalancing moves ({len(plan['planned_moves'])}):")
+            for move in plan['planned_moves']:
+                print(f"  - {move['task_id']} ({move['task_name']}): {move['from_user']} → {move['to_user']} "
+                      f"(match {move['match_score']})")
+            if input("Apply these moves? (y/n): ").strip().lower() == 'y':
+                applied = execute_moves(plan['planned_moves'])
+                print(f"  ✅ Applied {len(applied)}/{len(plan['planned_moves'])} moves")
 
         # Auto-assign pending tasks
         if pending_tasks > 0:
@@ -401,15 +387,148 @@ class TaskCLI:
                     print(f"  ❌ {task.task_id}: Failed - {str(e)}")
 
     def _system_status(self):
-        self.rag.index_completed_tasks()
+        # Only completed tasks whose content hash changed are re-embedded
+        sync = self.rag.index_completed_tasks(
+            progress=lambda p: print(f"\r🔄 Syncing history: {p['processed']}/{p['total']} tasks "
+                                     f"({p['upserted']} re-indexed)", end="", flush=True)
+        )
+        if sync['processed']:
+            print()
         check_overdue_tasks()
         print("\nSystem Status:")
         print(f"Users: {SampleUser.objects.count()}")
         print(f"Tasks: {SampleUserTask.objects.count()}")
-        print(f"Completed Tasks: {self.rag.collection.count()}")
+        print(f"Completed Tasks: {self.rag.collection.count()} ({sync['upserted']} re-indexed)")
+        queue_stats = index_queue.get_stats()
+        print(f"Indexing queue: {queue_stats['pending']} pending, "
+              f"freshness lag {queue_stats['freshness_lag_seconds']:.1f}s "
+              f"(last flush {queue_stats['last_flush_lag_seconds']:.1f}s)")
+        migration = migration_status()
+        if migration['phase'] not in ('idle', 'done', 'cancelled'):
+            self._print_migration(migration)
+
+        cycle = last_cycle_summary()
+        if cycle:
+            print(f"\nLast supervisor cycle ({cycle['started_at']}): {cycle['duration_seconds']:.2f}s")
+            for phase, seconds in cycle['phases'].items():
+                print(f"  {phase:<15} {seconds:.2f}s")
+            print("  " + ", ".join(f"{name}={value}" for name, value in cycle['counters'].items()))
+
+    def _rag_maintenance(self):
+        """Retention, dedupe, compaction and embedding model migration of the task history"""
+        from app.agents.rag_retention import run_retention
+
+        print("\n🧹 RAG Maintenance")
+        print("1. Apply retention policy\n2. Compact now\n3. Embedding model migration\n4. Full re-index (multi-process)")
+        choice = input("Choice (1-4): ")
+        if choice == '3':
+            self._embedding_migration()
+            return
+        if choice == '4':
+            self._bulk_reindex()
+            return
+        if choice == '1':
+            plan = run_retention(dry_run=True)
+            if plan.get("status") == "not_initialized":
+                print("❌ RAG system not initialized")
+                return
+            print(f"Would remove {plan['expired']} expired, {plan['overflow']} over the row cap "
+                  f"and {plan['duplicates']} near-duplicate rows")
+            if not plan['expired'] + plan['overflow'] + plan['duplicates']:
+                return
+            if input("Apply? (y/n): ").strip().lower() != 'y':
+                return
+            report = run_retention()
+        elif choice == '2':
+            report = run_retention(compact=True)
+        else:
+            print("Invalid choice")
+            return
+        if report.get("status") == "not_initialized":
+            print("❌ RAG system not initialized")
+            return
+
+        before, after = report['before'], report['after']
+        print(f"  Rows: {before['rows']} → {after['rows']}"
+              f"{' (compacted)' if report['compacted'] else ''}")
+        print(f"  Chroma on disk: {before['chroma_bytes'] / 2**20:.1f}MB → {after['chroma_bytes'] / 2**20:.1f}MB")
+        if 'numpy_bytes' in after:
+            print(f"  NumPy index on disk: {before.get('numpy_bytes', 0) / 2**20:.1f}MB → "
+                  f"{after['numpy_bytes'] / 2**20:.1f}MB")
+        print(f"  Query p50: {before['p50_ms']:.2f}ms → {after['p50_ms']:.2f}ms "
+              f"(p95 {before['p95_ms']:.2f}ms → {after['p95_ms']:.2f}ms)")
+
+    def _bulk_reindex(self):
+        """Rebuild the history collection with embedding spread over a process pool"""
+        default_workers = get_config().rag.bulk_index_workers or os.cpu_count() or 1
+        workers = int(input(f"Worker processes ({default_workers}): ") or default_workers)
+        force = input("Re-embed unchanged rows too? (y/n): ").strip().lower() == 'y'
+        report = self.rag.index_completed_tasks(
+            workers=workers, force=force, resume=not force,
+            progress=lambda p: print(f"\r🔄 Re-indexing: {p['processed']}/{p['total']} tasks "
+                                     f"({p['upserted']} embedded)", end="", flush=True)
+        )
+        print(f"\n✅ {report['processed']} tasks in {report['elapsed_seconds']}s: "
+              f"{report['upserted']} embedded, {report['unchanged']} unchanged")
+        if report['embed_rows_per_second']:
+            print(f"  Embedding: {report['embed_rows_per_second']} rows/s on {report['workers']} worker(s) "
+                  f"({report['embed_seconds']}s)")
+
+    def _print_migration(self, status):
+        print(f"Embedding migration {status['source']} → {status['target']}: {status['phase']}")
+        if status.get('total'):
+            rate = f", {status['rows_per_second']} rows/s" if status.get('rows_per_second') else ""
+            eta = f", ETA {status['eta_seconds']}s" if status.get('eta_seconds') is not None else ""
+            print(f"  {status['processed']}/{status['total']} tasks ({status.get('percent', 0)}%{rate}{eta})")
+        shadow = status.get('shadow')
+        if shadow and shadow['queries']:
+            print(f"  Shadow reads: {shadow['queries']} ({shadow['live']} live), overlap@k {shadow['overlap_at_k']}, "
+                  f"same top user {shadow['top_user_agreement']}")
+
+    def _embedding_migration(self):
+        """Show the migration to the configured embedding model, or drive it in the foreground"""
+        from app.agents.rag_migration import migration_step, force_cutover
+        from app.agents.rag_registry import active_embedding, configured_embedding
+
+        status = migration_status()
+        if status['phase'] == 'held':
+            self._print_migration(status)
+            if input("Shadow overlap below the threshold. Cut over anyway? (y/n): ").strip().lower() == 'y':
+                force_cutover()
+                print("✅ Queries now use the new embedding model")
+            return
+        if active_embedding() == configured_embedding():
+            print("Configured embedding model is already active, nothing to migrate")
+            return
+        if status['phase'] in ('building', 'shadow'):
+            self._print_migration(status)
+        if input("Run the migration here until cutover? Ctrl-C pauses it (y/n): ").strip().lower() != 'y':
+            print("The background scheduler continues it")
+            return
+        try:
+            while True:
+                state = migration_step()
+                if state.get('busy'):
+                    time.sleep(1)
+                    continue
+                if state['phase'] in ('done', 'held', 'idle', 'cancelled'):
+                    break
+                status = migration_status()
+                eta = status.get('eta_seconds')
+                print(f"\r🔄 {status['phase']}: {status.get('processed') or 0}/{status.get('total') or 0} tasks"
+                      f"{f', ETA {eta}s' if eta is not None else ''}   ", end="", flush=True)
+                if state['phase'] == 'shadow':
+                    time.sleep(5)
+        except KeyboardInterrupt:
+            print("\n⏸️ Paused; progress is checkpointed")
+            return
+        print()
+        self._print_migration(migration_status())
 
     def _exit(self):
         self.running = False
+        # Index any completions still waiting in the queue before leaving
+        index_queue.drain()
         print("Goodbye!")
 
 if __name__ == "__main__":
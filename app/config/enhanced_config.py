@@ -10,7 +10,12 @@ Features:
 import os
 from typing import Dict, Any, Optional, List
 from dataclasses import dataclass, field
-from pydantic import BaseSettings, Field, validator
+try:
+    from pydantic import BaseSettings, Field, validator
+except ImportError:
+    # pydantic v2 moved BaseSettings into the pydantic-settings package
+    from pydantic_settings import BaseSettings
+    from pydantic import Field, validator
 import json
 from pathlib import Path
 
@@ -105,6 +110,54 @@ class PerformanceConfig(BaseSettings):
     class Config:
         env_prefix = "PERFORMANCE_"
 
+class RAGConfig(BaseSettings):
+    """RAG / vector store configuration"""
+    embedding_model: str = Field(default="all-MiniLM-L6-v2", env="RAG_EMBEDDING_MODEL")
+    embedding_backend: str = Field(default="torch", env="RAG_EMBEDDING_BACKEND")  # torch / onnx / onnx-int8
+    onnx_threads: int = Field(default=0, env="RAG_ONNX_THREADS")  # 0 = ONNX Runtime default
+    chroma_path: str = Field(default="./chroma_db", env="RAG_CHROMA_PATH")
+    enable_embedding_cache: bool = Field(default=True, env="RAG_ENABLE_EMBEDDING_CACHE")
+    embedding_cache_dir: str = Field(default="./embedding_cache", env="RAG_EMBEDDING_CACHE_DIR")
+    result_cache_entries: int = Field(default=1024, env="RAG_RESULT_CACHE_ENTRIES")
+    result_cache_max_bytes: int = Field(default=16 * 1024 * 1024, env="RAG_RESULT_CACHE_MAX_BYTES")
+    hybrid_weight: float = Field(default=0.0, env="RAG_HYBRID_WEIGHT")  # 0 = vector only
+    vector_backend: str = Field(default="auto", env="RAG_VECTOR_BACKEND")  # auto / chroma / numpy
+    # HNSW graph parameters, applied when a collection is created or compacted; unset ones
+    # keep Chroma's own defaults. benchmarks/tune_hnsw.py recommends values for the current history
+    hnsw_m: Optional[int] = Field(default=None, env="RAG_HNSW_M")
+    hnsw_construction_ef: Optional[int] = Field(default=None, env="RAG_HNSW_CONSTRUCTION_EF")
+    hnsw_search_ef: Optional[int] = Field(default=None, env="RAG_HNSW_SEARCH_EF")
+    numpy_index_dir: str = Field(default="./vector_index", env="RAG_NUMPY_INDEX_DIR")
+    numpy_max_rows: int = Field(default=100_000, env="RAG_NUMPY_MAX_ROWS")
+    vector_storage: str = Field(default="float32", env="RAG_VECTOR_STORAGE")  # float32 / int8 / pca
+    pca_dim: int = Field(default=64, env="RAG_PCA_DIM")
+    rerank_factor: int = Field(default=10, env="RAG_RERANK_FACTOR")
+    index_flush_seconds: float = Field(default=2.0, env="RAG_INDEX_FLUSH_SECONDS")
+    index_flush_batch: int = Field(default=64, env="RAG_INDEX_FLUSH_BATCH")
+    index_page_size: int = Field(default=500, env="RAG_INDEX_PAGE_SIZE")  # tasks per Mongo page / upsert
+    embed_batch_size: int = Field(default=32, env="RAG_EMBED_BATCH_SIZE")
+    bulk_index_workers: int = Field(default=0, env="RAG_BULK_INDEX_WORKERS")  # processes for rebuilds; 0/1 = in-process
+    warmup_on_start: bool = Field(default=False, env="RAG_WARMUP_ON_START")  # load model/index in background
+    signature_lookup: bool = Field(default=True, env="RAG_SIGNATURE_LOOKUP")  # exact skill-set hits first
+    signature_by_type: bool = Field(default=False, env="RAG_SIGNATURE_BY_TYPE")  # also match task_type
+    signature_fetch_limit: int = Field(default=50, env="RAG_SIGNATURE_FETCH_LIMIT")
+    # Retention is opt-in: it deletes history rows, so nothing is pruned until these are set
+    retention_max_age_days: int = Field(default=0, env="RAG_RETENTION_MAX_AGE_DAYS")  # 0 = keep all, e.g. 730
+    retention_max_rows: int = Field(default=0, env="RAG_RETENTION_MAX_ROWS")  # 0 = unlimited, e.g. 200000
+    dedupe_similarity: float = Field(default=0.0, env="RAG_DEDUPE_SIMILARITY")  # 0 = no dedupe, e.g. 0.98
+    # Opt-in: decay re-ranks, so every query fetches HYBRID_CANDIDATE_FACTOR x top_k candidates
+    decay_half_life_days: float = Field(default=0.0, env="RAG_DECAY_HALF_LIFE_DAYS")  # 0 = no decay, e.g. 180
+    decay_min_weight: float = Field(default=0.5, env="RAG_DECAY_MIN_WEIGHT")
+    compaction_deleted_ratio: float = Field(default=0.2, env="RAG_COMPACTION_DELETED_RATIO")
+    migration_step_seconds: float = Field(default=30.0, env="RAG_MIGRATION_STEP_SECONDS")  # per scheduler run
+    shadow_seconds: float = Field(default=600.0, env="RAG_SHADOW_SECONDS")
+    shadow_min_queries: int = Field(default=50, env="RAG_SHADOW_MIN_QUERIES")
+    shadow_sample_rate: float = Field(default=0.2, env="RAG_SHADOW_SAMPLE_RATE")
+    migration_min_overlap: float = Field(default=0.0, env="RAG_MIGRATION_MIN_OVERLAP")  # 0 = report only
+
+    class Config:
+        env_prefix = "RAG_"
+
 class EnhancedConfig(BaseSettings):
     """Main configuration class that combines all settings"""
     
@@ -120,6 +173,7 @@ class EnhancedConfig(BaseSettings):
     monitoring: MonitoringConfig = MonitoringConfig()
     security: SecurityConfig = SecurityConfig()
     performance: PerformanceConfig = PerformanceConfig()
+    rag: RAGConfig = RAGConfig()
     
     # Feature flags
     enable_rag: bool = Field(default=True, env="ENABLE_RAG")
@@ -135,6 +189,7 @@ class EnhancedConfig(BaseSettings):
         env_file = ".env"
         env_file_encoding = "utf-8"
         case_sensitive = False
+        extra = "ignore"  # .env also carries keys for other tools (GEMINI_API_KEY, ...)
     
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -224,6 +279,7 @@ class EnhancedConfig(BaseSettings):
             "monitoring": self.monitoring.dict(),
             "security": self.security.dict(),
             "performance": self.performance.dict(),
+            "rag": self.rag.dict(),
             "features": {
                 "rag": self.enable_rag,
                 "automation": self.enable_automation,
@@ -1,9 +1,10 @@
 # app/models/sample_data.py
 
-from mongoengine import connect, Document, StringField, DictField, IntField, DateTimeField, FloatField, ListField
+from mongoengine import connect, Document, StringField, DictField, IntField, DateTimeField, FloatField, ListField, BooleanField
 from datetime import datetime, timedelta
 from datetime import datetime, timezone
 import random
+from app.utils.deadline_index import deadline_index
 # In SampleUserTask model's mark_completed() method:
 
 import sys
@@ -26,7 +27,10 @@ connect(db=DB_NAME, host=MONGODB_CONN_STR,uuidRepresentation='standard',tz_aware
 # Data Models
 # ======================
 class SampleUser(Document):
-    meta = {'collection': 'sample_users'}
+    meta = {
+        'collection': 'sample_users',
+        'indexes': ['updated_at']
+    }
     user_id = StringField(required=True, unique=True)
     username = StringField(required=True)
     skills = DictField()  # {"python": 8, "react": 6}
@@ -36,6 +40,12 @@ class SampleUser(Document):
     experience_level = StringField(choices=['junior', 'mid', 'senior'], default=random.choice(['junior', 'mid', 'senior']))
     preferred_task_types = ListField(StringField())
     last_active = DateTimeField(default=datetime.now(timezone.utc))
+    updated_at = DateTimeField()
+
+    def save(self, *args, **kwargs):
+        # Keep updated_at current so incremental supervisor cycles can see the change
+        self.updated_at = datetime.now(timezone.utc)
+        return super().save(*args, **kwargs)
 
 
 
@@ -62,8 +72,15 @@ class SampleUser(Document):
 
 
 
+# Fields the RAG history row is built from (see RAGSystem._build_row)
+RAG_CONTENT_FIELDS = ("name", "user_id", "required_skills", "task_type", "priority", "started_at",
+                      "created_at", "completed_at", "actual_effort_hours")
+
 class SampleUserTask(Document):
-    meta = {'collection': 'sample_user_tasks'}
+    meta = {
+        'collection': 'sample_user_tasks',
+        'indexes': ['updated_at', ('status', 'due_date')]
+    }
     task_id = StringField(required=True, unique=True)
     user_id = StringField()
     name = StringField(required=True)
@@ -80,9 +97,26 @@ class SampleUserTask(Document):
     reassigned_count = IntField(default=0)
     assignment_log = ListField(DictField())
     progress = FloatField(default=0.0)
+    updated_at = DateTimeField()
+    rag_excluded = BooleanField(default=False)  # pruned from the RAG history (near-duplicate)
 
-    def update_timestamp(self):
+    def save(self, *args, **kwargs):
+        # Every write bumps updated_at; supervise() uses it as its high-water mark
         self.updated_at = datetime.now(timezone.utc)
+        # An edited near-duplicate is new content; let the next sync index it again
+        if self.rag_excluded and any(field.split(".")[0] in RAG_CONTENT_FIELDS
+                                     for field in self._get_changed_fields()):
+            self.rag_excluded = False
+        result = super().save(*args, **kwargs)
+        # Keep the in-memory deadline heap in step with assignments, edits and completions
+        deadline_index.track(self)
+        return result
+
+    def delete(self, *args, **kwargs):
+        deadline_index.remove(self.task_id)
+        return super().delete(*args, **kwargs)
+
+    def update_timestamp(self):
         self.save()
 
     def add_log_entry(self, action, details):
@@ -118,8 +152,28 @@ class SampleUserTask(Document):
             self.completed_at = datetime.now(timezone.utc)
             self.add_log_entry('completed', {'details': 'Task finalized'})
             self.save()
-            from app.agents.rag_agent import index_task_history
-            index_task_history()
+            from app.agents.index_queue import index_queue
+            index_queue.enqueue(self.task_id)
+
+class SystemState(Document):
+    """Small key/value store for bookkeeping that must survive restarts (watermarks etc.)"""
+    meta = {'collection': 'system_state'}
+    key = StringField(required=True, unique=True)
+    value = DictField()
+    updated_at = DateTimeField()
+
+    @classmethod
+    def get_value(cls, key, default=None):
+        state = cls.objects(key=key).first()
+        return state.value if state else default
+
+    @classmethod
+    def set_value(cls, key, value):
+        cls.objects(key=key).update_one(
+            set__value=value,
+            set__updated_at=datetime.now(timezone.utc),
+            upsert=True
+        )
 
 def populate_sample_data():
     # Clear existing data
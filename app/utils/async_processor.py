@@ -3,6 +3,7 @@ import threading
 from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from typing import Callable, Any, Dict, List
 from datetime import datetime, timedelta
+import itertools
 import queue
 import time
 from dataclasses import dataclass
@@ -22,6 +23,7 @@ class BackgroundTask:
     kwargs: dict
     priority: TaskPriority
     created_at: datetime
+    use_process: bool = False
     max_retries: int = 3
     retry_count: int = 0
     result: Any = None
@@ -34,6 +36,7 @@ class AsyncProcessor:
         self.thread_pool = ThreadPoolExecutor(max_workers=max_workers)
         self.process_pool = ProcessPoolExecutor(max_workers=max_process_workers)
         self.task_queue = queue.PriorityQueue()
+        self._sequence = itertools.count()  # FIFO tie-break so tasks themselves are never compared
         self.running_tasks: Dict[str, BackgroundTask] = {}
         self.completed_tasks: Dict[str, BackgroundTask] = {}
         self.running = False
@@ -59,7 +62,7 @@ class AsyncProcessor:
     def submit_task(self, func: Callable, *args, priority: TaskPriority = TaskPriority.NORMAL, 
                    use_process: bool = False, **kwargs) -> str:
         """Submit a task for background processing"""
-        task_id = f"task_{int(time.time() * 1000)}"
+        task_id = f"task_{int(time.time() * 1000)}_{next(self._sequence)}"
         task = BackgroundTask(
             id=task_id,
             func=func,
@@ -70,18 +73,21 @@ class AsyncProcessor:
             use_process=use_process
         )
         
-        # Add to priority queue (lower number = higher priority)
-        self.task_queue.put((priority.value, task))
+        self._put(task)
         self.running_tasks[task_id] = task
         return task_id
     
+    def _put(self, task: BackgroundTask):
+        # PriorityQueue pops the smallest entry first, so negate: CRITICAL runs before LOW
+        self.task_queue.put((-task.priority.value, next(self._sequence), task))
+
     def _process_tasks(self):
         """Main task processing loop"""
         while self.running:
             try:
                 # Get next task from queue
                 if not self.task_queue.empty():
-                    priority, task = self.task_queue.get(timeout=1)
+                    _, _, task = self.task_queue.get(timeout=1)
                     
                     # Execute task
                     if task.use_process:
@@ -100,7 +106,7 @@ class AsyncProcessor:
                             task.retry_count += 1
                             # Re-queue with lower priority
                             task.priority = TaskPriority(max(1, task.priority.value - 1))
-                            self.task_queue.put((task.priority.value, task))
+                            self._put(task)
                         else:
                             task.completed = True
                     
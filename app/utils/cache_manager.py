@@ -77,6 +77,16 @@ class CacheManager:
         except Exception:
             return 0
     
+    def purge_expired(self) -> int:
+        """Drop expired in-memory entries (Redis expires keys on its own)"""
+        if self.redis_client:
+            return 0
+        now = datetime.now()
+        expired = [k for k, data in self.memory_cache.items() if data['expires_at'] <= now]
+        for key in expired:
+            del self.memory_cache[key]
+        return len(expired)
+
     def get_stats(self) -> Dict[str, int]:
         """Get cache statistics"""
         return {
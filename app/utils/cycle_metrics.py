@@ -0,0 +1,160 @@
+# app/utils/cycle_metrics.py
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque, defaultdict, Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CYCLE_LOG_FILE = "logs/supervisor_cycles.jsonl"
+RING_BUFFER_SIZE = 50
+
+# The active recorder and task follow the code through nested calls (assign_task,
+# retrieve_similar_tasks, ...). Worker threads get them via contextvars.copy_context().
+_current_cycle = contextvars.ContextVar("current_cycle", default=None)
+_current_task = contextvars.ContextVar("current_task", default=None)
+
+_recent_cycles = deque(maxlen=RING_BUFFER_SIZE)
+_recent_lock = threading.Lock()
+
+class CycleRecorder:
+    """Collects per-phase timers, per-task timers and counters for one supervisor cycle"""
+
+    def __init__(self, name: str = "supervisor"):
+        self.cycle_id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.phase_seconds = defaultdict(float)
+        self.phase_calls = Counter()
+        self.counters = Counter()
+        self.tasks = defaultdict(lambda: {"total": 0.0, "phases": defaultdict(float)})
+
+    def add_phase(self, phase: str, seconds: float, task_id: str = None):
+        with self._lock:
+            self.phase_seconds[phase] += seconds
+            self.phase_calls[phase] += 1
+            if task_id:
+                self.tasks[task_id]["phases"][phase] += seconds
+
+    def add_task_time(self, task_id: str, seconds: float):
+        with self._lock:
+            self.tasks[task_id]["total"] += seconds
+
+    def incr(self, counter: str, n: int = 1):
+        with self._lock:
+            self.counters[counter] += n
+
+    def to_record(self, report: Dict[str, Any] = None) -> Dict[str, Any]:
+        duration = time.perf_counter() - self._start
+        with self._lock:
+            return {
+                "cycle_id": self.cycle_id,
+                "name": self.name,
+                "started_at": self.started_at.isoformat(),
+                "duration_seconds": round(duration, 4),
+                "phases": {
+                    phase: {"seconds": round(seconds, 4), "calls": self.phase_calls[phase]}
+                    for phase, seconds in sorted(self.phase_seconds.items(), key=lambda x: -x[1])
+                },
+                "counters": dict(self.counters),
+                "tasks": {
+                    task_id: {
+                        "total_seconds": round(data["total"], 4),
+                        "phases": {p: round(s, 4) for p, s in data["phases"].items()}
+                    } for task_id, data in self.tasks.items()
+                },
+                "report": report or {}
+            }
+
+def start_cycle(name: str = "supervisor") -> CycleRecorder:
+    """Make a new recorder active for the current context"""
+    recorder = CycleRecorder(name)
+    _current_cycle.set(recorder)
+    return recorder
+
+def finish_cycle(recorder: CycleRecorder, report: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Close the cycle: keep the record in the ring buffer and append it to the JSON lines log"""
+    record = recorder.to_record(report)
+    if _current_cycle.get() is recorder:
+        _current_cycle.set(None)
+
+    with _recent_lock:
+        _recent_cycles.append(record)
+
+    try:
+        os.makedirs(os.path.dirname(CYCLE_LOG_FILE), exist_ok=True)
+        with open(CYCLE_LOG_FILE, "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+    except OSError as e:
+        logger.warning(f"Could not write cycle record: {e}")
+    return record
+
+@contextmanager
+def timed_phase(phase: str):
+    """Time a block against the active cycle (and task); no-op outside a cycle"""
+    recorder = _current_cycle.get()
+    if recorder is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.add_phase(phase, time.perf_counter() - started, _current_task.get())
+
+@contextmanager
+def task_scope(task_id: str):
+    """Attribute nested phases to task_id and record the task's total time"""
+    token = _current_task.set(task_id)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder = _current_cycle.get()
+        if recorder is not None:
+            recorder.add_task_time(task_id, time.perf_counter() - started)
+        _current_task.reset(token)
+
+def count(counter: str, n: int = 1):
+    """Bump a counter on the active cycle; no-op outside a cycle"""
+    recorder = _current_cycle.get()
+    if recorder is not None:
+        recorder.incr(counter, n)
+
+def recent_cycles(limit: int = 10) -> List[Dict[str, Any]]:
+    with _recent_lock:
+        return list(_recent_cycles)[-limit:]
+
+def _read_last_logged_cycle() -> Optional[Dict[str, Any]]:
+    """Latest record from the JSON lines log, for processes that did not run a cycle themselves"""
+    try:
+        with open(CYCLE_LOG_FILE, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 65536))
+            lines = f.read().splitlines()
+        return json.loads(lines[-1]) if lines else None
+    except (OSError, ValueError):
+        return None
+
+def last_cycle_summary() -> Optional[Dict[str, Any]]:
+    """Compact view of the latest cycle for status screens"""
+    cycles = recent_cycles(1)
+    record = cycles[-1] if cycles else _read_last_logged_cycle()
+    if not record:
+        return None
+    return {
+        "cycle_id": record["cycle_id"],
+        "started_at": record["started_at"],
+        "duration_seconds": record["duration_seconds"],
+        "phases": {phase: data["seconds"] for phase, data in record["phases"].items()},
+        "counters": record["counters"]
+    }
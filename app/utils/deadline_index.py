@@ -0,0 +1,192 @@
+# app/utils/deadline_index.py
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Any, Iterable, Optional
+
+from app.utils.scheduler import DEFAULT_JOB_INTERVALS
+
+logger = logging.getLogger(__name__)
+
+# Tasks in these states no longer have a live deadline
+CLOSED_STATUSES = ('completed', 'failed')
+# Other processes' writes only reach the heap through a re-seed. The deadline_resync job
+# does that where a scheduler runs; elsewhere queries re-seed once the heap is this old
+STALE_AFTER_SECONDS = DEFAULT_JOB_INTERVALS["deadline_resync"] * 1.5
+
+def _to_ts(value: datetime) -> float:
+    # Mongo stores naive datetimes as UTC, so read them back the same way
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+class DeadlineIndex:
+    """In-memory heap of (due_date, task_id) for open tasks.
+
+    Seeded with one Mongo scan, then kept current by SampleUserTask.save()
+    and delete(); re-seeded once older than STALE_AFTER_SECONDS to pick up
+    writes made by other processes. Tasks move from the heap to the overdue
+    map when their deadline passes, either when a query advances the heap or
+    when the scheduler timer armed for the earliest deadline fires.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._heap = []  # (due_ts, task_id), stale entries skipped lazily
+        self._entries: Dict[str, Dict[str, Any]] = {}  # task_id -> record, open tasks only
+        self._overdue: Dict[str, Dict[str, Any]] = {}  # subset of _entries already past due
+        self._listeners: List[Callable] = []
+        self._armed_at = None
+        self.seeded = False
+        self.seeded_at = 0.0
+
+    def seed(self):
+        """Load every open task with a deadline (the only full scan this index does)"""
+        from app.models.sample_data import SampleUserTask
+
+        tasks = SampleUserTask.objects(
+            status__nin=list(CLOSED_STATUSES), due_date__ne=None
+        ).only('task_id', 'name', 'user_id', 'status', 'due_date')
+
+        with self._lock:
+            self._heap, self._entries, self._overdue = [], {}, {}
+            for task in tasks:
+                self._track(task)
+            self.seeded = True
+            self.seeded_at = time.time()
+            self._advance(time.time())
+        logger.info(f"Deadline index seeded with {len(self._entries)} open tasks")
+        self._arm_timer()
+
+    def ensure_seeded(self, max_age: float = STALE_AFTER_SECONDS):
+        if not self.seeded or time.time() - self.seeded_at > max_age:
+            self.seed()
+
+    def track(self, task):
+        """Insert or update a task after it was saved; no-op until the index is seeded"""
+        if not self.seeded:
+            return
+        with self._lock:
+            self._track(task)
+            self._advance(time.time())
+        self._arm_timer()
+
+    def remove(self, task_id: str):
+        with self._lock:
+            self._entries.pop(task_id, None)
+            self._overdue.pop(task_id, None)
+
+    def _track(self, task):
+        if task.status in CLOSED_STATUSES or not task.due_date:
+            self.remove(task.task_id)
+            return
+        due_ts = _to_ts(task.due_date)
+        previous = self._entries.get(task.task_id)
+        self._entries[task.task_id] = {
+            "task_id": task.task_id,
+            "name": task.name,
+            "user_id": task.user_id,
+            "status": task.status,
+            "due_date": task.due_date,
+            "due_ts": due_ts
+        }
+        if previous is None or previous["due_ts"] != due_ts:
+            self._overdue.pop(task.task_id, None)
+            heapq.heappush(self._heap, (due_ts, task.task_id))
+        elif task.task_id in self._overdue:
+            self._overdue[task.task_id] = self._entries[task.task_id]
+
+    def _advance(self, now_ts: float) -> List[Dict[str, Any]]:
+        """Pop every deadline at or before now into the overdue map; O(log n) per task"""
+        newly_overdue = []
+        while self._heap and self._heap[0][0] <= now_ts:
+            due_ts, task_id = heapq.heappop(self._heap)
+            entry = self._entries.get(task_id)
+            if entry is None or entry["due_ts"] != due_ts or task_id in self._overdue:
+                continue  # stale heap entry
+            self._overdue[task_id] = entry
+            newly_overdue.append(entry)
+        return newly_overdue
+
+    def _arm_timer(self):
+        """Make sure the scheduler wakes us when the earliest pending deadline passes"""
+        with self._lock:
+            while self._heap:
+                due_ts, task_id = self._heap[0]
+                entry = self._entries.get(task_id)
+                if entry is not None and entry["due_ts"] == due_ts and task_id not in self._overdue:
+                    break
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return
+            next_ts = self._heap[0][0]
+            if self._armed_at is not None and self._armed_at <= next_ts:
+                return
+            self._armed_at = next_ts
+
+        from app.utils.scheduler import get_scheduler
+        get_scheduler().schedule_once("deadline_index", next_ts, self._fire)
+
+    def _fire(self):
+        with self._lock:
+            self._armed_at = None
+            newly_overdue = self._advance(time.time())
+            listeners = list(self._listeners)
+        for entry in newly_overdue:
+            logger.info(f"Task {entry['task_id']} passed its deadline ({entry['due_date']})")
+        if newly_overdue:
+            for callback in listeners:
+                try:
+                    callback(newly_overdue)
+                except Exception as e:
+                    logger.error(f"Overdue listener failed: {e}", exc_info=True)
+        self._arm_timer()
+        return len(newly_overdue)
+
+    def on_overdue(self, callback: Callable[[List[Dict[str, Any]]], None]):
+        """Register a callback receiving the records of tasks that just became overdue"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def overdue(self, statuses: Iterable[str] = None, exclude: Iterable[str] = None,
+                now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Overdue open tasks answered from memory, optionally filtered by status"""
+        self.ensure_seeded()
+        now_ts = _to_ts(now) if now else time.time()
+        statuses = set(statuses) if statuses else None
+        exclude = set(exclude or ())
+        with self._lock:
+            self._advance(now_ts)
+            records = [
+                entry for entry in self._overdue.values()
+                if entry["due_ts"] < now_ts
+                and (statuses is None or entry["status"] in statuses)
+                and entry["status"] not in exclude
+            ]
+        return sorted(records, key=lambda entry: entry["due_ts"])
+
+    def overdue_task_ids(self, statuses: Iterable[str] = None, exclude: Iterable[str] = None) -> List[str]:
+        return [entry["task_id"] for entry in self.overdue(statuses=statuses, exclude=exclude)]
+
+    def next_deadline(self) -> Optional[datetime]:
+        self.ensure_seeded()
+        self._arm_timer()
+        with self._lock:
+            if not self._heap:
+                return None
+            return datetime.fromtimestamp(self._heap[0][0], timezone.utc)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "seeded": self.seeded,
+                "seeded_age_seconds": round(time.time() - self.seeded_at, 1) if self.seeded else None,
+                "open_tasks": len(self._entries),
+                "overdue_tasks": len(self._overdue),
+                "heap_size": len(self._heap)
+            }
+
+# Process-wide index; seeded lazily by the first overdue query
+deadline_index = DeadlineIndex()
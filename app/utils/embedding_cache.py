@@ -0,0 +1,179 @@
+# app/utils/embedding_cache.py
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Sequence
+
+import numpy as np
+from chromadb.api.types import EmbeddingFunction
+
+logger = logging.getLogger(__name__)
+
+GROW_ROWS = 1024  # minimum number of rows added when the vector file grows
+
+def cache_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """On-disk content-addressed embeddings for one model.
+
+    Vectors live in a float32 file accessed through np.memmap; a SQLite table maps
+    key -> row. Writers allocate rows inside a SQLite write transaction, which also
+    serializes growth of the vector file across processes sharing the directory.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._vec_path = os.path.join(directory, "vectors.f32")
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            os.path.join(directory, "index.sqlite"),
+            timeout=30,
+            check_same_thread=False,
+            isolation_level=None  # explicit BEGIN/COMMIT below
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        stored = self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        self.dim = int(stored[0]) if stored else None
+        self._mmap = None
+        self._rows_mapped = 0
+        self.hits = 0
+        self.misses = 0
+        if not os.path.exists(self._vec_path):
+            open(self._vec_path, "ab").close()
+
+    def _map(self, min_rows: int):
+        """(Re)open the memmap when another writer (or we) grew the file past our mapping"""
+        if self._mmap is not None and self._rows_mapped >= min_rows:
+            return
+        rows = os.path.getsize(self._vec_path) // (self.dim * 4)
+        if rows < min_rows:
+            raise RuntimeError(f"Embedding cache {self.directory} is truncated ({rows} < {min_rows} rows)")
+        self._mmap = np.memmap(self._vec_path, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+        self._rows_mapped = rows
+
+    def _lookup(self, keys: Sequence[str]) -> Dict[str, int]:
+        rows = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows.update(self._conn.execute(
+                f"SELECT key, row FROM embeddings WHERE key IN ({placeholders})", chunk
+            ).fetchall())
+        return rows
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Cached vectors for the keys that are present"""
+        with self._lock:
+            if self.dim is None or not keys:
+                self.misses += len(keys)
+                return {}
+            rows = self._lookup(list(keys))
+            if rows:
+                self._map(max(rows.values()) + 1)
+            found = {key: np.array(self._mmap[row]) for key, row in rows.items()}
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            return found
+
+    def put_many(self, keys: Sequence[str], vectors) -> int:
+        """Store vectors for keys not already cached; returns how many were added"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return 0
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.dim is None:
+                    stored = self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+                    self.dim = int(stored[0]) if stored else vectors.shape[1]
+                    self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('dim', ?)", (str(self.dim),))
+                if vectors.shape[1] != self.dim:
+                    raise ValueError(f"Embedding dim {vectors.shape[1]} does not match cache dim {self.dim}")
+
+                existing = self._lookup(list(keys))
+                new = {}
+                for key, vector in zip(keys, vectors):
+                    if key not in existing:
+                        new[key] = vector
+                if not new:
+                    self._conn.execute("COMMIT")
+                    return 0
+
+                start = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM embeddings").fetchone()[0]
+                needed = start + len(new)
+                current_rows = os.path.getsize(self._vec_path) // (self.dim * 4)
+                if current_rows < needed:
+                    with open(self._vec_path, "r+b") as f:
+                        f.truncate(max(needed, current_rows * 2, GROW_ROWS) * self.dim * 4)
+                self._map(needed)
+                self._mmap[start:needed] = np.stack(list(new.values()))
+                self._mmap.flush()
+
+                # Keys become visible only after their vectors are on disk
+                self._conn.executemany(
+                    "INSERT INTO embeddings (key, row) VALUES (?, ?)",
+                    [(key, start + i) for i, key in enumerate(new)]
+                )
+                self._conn.execute("COMMIT")
+                return len(new)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "directory": self.directory,
+            "entries": len(self),
+            "dim": self.dim,
+            "hits": self.hits,
+            "misses": self.misses,
+            "file_bytes": os.path.getsize(self._vec_path)
+        }
+
+class CachedEmbeddingFunction(EmbeddingFunction):
+    """Chroma embedding function that only runs the model for texts not in the cache.
+
+    With read=False every text goes to the model and the cache is only written
+    (forced re-embeds, whose timings should not be cache reads).
+    """
+
+    def __init__(self, embedder, model_name: str, cache: EmbeddingCache, read: bool = True):
+        self.embedder = embedder
+        self.model_name = model_name
+        self.cache = cache
+        self.read = read
+
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        keys = [cache_key(self.model_name, text) for text in input]
+        found = self.cache.get_many(keys) if self.read else {}
+
+        missing = {}
+        for key, text in zip(keys, input):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            computed = self.embedder(list(missing.values()))
+            vectors = np.asarray(computed, dtype=np.float32)
+            try:
+                self.cache.put_many(list(missing), vectors)
+            except Exception as e:
+                # A broken cache must never break embedding
+                logger.warning(f"Could not store embeddings in cache: {e}")
+            found.update(zip(missing, vectors))
+
+        return [found[key] for key in keys]
+
+    def name(self) -> str:
+        # Persisted collections compare embedding function names; report the wrapped one
+        inner = getattr(self.embedder, "name", None)
+        return inner() if callable(inner) else "default"
@@ -0,0 +1,39 @@
+# app/utils/lexical.py
+import math
+import re
+from collections import Counter
+from typing import List
+
+_TOKEN_RE = re.compile(r"[a-z0-9_+#.]+")
+# Field labels of the RAG document format carry no signal
+_STOPWORDS = {"task", "skills", "required", "type", "priority"}
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word/skill tokens; 'python:9' yields 'python' (levels are dropped)"""
+    return [tok for tok in _TOKEN_RE.findall(text.lower().replace(":", " "))
+            if tok not in _STOPWORDS and not tok.isdigit()]
+
+def bm25_scores(query: str, documents: List[str], k1: float = 1.2, b: float = 0.75) -> List[float]:
+    """BM25 of query against each document, with IDF taken from the documents given.
+
+    Meant for re-ranking a small candidate set, not for searching a corpus.
+    """
+    docs = [tokenize(doc or "") for doc in documents]
+    if not docs:
+        return []
+    avg_len = sum(len(doc) for doc in docs) / len(docs) or 1.0
+    df = Counter(tok for doc in docs for tok in set(doc))
+    n = len(docs)
+    query_tokens = set(tokenize(query))
+
+    scores = []
+    for doc in docs:
+        tf = Counter(doc)
+        score = 0.0
+        for tok in query_tokens:
+            if tok not in tf:
+                continue
+            idf = math.log(1 + (n - df[tok] + 0.5) / (df[tok] + 0.5))
+            score += idf * tf[tok] * (k1 + 1) / (tf[tok] + k1 * (1 - b + b * len(doc) / avg_len))
+        scores.append(score)
+    return scores
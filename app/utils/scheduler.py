@@ -0,0 +1,321 @@
+# app/utils/scheduler.py
+import heapq
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Default periodic jobs: name -> interval in seconds
+DEFAULT_JOB_INTERVALS = {
+    "overdue_marking": 86400,
+    "rag_reindex": 3600,
+    "workload_reconciliation": 900,
+    "cache_cleanup": 3600,
+    "deadline_resync": 900,
+    "rag_retention": 86400,
+    "rag_migration": 60
+}
+# Slack added to a periodic job's lease on top of its longest gap between runs
+LEASE_GRACE_SECONDS = 60
+
+@dataclass
+class ScheduledJob:
+    name: str
+    func: Callable
+    interval: float  # seconds between runs, 0 for one-shot jobs
+    jitter: float = 0.1  # +/- fraction of interval applied to every run
+    leader_only: bool = True
+    lease_ttl: float = 300.0
+    next_run: float = 0.0
+    runs: int = 0
+    skipped: int = 0
+    failures: int = 0
+    last_run: Optional[datetime] = None
+    last_duration: float = 0.0
+    last_error: Optional[str] = None
+
+class JobScheduler:
+    """Single background thread running jobs from a heap keyed by next-run time.
+
+    Jobs marked leader_only take a lease in the system_state collection before
+    running, so when several processes run a scheduler only one of them
+    executes each job per interval. The holder keeps the lease until its own
+    next run (renewed while a long run is in progress) and releases it on stop.
+    """
+
+    def __init__(self):
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._heap = []  # (next_run, seq, job_name)
+        self._seq = 0
+        self._jobs: Dict[str, ScheduledJob] = {}
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run_loop, name="job-scheduler", daemon=True)
+            self._thread.start()
+        logger.info(f"Scheduler started ({self.instance_id})")
+
+    def stop(self, timeout: float = 5):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+            jobs = [job for job in self._jobs.values() if job.leader_only]
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        # Let another instance pick the jobs up without waiting for the leases to expire
+        for job in jobs:
+            self._release_lease(job)
+        logger.info("Scheduler stopped")
+
+    def add_job(self, name: str, func: Callable, interval: float, jitter: float = 0.1,
+                initial_delay: float = None, leader_only: bool = True, lease_ttl: float = None) -> ScheduledJob:
+        """Register (or replace) a periodic job"""
+        job = ScheduledJob(
+            name=name,
+            func=func,
+            interval=interval,
+            jitter=jitter,
+            leader_only=leader_only,
+            # Held until the holder's next run, which is at most interval * (1 + jitter) away
+            lease_ttl=lease_ttl if lease_ttl is not None
+            else interval * (1 + jitter) + LEASE_GRACE_SECONDS if interval else 300.0
+        )
+        if initial_delay is None:
+            # Spread first runs so processes started together don't hit Mongo at once
+            initial_delay = random.uniform(0, jitter * interval) if interval else 0
+        self._push(job, time.time() + initial_delay)
+        return job
+
+    def schedule_once(self, name: str, run_at: float, func: Callable, leader_only: bool = False) -> ScheduledJob:
+        """Run func once at the given epoch time; re-scheduling the same name moves it"""
+        job = ScheduledJob(name=name, func=func, interval=0, jitter=0, leader_only=leader_only)
+        self._push(job, run_at)
+        return job
+
+    def remove_job(self, name: str):
+        with self._cond:
+            # Heap entries are dropped lazily when they no longer match a registered job
+            self._jobs.pop(name, None)
+
+    def has_job(self, name: str) -> bool:
+        with self._cond:
+            return name in self._jobs
+
+    def run_now(self, name: str):
+        """Move a registered job to the front of the heap"""
+        with self._cond:
+            job = self._jobs.get(name)
+        if job:
+            self._push(job, time.time())
+
+    def _push(self, job: ScheduledJob, run_at: float):
+        with self._cond:
+            job.next_run = run_at
+            self._jobs[job.name] = job
+            self._seq += 1
+            heapq.heappush(self._heap, (run_at, self._seq, job.name))
+            self._cond.notify_all()
+
+    def _run_loop(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    if self._heap and self._heap[0][0] <= time.time():
+                        break
+                    timeout = self._heap[0][0] - time.time() if self._heap else None
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+                run_at, _, name = heapq.heappop(self._heap)
+                job = self._jobs.get(name)
+                # Stale entry left behind by a reschedule or removal
+                if job is None or job.next_run != run_at:
+                    continue
+
+            self._execute(job)
+
+            if job.interval:
+                spread = job.interval * job.jitter
+                self._push(job, time.time() + job.interval + random.uniform(-spread, spread))
+            else:
+                with self._cond:
+                    if self._jobs.get(job.name) is job and job.next_run == run_at:
+                        del self._jobs[job.name]
+
+    def _execute(self, job: ScheduledJob):
+        if job.leader_only and not self._acquire_lease(job):
+            job.skipped += 1
+            logger.info(f"Job {job.name} skipped: lease held by another instance")
+            return
+
+        done = threading.Event()
+        if job.leader_only:
+            threading.Thread(target=self._keep_lease, args=(job, done), name=f"lease-{job.name}",
+                             daemon=True).start()
+        started = time.time()
+        try:
+            result = job.func()
+            job.runs += 1
+            job.last_error = None
+            logger.info(f"Job {job.name} finished in {time.time() - started:.2f}s: {result}")
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            logger.error(f"Job {job.name} failed: {e}", exc_info=True)
+        finally:
+            job.last_run = datetime.now(timezone.utc)
+            job.last_duration = time.time() - started
+            done.set()
+            if job.leader_only:
+                # Periodic jobs keep the lease until this instance's next run; one-shots hand it back
+                if job.interval:
+                    self._acquire_lease(job)
+                else:
+                    self._release_lease(job)
+
+    def _keep_lease(self, job: ScheduledJob, done: threading.Event):
+        """Renew the lease while a run outlasts a fraction of its TTL"""
+        while not done.wait(max(job.lease_ttl / 3, 1)):
+            if not self._acquire_lease(job):
+                logger.warning(f"Job {job.name} lost its lease while running")
+                return
+
+    def _acquire_lease(self, job: ScheduledJob) -> bool:
+        """Take or renew the process-wide lease for a job; False if someone else holds it"""
+        from mongoengine.errors import NotUniqueError
+        from mongoengine.queryset.visitor import Q
+        from pymongo.errors import DuplicateKeyError
+        from app.models.sample_data import SystemState
+
+        now = datetime.now(timezone.utc)
+        key = f"lease:{job.name}"
+        try:
+            state = SystemState.objects(
+                Q(value__holder=self.instance_id) | Q(value__expires_at__lt=now), key=key
+            ).modify(
+                upsert=True,
+                new=True,
+                # Explicit rather than relying on the server to copy it out of the filter on insert
+                set_on_insert__key=key,
+                set__value={"holder": self.instance_id, "expires_at": now + timedelta(seconds=job.lease_ttl)},
+                set__updated_at=now
+            )
+            return state is not None
+        except (NotUniqueError, DuplicateKeyError):
+            # The upsert lost against an unexpired lease held by another instance
+            return False
+        except Exception as e:
+            logger.error(f"Lease check for {job.name} failed: {e}")
+            return False
+
+    def _release_lease(self, job: ScheduledJob):
+        """Drop the lease if this instance holds it"""
+        from app.models.sample_data import SystemState
+
+        try:
+            SystemState.objects(key=f"lease:{job.name}", value__holder=self.instance_id).delete()
+        except Exception as e:
+            logger.warning(f"Releasing the lease for {job.name} failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            jobs = list(self._jobs.values())
+        return {
+            "instance_id": self.instance_id,
+            "running": self._running,
+            "jobs": {
+                job.name: {
+                    "interval": job.interval,
+                    "next_run": datetime.fromtimestamp(job.next_run, timezone.utc).isoformat(),
+                    "runs": job.runs,
+                    "skipped": job.skipped,
+                    "failures": job.failures,
+                    "last_run": job.last_run.isoformat() if job.last_run else None,
+                    "last_duration": round(job.last_duration, 3),
+                    "last_error": job.last_error
+                } for job in jobs
+            }
+        }
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> JobScheduler:
+    """Return the process-wide scheduler, starting it on first use"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = JobScheduler()
+            _scheduler.start()
+        return _scheduler
+
+def _mark_overdue():
+    from app.utils.task_utils import auto_complete_tasks
+    return auto_complete_tasks()
+
+def _reindex_rag():
+    from app.agents.rag_agent import index_task_history
+    return index_task_history()
+
+def _apply_rag_retention():
+    from app.agents.rag_retention import run_retention
+    return run_retention()
+
+def _step_rag_migration():
+    from app.agents.rag_migration import migration_step
+    return migration_step()
+
+def _reconcile_workloads():
+    from app.utils.task_utils import reconcile_user_workloads
+    return reconcile_user_workloads()
+
+def _cleanup_caches():
+    from app.utils.async_processor import async_processor
+    removed = {"async_tasks": async_processor.cleanup_old_tasks()}
+    try:
+        from app.utils.cache_manager import cache_manager
+        removed["cache_entries"] = cache_manager.purge_expired()
+    except ImportError:
+        # redis client not installed, nothing to clean
+        pass
+    return removed
+
+def _resync_deadlines():
+    from app.utils.deadline_index import deadline_index
+    deadline_index.seed()
+    return deadline_index.get_stats()
+
+def start_background_jobs(intervals: Dict[str, float] = None) -> JobScheduler:
+    """Register the default periodic jobs on the shared scheduler (idempotent)"""
+    intervals = {**DEFAULT_JOB_INTERVALS, **(intervals or {})}
+    scheduler = get_scheduler()
+    for name, func in (
+        ("overdue_marking", _mark_overdue),
+        ("rag_reindex", _reindex_rag),
+        ("workload_reconciliation", _reconcile_workloads),
+        ("cache_cleanup", _cleanup_caches),
+        ("rag_retention", _apply_rag_retention),
+        ("rag_migration", _step_rag_migration)
+    ):
+        if not scheduler.has_job(name):
+            scheduler.add_job(name, func, interval=intervals[name])
+    # The deadline heap is per process and only sees this process's writes, so every
+    # instance re-seeds it (no lease) to pick up changes made elsewhere
+    if not scheduler.has_job("deadline_resync"):
+        scheduler.add_job("deadline_resync", _resync_deadlines, interval=intervals["deadline_resync"],
+                          leader_only=False)
+    return scheduler
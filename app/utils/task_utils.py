@@ -1,14 +1,44 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from app.models.sample_data import SampleUser, SampleUserTask
+from app.utils.deadline_index import deadline_index
 
 # app/utils/task_utils.py
 import logging
 
 logging.basicConfig(level=logging.INFO)
+
+def reserve_user_capacity(user_id: str) -> bool:
+    """Atomically take one task slot; False if the user is unavailable or already full.
+
+    The capacity check and the increment happen in a single Mongo update, so
+    concurrent assignments (parallel supervisor cycles, several processes)
+    can never push a user past max_concurrent_tasks.
+    """
+    updated = SampleUser.objects(__raw__={
+        'user_id': user_id,
+        'availability_status': 'available',
+        '$expr': {'$lt': ['$current_ongoing_tasks', '$max_concurrent_tasks']}
+    }).update_one(
+        inc__current_ongoing_tasks=1,
+        set__updated_at=datetime.now(timezone.utc)
+    )
+    return updated == 1
+
+def release_user_capacity(user_id: str) -> bool:
+    """Atomically give back one task slot (never below zero)"""
+    if not user_id:
+        return False
+    updated = SampleUser.objects(user_id=user_id, current_ongoing_tasks__gt=0).update_one(
+        dec__current_ongoing_tasks=1,
+        set__updated_at=datetime.now(timezone.utc)
+    )
+    return updated == 1
+
 def update_task_assignment(task_id: str, new_user_id: str,
                            new_due_date: datetime = None,
                            status: str = 'in_progress',
                            reason: str = 'assignment') -> str:
+    reserved = saved = False
     try:
         # Validate task exists and is modifiable
         task = SampleUserTask.objects(task_id=task_id).first()
@@ -51,6 +81,12 @@ def update_task_assignment(task_id: str, new_user_id: str,
                 (old_status != 'in_progress' and status == 'in_progress')
         )
 
+        # Reserve the new user's slot before touching the task
+        if needs_workload_update:
+            if not reserve_user_capacity(new_user_id):
+                return f"Error: User {new_user_id} reached capacity before assignment could be saved"
+            reserved = True
+
         # Update task fields
         task.user_id = new_user_id
         task.status = status
@@ -68,22 +104,19 @@ def update_task_assignment(task_id: str, new_user_id: str,
             'reason': reason
         })
         task.save()
+        saved = True
 
         # Update user workloads
-        if old_user_id:
-            old_user = SampleUser.objects(user_id=old_user_id).first()
-            if old_user and old_user_id != new_user_id:
-                old_user.current_ongoing_tasks = max(0, old_user.current_ongoing_tasks - 1)
-                old_user.save()
-
-        if needs_workload_update:
-            new_user.current_ongoing_tasks += 1
-            new_user.save()
+        if old_user_id and old_user_id != new_user_id:
+            release_user_capacity(old_user_id)
 
         return f"Success: Task {task_id} assigned to {new_user_id}"
 
     except Exception as e:
         logging.error(f"Assignment failed: {str(e)}", exc_info=True)
+        # The task never moved: give back the slot taken for it
+        if reserved and not saved:
+            release_user_capacity(new_user_id)
         return f"Error: {str(e)}"
 
 from datetime import datetime
@@ -94,10 +127,9 @@ def check_overdue_tasks():
     """Automatically reassign overdue tasks using CrewAI"""
     from app.agents.crewai_integration import TaskCrew
     crew = TaskCrew()
-    overdue_tasks = SampleUserTask.objects(
-        due_date__lt=datetime.utcnow(),
-        status='in_progress'
-    )
+    # Overdue ids come from the in-memory deadline heap; only those documents are loaded
+    overdue_ids = deadline_index.overdue_task_ids(statuses=['in_progress'])
+    overdue_tasks = SampleUserTask.objects(task_id__in=overdue_ids, status='in_progress') if overdue_ids else []
 
     print(f"\n🔍 Found {len(overdue_tasks)} overdue tasks")
     for task in overdue_tasks:
@@ -123,25 +155,44 @@ def complete_task(task_id: str) -> str:
     return f"Task {task_id} marked completed"
 
 #app/utils/task_utils.py
-from datetime import datetime
-from app.models.sample_data import SampleUserTask
-import threading
-import time
 def auto_complete_tasks():
-    """Background task to auto-complete overdue tasks"""
-    while True:
-        now = datetime.now()
-        overdue = SampleUserTask.objects(
-            due_date__lt=now,
-            status__nin=['completed', 'failed']
-        )
-
-        for task in overdue:
-            # Only handle final status changes here
-            task.status = 'completed'   #if task.progress > 90 else 'failed'
-            task.save()
-
-        time.sleep(86400)  # Run daily
-
-# Start background thread
-threading.Thread(target=auto_complete_tasks, daemon=True).start()
+    """Auto-complete overdue tasks (single pass, run periodically by app.utils.scheduler)"""
+    overdue_ids = deadline_index.overdue_task_ids()
+    if not overdue_ids:
+        return 0
+    overdue = SampleUserTask.objects(task_id__in=overdue_ids, status__nin=['completed', 'failed'])
+
+    updated = 0
+    for task in overdue:
+        # Only handle final status changes here
+        task.status = 'completed'   #if task.progress > 90 else 'failed'
+        task.save()
+        updated += 1
+    return updated
+
+def reconcile_user_workloads():
+    """Recompute current_ongoing_tasks from the in_progress tasks actually assigned to each user"""
+    counts = {
+        row['_id']: row['count']
+        for row in SampleUserTask.objects(status='in_progress', user_id__ne=None).aggregate([
+            {'$group': {'_id': '$user_id', 'count': {'$sum': 1}}}
+        ])
+    }
+
+    fixed = 0
+    for user in SampleUser.objects.only('user_id', 'current_ongoing_tasks'):
+        expected = counts.get(user.user_id, 0)
+        if user.current_ongoing_tasks != expected:
+            # Only overwrite the value we read; a reserve/release in between means the count is live
+            updated = SampleUser.objects(
+                user_id=user.user_id, current_ongoing_tasks=user.current_ongoing_tasks
+            ).update_one(
+                set__current_ongoing_tasks=expected,
+                set__updated_at=datetime.now(timezone.utc)
+            )
+            if not updated:
+                logging.info(f"Skipped reconciling {user.user_id}: workload changed during the pass")
+                continue
+            logging.info(f"Reconciled workload for {user.user_id}: {user.current_ongoing_tasks} -> {expected}")
+            fixed += 1
+    return fixed
@@ -0,0 +1,80 @@
+# benchmarks/bench_bulk_embedding.py
+"""Bulk re-index embedding throughput vs number of worker processes.
+
+Embeds the same synthetic history documents through BulkEmbedder with each
+worker count (the single-process baseline is the plain embedding function)
+and reports texts/s, speedup over one process and pool start-up time. No
+Chroma writes: this isolates the part of a full rebuild that should scale
+with cores.
+
+    python -m benchmarks.bench_bulk_embedding --texts 20000 --workers 1 4 8 16
+"""
+import argparse
+import json
+import os
+import time
+
+from benchmarks.synthetic import generate_tasks
+
+def documents(count):
+    from app.agents.rag_agent import RAGSystem
+    return [RAGSystem._build_row(task)[1] for task in generate_tasks(count, seed=1)]
+
+def single_process(texts, batch_size):
+    from app.agents.rag_registry import _load_embedder, resolve_backend
+    from app.config.enhanced_config import get_config
+
+    model_name = get_config().rag.embedding_model
+    started = time.perf_counter()
+    embedder = _load_embedder(model_name, resolve_backend(model_name))
+    startup = time.perf_counter() - started
+    started = time.perf_counter()
+    for start in range(0, len(texts), batch_size):
+        embedder(texts[start:start + batch_size])
+    return startup, time.perf_counter() - started
+
+def pooled(texts, workers, batch_size):
+    from app.agents.bulk_embedder import BulkEmbedder
+    from app.agents.rag_registry import resolve_backend
+    from app.config.enhanced_config import get_config
+
+    model_name = get_config().rag.embedding_model
+    embedder = BulkEmbedder(model_name, resolve_backend(model_name), workers, chunk_size=batch_size)
+    try:
+        started = time.perf_counter()
+        embedder(texts)
+        return embedder.startup_seconds, time.perf_counter() - started
+    finally:
+        embedder.close()
+
+def run(text_count, worker_counts, batch_size):
+    texts = documents(text_count)
+    report = {"texts": text_count, "batch_size": batch_size, "cpus": os.cpu_count(), "workers": {}}
+    baseline = None
+    for workers in worker_counts:
+        startup, seconds = single_process(texts, batch_size) if workers == 1 else pooled(texts, workers, batch_size)
+        rate = text_count / seconds
+        baseline = baseline or (rate if workers == 1 else None)
+        report["workers"][workers] = {
+            "startup_seconds": round(startup, 2),
+            "seconds": round(seconds, 2),
+            "texts_per_second": round(rate, 1),
+            "speedup": round(rate / baseline, 2) if baseline else None
+        }
+        speedup = f"  x{rate / baseline:.2f}" if baseline else ""
+        print(f"  {workers:>3} workers: {rate:8.1f} texts/s  (start-up {startup:.1f}s){speedup}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    result = run(args.texts, args.workers, args.batch_size)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"📝 Report written to {args.output}")
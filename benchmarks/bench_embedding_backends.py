@@ -0,0 +1,138 @@
+# benchmarks/bench_embedding_backends.py
+"""PyTorch vs ONNX Runtime (fp32 / int8) all-MiniLM-L6-v2: import time, latency, throughput.
+
+Each backend runs in a fresh process so import and model-load times are cold
+(apart from the OS file cache). Vectors are compared with the PyTorch output on
+the same texts: fp32 ONNX should agree to rounding, which is what lets it reuse
+the existing task_history_<hash> collection.
+
+    python -m benchmarks.bench_embedding_backends --texts 2000 --batch-size 64
+
+One run (--texts 1000, 1 CPU core, torch 2.14 / onnxruntime 1.31, chromadb 0.5.23):
+
+    backend    import  load   p50      p95      batched
+    torch      4.86s   0.17s  25.5ms   28.9ms   101 texts/s
+    onnx       0.96s   0.87s  12.7ms   14.1ms    95 texts/s
+    onnx-int8  0.95s   1.99s   6.0ms    6.5ms   203 texts/s
+
+That host could not download the published weights, so it ran a randomly
+initialised model of the same architecture (6 layers, 384 hidden, 12 heads,
+30522-token WordPiece vocab). Timings depend on the architecture, not the
+weights; the int8 cosine (0.99992 there) has to be re-checked on the real model.
+"""
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import random
+import statistics
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_task
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+# Modules each backend needs beyond chromadb; checked before anything is timed
+REQUIRED_MODULES = {"torch": ("sentence_transformers", "torch"), "onnx": ("onnxruntime", "tokenizers"),
+                    "onnx-int8": ("onnxruntime", "tokenizers")}
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+def query_texts(n, seed=3):
+    """Texts shaped like RAGSystem._query_text output"""
+    rng = random.Random(seed)
+    texts = []
+    for i in range(n):
+        task = make_task(i, rng, status='pending')
+        skills_text = ", ".join(f"{skill}:{level}" for skill, level in task.required_skills.items())
+        texts.append(f"Task: {task.name}\nSkills Required: {skills_text}\nType: {task.task_type}\nPriority: {task.priority}")
+    return texts
+
+def measure(args):
+    backend, texts, batch_size, single_queries, threads = args
+    missing = [name for name in REQUIRED_MODULES[backend] if importlib.util.find_spec(name) is None]
+    if missing:
+        raise RuntimeError(f"{backend} needs {', '.join(missing)} installed")
+
+    # Import time covers the runtime the embedder pulls in (sentence-transformers + torch, or onnxruntime)
+    started = time.perf_counter()
+    if backend == "torch":
+        from chromadb.utils import embedding_functions
+        importlib.import_module("sentence_transformers")
+    else:
+        from app.agents.onnx_embedder import OnnxMiniLMEmbeddingFunction
+        importlib.import_module("onnxruntime")
+    import_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if backend == "torch":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        embedder = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=MODEL_NAME)
+    else:
+        embedder = OnnxMiniLMEmbeddingFunction(quantized=backend == "onnx-int8", threads=threads)
+    embedder(["warm up"])
+    load_seconds = time.perf_counter() - started
+
+    latencies = []
+    for text in texts[:single_queries]:
+        started = time.perf_counter()
+        embedder([text])
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+
+    started = time.perf_counter()
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embedder(texts[start:start + batch_size]))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "import_seconds": round(import_seconds, 3),
+        "load_seconds": round(load_seconds, 3),
+        "query_p50_ms": round(statistics.median(latencies), 2),
+        "query_p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+        "texts_per_second": round(len(texts) / elapsed, 1),
+        "vectors": np.asarray(vectors, dtype=np.float32)
+    }
+
+def run(backends, text_count, batch_size, single_queries, threads):
+    texts = query_texts(text_count)
+    report = {"model": MODEL_NAME, "texts": text_count, "batch_size": batch_size, "threads": threads, "backends": {}}
+    ctx = multiprocessing.get_context("spawn")
+    reference = None
+    for backend in backends:
+        print(f"⏱️  Measuring {backend}...")
+        with ctx.Pool(1) as pool:
+            row = pool.apply(measure, ((backend, texts, batch_size, single_queries, threads),))
+        vectors = row.pop("vectors")
+        if backend == "torch":
+            reference = vectors
+        if reference is not None:
+            # Rows are unit length, so the dot product is the cosine similarity
+            cosine = np.sum(reference * vectors, axis=1)
+            row["cosine_vs_torch_min"] = round(float(cosine.min()), 5)
+            row["cosine_vs_torch_mean"] = round(float(cosine.mean()), 5)
+        report["backends"][backend] = row
+        agreement = f"  cos≥{row['cosine_vs_torch_min']}" if "cosine_vs_torch_min" in row else ""
+        print(f"  {backend:<10} import {row['import_seconds']:.2f}s  load {row['load_seconds']:.2f}s  "
+              f"p50 {row['query_p50_ms']:.1f}ms  p95 {row['query_p95_ms']:.1f}ms  "
+              f"{row['texts_per_second']:.0f} texts/s{agreement}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--single-queries", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads (0 = library default)")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    result = run(args.backends, args.texts, args.batch_size, args.single_queries, args.threads)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"📝 Report written to {args.output}")
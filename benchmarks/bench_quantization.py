@@ -0,0 +1,119 @@
+# benchmarks/bench_quantization.py
+"""Memory saved and recall@k lost by int8 / PCA storage, with and without float re-rank.
+
+Vectors are synthetic but shaped like sentence embeddings (a few hundred
+topic clusters in a low-rank subspace plus noise, unit length), because
+PCA on isotropic random vectors would say nothing useful. The float32 matrix
+lives in a temporary memmap file; ground truth is an exact chunked scan.
+
+    python -m benchmarks.bench_quantization --rows 1000000 --queries 100
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.agents.quantization import make_quantizer, rerank_top_k
+
+CHUNK = 65536
+FIT_ROWS = 50_000
+
+def embedding_like_vectors(n, dim, seed, clusters=300, rank=48):
+    # Topic structure is fixed (seed 0); only the sampling depends on seed, so chunks share it
+    structure = np.random.default_rng(0)
+    basis = structure.standard_normal((rank, dim)).astype(np.float32)
+    centres = structure.standard_normal((clusters, rank)).astype(np.float32) * 2.0
+    rng = np.random.default_rng(seed + 1)
+    labels = rng.integers(0, clusters, n)
+    vectors = (centres[labels] + rng.standard_normal((n, rank)).astype(np.float32)) @ basis
+    vectors += 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def exact_top_k(matrix, queries, k):
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_rows = np.zeros((len(queries), k), dtype=np.int64)
+    for start in range(0, len(matrix), CHUNK):
+        scores = queries @ np.asarray(matrix[start:start + CHUNK]).T
+        merged_scores = np.concatenate([best_scores, scores], axis=1)
+        merged_rows = np.concatenate([best_rows, np.arange(start, start + scores.shape[1])[None, :].repeat(len(queries), 0)], axis=1)
+        top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(merged_scores, top, 1)
+        best_rows = np.take_along_axis(merged_rows, top, 1)
+    return [set(rows) for rows in best_rows]
+
+def run(rows, dim, query_count, k, pca_dims, rerank_factor):
+    report = {"rows": rows, "dim": dim, "queries": query_count, "k": k, "rerank_factor": rerank_factor,
+              "float32_bytes": rows * dim * 4, "storages": {}}
+    with tempfile.TemporaryDirectory() as path:
+        matrix = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="w+", shape=(rows, dim))
+        print(f"📦 Generating {rows} x {dim} vectors...")
+        for start in range(0, rows, CHUNK):
+            stop = min(start + CHUNK, rows)
+            matrix[start:stop] = embedding_like_vectors(stop - start, dim, seed=start)
+        matrix.flush()
+
+        # Queries are perturbed copies of stored rows, like a new task close to past ones
+        rng = np.random.default_rng(99)
+        queries = np.asarray(matrix[rng.integers(0, rows, query_count)]) + 0.05 * rng.standard_normal((query_count, dim)).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        truth = exact_top_k(matrix, queries, k)
+
+        def fetch(idx):
+            order = np.argsort(idx)
+            out = np.empty((len(idx), dim), dtype=np.float32)
+            out[order] = matrix[idx[order]]
+            return out
+
+        variants = [("int8", None)] + [("pca", d) for d in pca_dims]
+        for kind, pca_dim in variants:
+            label = kind if pca_dim is None else f"pca{pca_dim}"
+            quantizer = make_quantizer(kind, pca_dim or 64).fit(np.asarray(matrix[:min(rows, FIT_ROWS)]))
+            started = time.perf_counter()
+            codes = np.concatenate([quantizer.encode(matrix[s:s + CHUNK]) for s in range(0, rows, CHUNK)])
+            encode_seconds = time.perf_counter() - started
+
+            recall_plain, recall_rerank, latencies = [], [], []
+            for query, expected in zip(queries, truth):
+                started = time.perf_counter()
+                approx = quantizer.scores(query[None, :], codes)
+                (top_rows, _), = rerank_top_k(query[None, :], approx, fetch, k, k * rerank_factor)
+                latencies.append((time.perf_counter() - started) * 1000)
+                recall_rerank.append(len(expected & set(top_rows.tolist())) / k)
+                plain = np.argpartition(-approx[0], k - 1)[:k]
+                recall_plain.append(len(expected & set(plain.tolist())) / k)
+
+            report["storages"][label] = {
+                "scan_bytes": int(codes.nbytes),
+                "memory_saved_pct": round(100 * (1 - codes.nbytes / report["float32_bytes"]), 1),
+                "recall_at_k_no_rerank": round(statistics.mean(recall_plain), 4),
+                "recall_at_k_rerank": round(statistics.mean(recall_rerank), 4),
+                "query_p50_ms": round(statistics.median(latencies), 2),
+                "encode_seconds": round(encode_seconds, 2)
+            }
+            row = report["storages"][label]
+            print(f"  {label:<7} {row['scan_bytes'] / 2**20:>8.1f} MiB ({row['memory_saved_pct']}% saved)  "
+                  f"recall@{k} {row['recall_at_k_no_rerank']:.3f} -> {row['recall_at_k_rerank']:.3f} re-ranked  "
+                  f"p50 {row['query_p50_ms']:.1f}ms")
+            del codes
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--pca-dims", type=int, nargs="+", default=[64, 128])
+    parser.add_argument("--rerank-factor", type=int, default=10)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    result = run(args.rows, args.dim, args.queries, args.top_k, args.pca_dims, args.rerank_factor)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"📝 Report written to {args.output}")
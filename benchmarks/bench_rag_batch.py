@@ -0,0 +1,95 @@
+# benchmarks/bench_rag_batch.py
+"""Single-task vs batched similarity retrieval at batch sizes 1/16/128.
+
+Builds a scratch Chroma collection and NumPy index from synthetic history in a
+temporary directory (nothing touches ./chroma_db, ./vector_index or MongoDB)
+and uses the raw SentenceTransformer function, so the embedding cache does not
+hide model inference. The query result cache and the exact skill-set lookup
+are off, so every timed run embeds and searches (the loop would otherwise
+warm the cache for the batch call, and repeats would measure cache hits).
+
+    python -m benchmarks.bench_rag_batch --history 5000 --repeat 3
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import chromadb
+from chromadb.utils import embedding_functions
+
+from app.agents.rag_agent import RAGSystem
+from app.config.enhanced_config import get_config
+from app.utils.result_cache import VersionedLRUCache
+from benchmarks.synthetic import generate_tasks
+
+BATCH_SIZES = (1, 16, 128)
+
+def build_system(history_size, model_name, path):
+    embedder = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name)
+    rag = RAGSystem(client=chromadb.PersistentClient(path=path), embedder=embedder, model_name=model_name,
+                    index_dir=os.path.join(path, "vector_index"))
+    # Nothing kept between runs: every call pays for embedding and search
+    rag.result_cache = VersionedLRUCache(max_entries=0)
+    rows = [rag._build_row(task) for task in generate_tasks(history_size, seed=1)]
+    for i in range(0, len(rows), 1000):
+        chunk = rows[i:i + 1000]
+        documents = [r[1] for r in chunk]
+        # Embeddings passed explicitly, as RAGSystem does when indexing
+        rag.collection.upsert([r[0] for r in chunk], documents, [r[2] for r in chunk],
+                              embeddings=embedder(documents))
+    return rag
+
+def run(history_size, repeat, top_k):
+    rag_config = get_config().rag
+    model_name = rag_config.embedding_model
+    # Exact skill-set hits skip the vector search for most synthetic tasks
+    rag_config.signature_lookup = False
+    with tempfile.TemporaryDirectory() as path:
+        print(f"📦 Indexing {history_size} synthetic tasks into a scratch collection...")
+        rag = build_system(history_size, model_name, path)
+        report = {"history_size": history_size, "model": model_name, "top_k": top_k, "batches": {}}
+
+        for size in BATCH_SIZES:
+            queries = generate_tasks(size, seed=size, status='pending', offset=10_000_000)
+            single_times, batch_times = [], []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                single = [rag.retrieve_similar_tasks(task, top_k) for task in queries]
+                single_times.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                batched = rag.retrieve_similar_tasks_batch(queries, top_k)
+                batch_times.append(time.perf_counter() - started)
+
+            single_s, batch_s = statistics.median(single_times), statistics.median(batch_times)
+            report["batches"][size] = {
+                "single_loop_seconds": round(single_s, 4),
+                "batch_seconds": round(batch_s, 4),
+                "per_task_ms_single": round(single_s / size * 1000, 2),
+                "per_task_ms_batch": round(batch_s / size * 1000, 2),
+                "speedup": round(single_s / batch_s, 2) if batch_s else None,
+                # Same ids and scores for every task, whichever API produced them
+                "identical_results": [[(r["task_id"], r["score"]) for r in res] for res in single]
+                                     == [[(r["task_id"], r["score"]) for r in res] for res in batched]
+            }
+            row = report["batches"][size]
+            print(f"  batch={size:>4}: loop {row['single_loop_seconds']:.3f}s, batch {row['batch_seconds']:.3f}s "
+                  f"(x{row['speedup']}), identical={row['identical_results']}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    result = run(args.history, args.repeat, args.top_k)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"📝 Report written to {args.output}")
@@ -0,0 +1,362 @@
+# benchmarks/bench_rag_harness.py
+"""Release benchmark for the task history store: indexing, latency, recall, memory.
+
+For each history size a seeded synthetic completed-task history (same skill
+mix as the sample data) is embedded once and written into a temporary Chroma
+path, one collection per hnsw:space. Every build and every query run happens
+in a fresh process, so throughput and resident memory are not shared between
+configurations. recall@k is measured against brute-force cosine top-k over
+the same vectors.
+
+The raw Chroma numbers show index cost alone. The same history is also
+loaded through RAGSystem once per --rag-backends entry (chroma / numpy, the
+rest of the rag config as set: storage, signature lookup, result cache,
+decay, hybrid) and queried with retrieve_similar_tasks, which is what
+assignments actually pay. Query vectors are precomputed in both paths.
+
+    python -m benchmarks.bench_rag_harness --sizes 10000 100000 --output report.json
+    python -m benchmarks.bench_rag_harness --sizes 1000000 --embeddings synthetic
+    python -m benchmarks.bench_rag_harness --compare last_release.json --output report.json
+    python -m benchmarks.bench_rag_harness --sizes 10000 --rag-backends numpy
+
+--embeddings model runs the configured embedding model (realistic vectors, slow
+at 1M rows); synthetic uses structured random vectors (see synthetic.py).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.bench_rag_retrieval import percentile
+from benchmarks.bench_vector_backends import rss_mb
+from benchmarks.synthetic import generate_tasks, synthetic_embeddings
+
+INSERT_BATCH = 5000  # below Chroma's max batch size
+EMBED_BATCH = 256
+TRUTH_CHUNK = 100_000
+HISTORY_SEED = 1
+QUERY_SEED = 7
+
+def embed(texts):
+    """(vectors, seconds) for the given texts, with the configured model and backend.
+
+    Uses the raw embedding function: the embedding cache would hide inference on reruns.
+    """
+    from app.agents.rag_registry import _load_embedder, resolve_backend
+    from app.config.enhanced_config import get_config
+
+    model_name = get_config().rag.embedding_model
+    embedder = _load_embedder(model_name, resolve_backend(model_name))
+    started = time.perf_counter()
+    vectors = []
+    for start in range(0, len(texts), EMBED_BATCH):
+        vectors.extend(embedder(texts[start:start + EMBED_BATCH]))
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True), time.perf_counter() - started
+
+def history_vectors(size, mode, path):
+    """Embed the synthetic history once per size; saved as .npy for the worker processes"""
+    from app.agents.rag_agent import RAGSystem
+
+    tasks = generate_tasks(size, seed=HISTORY_SEED)
+    if mode == "model":
+        vectors, seconds = embed([RAGSystem._build_row(task)[1] for task in tasks])
+    else:
+        started = time.perf_counter()
+        vectors = synthetic_embeddings(tasks, noise_seed=HISTORY_SEED)
+        seconds = time.perf_counter() - started
+    vectors_path = os.path.join(path, f"history_{size}.npy")
+    np.save(vectors_path, vectors)
+    return vectors_path, seconds
+
+def query_vectors(count, mode):
+    from app.agents.rag_agent import RAGSystem
+
+    queries = generate_tasks(count, seed=QUERY_SEED, status='pending', offset=10_000_000)
+    if mode == "model":
+        vectors, seconds = embed([RAGSystem._query_text(task) for task in queries])
+        return vectors, seconds / count * 1000
+    return synthetic_embeddings(queries, noise_seed=QUERY_SEED), 0.0
+
+def brute_force_top_k(vectors_path, queries, k):
+    """Exact cosine top-k ids (row indexes) per query, scanning the history in chunks"""
+    history = np.load(vectors_path, mmap_mode="r")
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+    for start in range(0, len(history), TRUTH_CHUNK):
+        scores = queries @ np.asarray(history[start:start + TRUTH_CHUNK]).T
+        rows = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+        scores = np.concatenate([best_scores, scores], axis=1)
+        rows = np.concatenate([best_rows, rows], axis=1)
+        keep = np.argsort(-scores, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, keep, axis=1)
+        best_rows = np.take_along_axis(rows, keep, axis=1)
+    return best_rows
+
+def collection_name(space):
+    return f"bench_history_{space}"
+
+def build(args):
+    """Worker: insert the saved history into a fresh collection; returns throughput"""
+    import chromadb
+    from app.agents.rag_agent import RAGSystem
+
+    chroma_path, space, size, vectors_path = args
+    vectors = np.load(vectors_path, mmap_mode="r")
+    client = chromadb.PersistentClient(path=chroma_path)
+    collection = client.create_collection(collection_name(space), metadata={"hnsw:space": space},
+                                          embedding_function=None)
+    tasks = generate_tasks(size, seed=HISTORY_SEED)
+    started = time.perf_counter()
+    for start in range(0, size, INSERT_BATCH):
+        rows = [RAGSystem._build_row(task) for task in tasks[start:start + INSERT_BATCH]]
+        collection.add(
+            ids=[row[0] for row in rows],
+            documents=[row[1] for row in rows],
+            metadatas=[row[2] for row in rows],
+            embeddings=np.asarray(vectors[start:start + len(rows)]).tolist()
+        )
+    seconds = time.perf_counter() - started
+    return {"insert_seconds": round(seconds, 2), "insert_rows_per_second": round(size / seconds, 1)}
+
+def measure(args):
+    """Worker: open the persisted collection cold, run the queries for every k"""
+    import chromadb
+
+    chroma_path, space, query_path, ks, truth_path = args
+    baseline = rss_mb()
+    started = time.perf_counter()
+    collection = chromadb.PersistentClient(path=chroma_path).get_collection(
+        collection_name(space), embedding_function=None)
+    collection.count()
+    open_seconds = time.perf_counter() - started
+
+    queries = np.load(query_path)
+    truth = np.load(truth_path)
+    result = {"open_seconds": round(open_seconds, 3), "k": {}}
+    for k in ks:
+        latencies, recalls = [], []
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            found = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+            latencies.append((time.perf_counter() - started) * 1000)
+            # Synthetic ids are S<row>, so ids map straight back to history rows
+            got = {int(task_id[1:]) for task_id in found["ids"][0]}
+            recalls.append(len(got & set(expected[:k].tolist())) / k)
+        result["k"][k] = {
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "recall_at_k": round(float(np.mean(recalls)), 4)
+        }
+    result["rss_mb"] = round(rss_mb(), 1)
+    result["rss_delta_mb"] = round(rss_mb() - baseline, 1)
+    return result
+
+class QueryVectors:
+    """Embedding function answering from precomputed vectors, so RAG timings exclude the model"""
+
+    def __init__(self, texts=(), vectors=()):
+        self.vectors = dict(zip(texts, vectors))
+
+    def __call__(self, input):
+        return [self.vectors[text] for text in input]
+
+    def name(self) -> str:
+        return "precomputed"
+
+def open_rag(path, backend, embedder):
+    """RAGSystem over a scratch Chroma path and NumPy dir, pinned to one vector backend"""
+    import chromadb
+    from app.agents.rag_agent import RAGSystem
+    from app.config.enhanced_config import get_config
+
+    rag_config = get_config().rag
+    # Only ever called in a worker process, so pinning the backend leaves the caller's config alone
+    rag_config.vector_backend = backend
+    return RAGSystem(client=chromadb.PersistentClient(path=os.path.join(path, "chroma")), embedder=embedder,
+                     model_name=rag_config.embedding_model, index_dir=os.path.join(path, "vector_index"))
+
+def build_rag(args):
+    """Worker: load the saved history through RAGSystem's store for one backend"""
+    from app.agents.rag_agent import RAGSystem
+
+    path, backend, size, vectors_path = args
+    vectors = np.load(vectors_path, mmap_mode="r")
+    rag = open_rag(path, backend, QueryVectors())
+    tasks = generate_tasks(size, seed=HISTORY_SEED)
+    started = time.perf_counter()
+    for start in range(0, size, INSERT_BATCH):
+        rows = [RAGSystem._build_row(task) for task in tasks[start:start + INSERT_BATCH]]
+        rag.collection.upsert([row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows],
+                              embeddings=np.asarray(vectors[start:start + len(rows)]))
+    seconds = time.perf_counter() - started
+    return {"insert_seconds": round(seconds, 2), "insert_rows_per_second": round(size / seconds, 1)}
+
+def measure_rag(args):
+    """Worker: open RAGSystem cold and time retrieve_similar_tasks for every k"""
+    from app.agents.rag_agent import RAGSystem
+
+    path, backend, query_path, ks, truth_path = args
+    queries = np.load(query_path)
+    truth = np.load(truth_path)
+    tasks = generate_tasks(len(queries), seed=QUERY_SEED, status='pending', offset=10_000_000)
+    baseline = rss_mb()
+    started = time.perf_counter()
+    rag = open_rag(path, backend, QueryVectors([RAGSystem._query_text(task) for task in tasks], queries))
+    rag.collection.count()
+    result = {"backend": rag.collection.name, "open_seconds": round(time.perf_counter() - started, 3), "k": {}}
+    for k in ks:
+        latencies, recalls = [], []
+        for task, expected in zip(tasks, truth):
+            started = time.perf_counter()
+            found = rag.retrieve_similar_tasks(task, top_k=k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            # Re-ranking (decay, hybrid, exact skill-set hits) moves results away from pure cosine
+            got = {int(record["task_id"][1:]) for record in found}
+            recalls.append(len(got & set(expected[:k].tolist())) / k)
+        result["k"][k] = {
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "recall_at_k": round(float(np.mean(recalls)), 4)
+        }
+    result["rss_mb"] = round(rss_mb(), 1)
+    result["rss_delta_mb"] = round(rss_mb() - baseline, 1)
+    return result
+
+def environment():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                  text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    try:
+        import chromadb
+        chroma_version = chromadb.__version__
+    except ImportError:
+        chroma_version = None
+    return {
+        "git_revision": revision,
+        "chromadb": chroma_version,
+        "numpy": np.__version__,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+def run(sizes, spaces, ks, query_count, mode, rag_backends=()):
+    report = {"environment": environment(), "embeddings": mode, "queries": query_count,
+              "top_k": ks, "spaces": spaces, "rag_backends": list(rag_backends), "sizes": {}}
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as path:
+        queries, query_embed_ms = query_vectors(query_count, mode)
+        query_path = os.path.join(path, "queries.npy")
+        np.save(query_path, queries)
+        report["query_embedding_ms"] = round(query_embed_ms, 2)
+
+        for size in sizes:
+            print(f"📦 Embedding {size} synthetic tasks ({mode})...")
+            vectors_path, embed_seconds = history_vectors(size, mode, path)
+            truth_path = os.path.join(path, f"truth_{size}.npy")
+            np.save(truth_path, brute_force_top_k(vectors_path, queries, max(ks)))
+            row = {"embedding_seconds": round(embed_seconds, 2),
+                   "embedding_rows_per_second": round(size / embed_seconds, 1) if embed_seconds else None,
+                   "spaces": {}, "rag": {}}
+
+            for space in spaces:
+                chroma_path = os.path.join(path, f"chroma_{size}_{space}")
+                with ctx.Pool(1) as pool:
+                    built = pool.apply(build, ((chroma_path, space, size, vectors_path),))
+                with ctx.Pool(1) as pool:
+                    measured = pool.apply(measure, ((chroma_path, space, query_path, ks, truth_path),))
+                measured.update(built)
+                indexing_seconds = embed_seconds + built["insert_seconds"]
+                measured["indexing_rows_per_second"] = round(size / indexing_seconds, 1)
+                row["spaces"][space] = measured
+                print(f"  {size:>8} {space:<6} index {measured['indexing_rows_per_second']:.0f} rows/s  "
+                      f"RSS {measured['rss_mb']}MB")
+                for k, stats in measured["k"].items():
+                    print(f"           k={k:<3} p50 {stats['p50_ms']:.2f}ms  p95 {stats['p95_ms']:.2f}ms  "
+                          f"p99 {stats['p99_ms']:.2f}ms  recall@k {stats['recall_at_k']:.3f}")
+
+            for backend in rag_backends:
+                rag_path = os.path.join(path, f"rag_{size}_{backend}")
+                with ctx.Pool(1) as pool:
+                    built = pool.apply(build_rag, ((rag_path, backend, size, vectors_path),))
+                with ctx.Pool(1) as pool:
+                    measured = pool.apply(measure_rag, ((rag_path, backend, query_path, ks, truth_path),))
+                measured.update(built)
+                row["rag"][backend] = measured
+                print(f"  {size:>8} RAGSystem/{measured['backend']:<6} open {measured['open_seconds']:.2f}s  "
+                      f"RSS {measured['rss_mb']}MB")
+                for k, stats in measured["k"].items():
+                    print(f"           k={k:<3} p50 {stats['p50_ms']:.2f}ms  p95 {stats['p95_ms']:.2f}ms  "
+                          f"p99 {stats['p99_ms']:.2f}ms  recall@k {stats['recall_at_k']:.3f}")
+            report["sizes"][str(size)] = row
+            os.remove(vectors_path)
+    return report
+
+def compare(report, baseline):
+    """Print per-configuration changes against an earlier report"""
+    print(f"\n📊 Against {baseline['environment'].get('git_revision')} "
+          f"({baseline['environment'].get('timestamp')}):")
+    for size, row in report["sizes"].items():
+        for space, stats in row["spaces"].items():
+            old_space = baseline.get("sizes", {}).get(size, {}).get("spaces", {}).get(space)
+            if not old_space:
+                continue
+            for k, current in stats["k"].items():
+                old = old_space["k"].get(str(k)) or old_space["k"].get(k)
+                if not old:
+                    continue
+                deltas = ", ".join(
+                    f"{metric} {old[metric]} → {current[metric]} ({(current[metric] - old[metric]) / old[metric]:+.0%})"
+                    for metric in ("p50_ms", "p99_ms", "recall_at_k") if old[metric]
+                )
+                print(f"  {size:>8} {space:<6} k={k:<3} {deltas}")
+            print(f"  {size:>8} {space:<6} RSS {old_space['rss_mb']} → {stats['rss_mb']}MB, "
+                  f"index {old_space['indexing_rows_per_second']} → {stats['indexing_rows_per_second']} rows/s")
+        for backend, stats in row.get("rag", {}).items():
+            old_rag = baseline.get("sizes", {}).get(size, {}).get("rag", {}).get(backend)
+            if not old_rag:
+                continue
+            for k, current in stats["k"].items():
+                old = old_rag["k"].get(str(k)) or old_rag["k"].get(k)
+                if not old:
+                    continue
+                deltas = ", ".join(
+                    f"{metric} {old[metric]} → {current[metric]} ({(current[metric] - old[metric]) / old[metric]:+.0%})"
+                    for metric in ("p50_ms", "p99_ms", "recall_at_k") if old[metric]
+                )
+                print(f"  {size:>8} rag/{backend:<6} k={k:<3} {deltas}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--spaces", nargs="+", choices=["cosine", "l2", "ip"], default=["cosine"])
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--embeddings", choices=["model", "synthetic"], default="model")
+    parser.add_argument("--rag-backends", nargs="*", choices=["chroma", "numpy"], default=["chroma", "numpy"],
+                        help="also measure retrieval through RAGSystem with these vector backends")
+    parser.add_argument("--compare", help="earlier JSON report to diff against")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    result = run(args.sizes, args.spaces, args.top_k, args.queries, args.embeddings, args.rag_backends)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"📝 Report written to {args.output}")
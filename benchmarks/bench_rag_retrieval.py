@@ -0,0 +1,102 @@
+# benchmarks/bench_rag_retrieval.py
+"""Latency and recall of vector-only, metadata pre-filtered and hybrid retrieval.
+
+Builds a scratch collection from synthetic history, then runs the same queries
+in four modes. recall@k is measured against an exact (brute-force cosine)
+top-k over the same filtered slice; domain precision@k counts results from the
+query's own skill domain, which is what hybrid re-ranking tries to improve.
+
+    python -m benchmarks.bench_rag_retrieval --history 20000 --queries 200
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.utils.result_cache import VersionedLRUCache
+from benchmarks.bench_rag_batch import build_system
+from benchmarks.synthetic import generate_tasks
+from app.config.enhanced_config import get_config
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def exact_top_k(query_vec, matrix, ids, mask, k):
+    scores = matrix[mask] @ query_vec
+    candidate_ids = ids[mask]
+    order = np.argsort(-scores)[:k]
+    return set(candidate_ids[order])
+
+def run(history_size, query_count, top_k, hybrid_weight):
+    model_name = get_config().rag.embedding_model
+    with tempfile.TemporaryDirectory() as path:
+        print(f"📦 Indexing {history_size} synthetic tasks into a scratch collection...")
+        rag = build_system(history_size, model_name, path)
+        # Measure the search itself, not the result cache
+        rag.result_cache = VersionedLRUCache(max_entries=0)
+
+        stored = rag.collection.get(include=["embeddings", "metadatas"])
+        ids = np.array(stored["ids"])
+        matrix = np.asarray(stored["embeddings"], dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        task_types = np.array([meta["task_type"] for meta in stored["metadatas"]])
+        domains = {task.task_id: task.domain for task in generate_tasks(history_size, seed=1)}
+
+        queries = generate_tasks(query_count, seed=7, status='pending', offset=10_000_000)
+        query_vecs = np.asarray(rag.embedder([rag._query_text(q) for q in queries]), dtype=np.float32)
+        query_vecs /= np.linalg.norm(query_vecs, axis=1, keepdims=True)
+
+        modes = {
+            "vector": lambda q: ({}, 0.0),
+            "prefiltered": lambda q: ({"task_type": q.task_type}, 0.0),
+            "hybrid": lambda q: ({}, hybrid_weight),
+            "prefiltered_hybrid": lambda q: ({"task_type": q.task_type}, hybrid_weight)
+        }
+        report = {"history_size": history_size, "queries": query_count, "top_k": top_k,
+                  "hybrid_weight": hybrid_weight, "modes": {}}
+
+        for mode, params in modes.items():
+            latencies, recalls, precisions, searched = [], [], [], []
+            for query, query_vec in zip(queries, query_vecs):
+                filters, weight = params(query)
+                started = time.perf_counter()
+                results = rag.retrieve_similar_tasks(query, top_k, filters=filters or None, hybrid_weight=weight)
+                latencies.append((time.perf_counter() - started) * 1000)
+
+                mask = task_types == query.task_type if filters else np.ones(len(ids), dtype=bool)
+                searched.append(float(mask.mean()))
+                truth = exact_top_k(query_vec, matrix, ids, mask, top_k)
+                got = [r["task_id"] for r in results]
+                recalls.append(len(truth & set(got)) / len(truth) if truth else 1.0)
+                precisions.append(sum(domains.get(t) == query.domain for t in got) / top_k)
+
+            report["modes"][mode] = {
+                "p50_ms": round(statistics.median(latencies), 2),
+                "p95_ms": round(percentile(latencies, 95), 2),
+                "recall_at_k": round(statistics.mean(recalls), 3),
+                "domain_precision_at_k": round(statistics.mean(precisions), 3),
+                "searched_fraction": round(statistics.mean(searched), 3)
+            }
+            row = report["modes"][mode]
+            print(f"  {mode:<19} p50 {row['p50_ms']:>7.2f}ms  p95 {row['p95_ms']:>7.2f}ms  "
+                  f"recall@{top_k} {row['recall_at_k']:.3f}  domain precision {row['domain_precision_at_k']:.3f}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--hybrid-weight", type=float, default=0.3)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    result = run(args.history, args.queries, args.top_k, args.hybrid_weight)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"📝 Report written to {args.output}")
@@ -0,0 +1,117 @@
+# benchmarks/bench_vector_backends.py
+"""NumPy memmap backend vs Chroma PersistentClient: startup, query latency, RSS.
+
+Both stores are filled with the same random unit vectors (so the numbers show
+index cost, not model inference) and every measurement runs in a fresh
+process, so startup time and resident memory are not shared between backends.
+
+    python -m benchmarks.bench_vector_backends --sizes 10000 50000 100000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import generate_tasks
+
+COLLECTION = "bench_history"
+INSERT_BATCH = 5000  # below Chroma's max batch size
+
+def rss_mb():
+    """Current resident set size (falls back to peak RSS off Linux)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def random_unit_vectors(n, dim, seed):
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def prepare(path, size, dim):
+    import chromadb
+    from app.agents.vector_backends import ChromaBackend, NumpyBackend
+
+    tasks = generate_tasks(size, seed=1)
+    vectors = random_unit_vectors(size, dim, seed=1)
+    chroma = ChromaBackend(chromadb.PersistentClient(path=os.path.join(path, "chroma")).get_or_create_collection(
+        COLLECTION, metadata={"hnsw:space": "cosine"}, embedding_function=None))
+    numpy_backend = NumpyBackend(os.path.join(path, "numpy"), embedder=None)
+    for start in range(0, size, INSERT_BATCH):
+        chunk = tasks[start:start + INSERT_BATCH]
+        ids = [t.task_id for t in chunk]
+        docs = [t.name for t in chunk]
+        metas = [{"task_type": t.task_type, "priority": t.priority} for t in chunk]
+        for backend in (chroma, numpy_backend):
+            backend.upsert(ids, docs, metas, embeddings=vectors[start:start + INSERT_BATCH])
+
+def measure(args):
+    backend_name, path, dim, query_count, top_k = args
+    baseline = rss_mb()
+    started = time.perf_counter()
+    if backend_name == "chroma":
+        import chromadb
+        from app.agents.vector_backends import ChromaBackend
+        backend = ChromaBackend(chromadb.PersistentClient(path=os.path.join(path, "chroma")).get_collection(
+            COLLECTION, embedding_function=None))
+    else:
+        from app.agents.vector_backends import NumpyBackend
+        backend = NumpyBackend(os.path.join(path, "numpy"), embedder=None)
+    backend.count()
+    startup = time.perf_counter() - started
+
+    queries = random_unit_vectors(query_count, dim, seed=2)
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        backend.query(query_embeddings=[query], n_results=top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        "startup_seconds": round(startup, 3),
+        "query_p50_ms": round(statistics.median(latencies), 3),
+        "query_p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 3),
+        "rss_mb": round(rss_mb(), 1),
+        "rss_delta_mb": round(rss_mb() - baseline, 1)
+    }
+
+def run(sizes, dim, query_count, top_k):
+    report = {"dim": dim, "queries": query_count, "top_k": top_k, "sizes": {}}
+    ctx = multiprocessing.get_context("spawn")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as path:
+            print(f"📦 Building both stores with {size} vectors...")
+            prepare(path, size, dim)
+            report["sizes"][size] = {}
+            for backend_name in ("chroma", "numpy"):
+                with ctx.Pool(1) as pool:
+                    row = pool.apply(measure, ((backend_name, path, dim, query_count, top_k),))
+                report["sizes"][size][backend_name] = row
+                print(f"  {size:>8} {backend_name:<7} startup {row['startup_seconds']:.3f}s  "
+                      f"p50 {row['query_p50_ms']:.2f}ms  p95 {row['query_p95_ms']:.2f}ms  RSS {row['rss_mb']}MB")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    result = run(args.sizes, args.dim, args.queries, args.top_k)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"📝 Report written to {args.output}")
@@ -0,0 +1,69 @@
+# benchmarks/synthetic.py
+import random
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+# Same skill vocabulary as the sample data (app/models/sample_data.py)
+SKILL_DOMAINS = {
+    'frontend': {'javascript': 9, 'react': 8, 'typescript': 7},
+    'backend': {'python': 9, 'nodejs': 8, 'mongodb': 7},
+    'devops': {'docker': 9, 'kubernetes': 8, 'aws': 7},
+    'data': {'python': 8, 'machine_learning': 9, 'pytorch': 7},
+    'mobile': {'swift': 8, 'kotlin': 7, 'flutter': 6},
+    'qa': {'selenium': 8, 'cypress': 7, 'postman': 6}
+}
+VERBS = ['Build', 'Refactor', 'Migrate', 'Fix', 'Optimize', 'Test', 'Deploy', 'Document', 'Redesign', 'Audit']
+NOUNS = ['dashboard', 'auth service', 'payment flow', 'search API', 'cluster', 'ML pipeline',
+         'offline mode', 'crash reporter', 'load tests', 'data warehouse', 'notification service', 'CI pipeline']
+TASK_TYPES = ['feature', 'bug', 'research', 'maintenance']
+PRIORITIES = ['low', 'medium', 'high']
+
+def make_task(i, rng, status='completed'):
+    """One task-like object carrying every field the RAG code reads"""
+    domain = rng.choice(list(SKILL_DOMAINS))
+    skills = {skill: max(1, level + rng.randint(-2, 1)) for skill, level in SKILL_DOMAINS[domain].items()
+              if rng.random() < 0.85} or dict(SKILL_DOMAINS[domain])
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(days=rng.randint(0, 600))
+    started = created + timedelta(days=rng.randint(0, 5))
+    return SimpleNamespace(
+        task_id=f"S{i:07d}",
+        domain=domain,  # relevance label for recall/precision checks
+        name=f"{rng.choice(VERBS)} {domain} {rng.choice(NOUNS)} {i % 97}",
+        required_skills=skills,
+        task_type=rng.choice(TASK_TYPES),
+        priority=rng.choice(PRIORITIES),
+        status=status,
+        user_id=f"U{rng.randint(1, 200):04d}",
+        created_at=created,
+        started_at=started,
+        completed_at=started + timedelta(days=rng.randint(1, 30)) if status == 'completed' else None,
+        actual_effort_hours=float(rng.randint(2, 120)),
+        assignment_log=[]
+    )
+
+def generate_tasks(n, seed=42, status='completed', offset=0):
+    rng = random.Random(seed)
+    return [make_task(offset + i, rng, status) for i in range(n)]
+
+def synthetic_embeddings(tasks, dim=384, seed=0, noise_seed=1):
+    """Deterministic unit vectors with the structure of real task embeddings.
+
+    Each vector mixes a domain direction, one direction per required skill
+    (weighted by level), a task-type direction and noise, so neighbours share
+    domain and skills. Lets the harness scale to 1M rows without model inference.
+    Use the same seed (basis) for history and queries and different noise seeds.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    skills = sorted({skill for domain in SKILL_DOMAINS.values() for skill in domain})
+    basis = {key: rng.standard_normal(dim).astype(np.float32)
+             for key in list(SKILL_DOMAINS) + skills + TASK_TYPES}
+    noise = np.random.default_rng(noise_seed)
+    vectors = np.empty((len(tasks), dim), dtype=np.float32)
+    for i, task in enumerate(tasks):
+        vector = 2.0 * basis[task.domain] + 0.5 * basis[task.task_type]
+        for skill, level in task.required_skills.items():
+            vector = vector + (level / 10.0) * basis[skill]
+        vectors[i] = vector + 1.5 * noise.standard_normal(dim)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
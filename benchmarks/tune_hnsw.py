@@ -0,0 +1,172 @@
+# benchmarks/tune_hnsw.py
+"""Sweep HNSW parameters on the current task history and recommend the cheapest that meets targets.
+
+The stored embeddings of the active collection are exported once (no model
+inference). A sample of rows is held out as queries; the rest is inserted
+into a temporary Chroma collection per (M, construction_ef, search_ef)
+combination, each built and measured in fresh processes. recall@k is
+measured against brute-force cosine top-k over the same rows.
+
+    python -m benchmarks.tune_hnsw --target-recall 0.95 --target-p95-ms 5
+    python -m benchmarks.tune_hnsw --m 8 16 32 --search-ef 10 40 100 --output tune.json
+
+"Cheapest" means the smallest M (memory), then construction_ef (build time),
+then search_ef (query time) that meets both targets. The result prints as
+RAG_HNSW_* settings; they apply to new collections and at the next compaction.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_rag_harness import brute_force_top_k, environment
+from benchmarks.bench_rag_retrieval import percentile
+
+INSERT_BATCH = 5000  # below Chroma's max batch size
+QUERY_SEED = 7
+
+def export_history(path, max_rows=None):
+    """Stored (normalised) embeddings of the active collection, saved as .npy; returns (path, ids)"""
+    from app.agents.rag_registry import get_rag_system
+
+    rag_system = get_rag_system()
+    if rag_system is None:
+        raise SystemExit("❌ RAG system not initialized")
+    ids, vectors = [], []
+    for page in rag_system.collection.export_batches():
+        ids.extend(page["ids"])
+        vectors.extend(page["embeddings"])
+        if max_rows and len(ids) >= max_rows:
+            break
+    if max_rows:
+        ids, vectors = ids[:max_rows], vectors[:max_rows]
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    vectors_path = os.path.join(path, "history.npy")
+    np.save(vectors_path, vectors)
+    return vectors_path, ids
+
+def split_queries(vectors_path, query_count, path):
+    """Hold out query rows so no query finds itself; returns (index vectors path, queries)"""
+    vectors = np.load(vectors_path)
+    rng = np.random.default_rng(QUERY_SEED)
+    held_out = rng.choice(len(vectors), size=min(query_count, len(vectors) // 10), replace=False)
+    if not len(held_out):
+        raise SystemExit("❌ History too small to tune on")
+    mask = np.ones(len(vectors), dtype=bool)
+    mask[held_out] = False
+    index_path = os.path.join(path, "index.npy")
+    np.save(index_path, vectors[mask])
+    return index_path, vectors[held_out]
+
+def collection_metadata(m, construction_ef, search_ef):
+    return {"hnsw:space": "cosine", "hnsw:M": m, "hnsw:construction_ef": construction_ef,
+            "hnsw:search_ef": search_ef}
+
+def build(args):
+    """Worker: insert the held-in rows into a fresh collection with the given parameters"""
+    import chromadb
+
+    chroma_path, name, metadata, vectors_path = args
+    vectors = np.load(vectors_path, mmap_mode="r")
+    collection = chromadb.PersistentClient(path=chroma_path).create_collection(
+        name, metadata=metadata, embedding_function=None)
+    started = time.perf_counter()
+    for start in range(0, len(vectors), INSERT_BATCH):
+        chunk = np.asarray(vectors[start:start + INSERT_BATCH])
+        collection.add(ids=[str(start + i) for i in range(len(chunk))], embeddings=chunk.tolist())
+    return round(time.perf_counter() - started, 2)
+
+def measure(args):
+    """Worker: open the collection cold and query it; latency and recall@k"""
+    import chromadb
+
+    chroma_path, name, query_path, truth_path, k = args
+    collection = chromadb.PersistentClient(path=chroma_path).get_collection(name, embedding_function=None)
+    queries = np.load(query_path)
+    truth = np.load(truth_path)
+    collection.query(query_embeddings=[queries[0].tolist()], n_results=k, include=[])  # load the segment
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        found = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+        latencies.append((time.perf_counter() - started) * 1000)
+        got = {int(row_id) for row_id in found["ids"][0]}
+        recalls.append(len(got & set(expected[:k].tolist())) / k)
+    return {
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "recall_at_k": round(float(np.mean(recalls)), 4)
+    }
+
+def sweep(ms, construction_efs, search_efs, k, query_count, max_rows):
+    report = {"environment": environment(), "top_k": k, "results": []}
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as path:
+        print("📦 Exporting stored embeddings...")
+        vectors_path, ids = export_history(path, max_rows)
+        index_path, queries = split_queries(vectors_path, query_count, path)
+        query_path = os.path.join(path, "queries.npy")
+        np.save(query_path, queries)
+        truth_path = os.path.join(path, "truth.npy")
+        np.save(truth_path, brute_force_top_k(index_path, queries, k))
+        report.update(rows=len(ids) - len(queries), queries=len(queries))
+        print(f"   {report['rows']} rows, {report['queries']} held-out queries, k={k}")
+
+        for m, construction_ef, search_ef in itertools.product(ms, construction_efs, search_efs):
+            name = f"tune_{m}_{construction_ef}_{search_ef}"
+            chroma_path = os.path.join(path, name)
+            metadata = collection_metadata(m, construction_ef, search_ef)
+            with ctx.Pool(1) as pool:
+                build_seconds = pool.apply(build, ((chroma_path, name, metadata, index_path),))
+            with ctx.Pool(1) as pool:
+                measured = pool.apply(measure, ((chroma_path, name, query_path, truth_path, k),))
+            row = {"m": m, "construction_ef": construction_ef, "search_ef": search_ef,
+                   "build_seconds": build_seconds, **measured}
+            report["results"].append(row)
+            print(f"  M={m:<3} construction_ef={construction_ef:<4} search_ef={search_ef:<4} "
+                  f"build {build_seconds:.1f}s  p95 {measured['p95_ms']:.2f}ms  "
+                  f"recall@{k} {measured['recall_at_k']:.3f}")
+    return report
+
+def recommend(results, target_recall, target_p95_ms):
+    """Cheapest setting meeting both targets, or None"""
+    meeting = [row for row in results
+               if row["recall_at_k"] >= target_recall and (not target_p95_ms or row["p95_ms"] <= target_p95_ms)]
+    if not meeting:
+        return None
+    return min(meeting, key=lambda row: (row["m"], row["construction_ef"], row["search_ef"]))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--m", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--search-ef", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--max-rows", type=int, help="tune on the first N rows only")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--target-p95-ms", type=float, default=0.0, help="0 = no latency target")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    result = sweep(args.m, args.construction_ef, args.search_ef, args.top_k, args.queries, args.max_rows)
+    best = recommend(result["results"], args.target_recall, args.target_p95_ms)
+    result["targets"] = {"recall_at_k": args.target_recall, "p95_ms": args.target_p95_ms}
+    result["recommended"] = best
+    if best:
+        print(f"\n✅ Recommended (recall@{args.top_k} {best['recall_at_k']:.3f}, p95 {best['p95_ms']:.2f}ms):")
+        print(f"   RAG_HNSW_M={best['m']}\n   RAG_HNSW_CONSTRUCTION_EF={best['construction_ef']}\n"
+              f"   RAG_HNSW_SEARCH_EF={best['search_ef']}")
+        print("   Applied to new collections and at the next compaction (RAG Maintenance → Compact now)")
+    else:
+        print("\n❌ No setting met the targets; widen the sweep or relax --target-recall / --target-p95-ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"📝 Report written to {args.output}")
@@ -0,0 +1,10 @@
+# tests/conftest.py
+try:
+    import mongoengine
+except ImportError:
+    mongoengine = None
+
+if mongoengine is not None:
+    # app.models.sample_data connects to the configured cluster at import; keep the suite
+    # offline. Tests that need Mongo connect to mongomock through mongoengine.connection.
+    mongoengine.connect = lambda *args, **kwargs: None
@@ -0,0 +1,57 @@
+# tests/test_chroma_reopen.py
+import hashlib
+
+import pytest
+
+chromadb = pytest.importorskip("chromadb")
+pytest.importorskip("mongoengine")
+pytest.importorskip("pydantic")
+
+from chromadb.utils import embedding_functions
+
+from app.agents.rag_agent import RAGSystem
+from app.agents.rag_registry import embedding_identity
+
+MODEL = "all-MiniLM-L6-v2"
+
+def fake_embedder(texts):
+    """Deterministic 8-d vectors; enough to check the right rows come back"""
+    vectors = []
+    for text in texts:
+        digest = hashlib.sha1(text.encode()).digest()
+        vectors.append([byte / 255.0 + 0.01 for byte in digest[:8]])
+    return vectors
+
+@pytest.fixture
+def client(tmp_path):
+    return chromadb.PersistentClient(path=str(tmp_path / "chroma_db"))
+
+def collection_name():
+    # torch and fp32 ONNX share one collection
+    return f"task_history_{hashlib.md5(embedding_identity(MODEL, 'torch').encode()).hexdigest()[:8]}"
+
+def test_reopen_collection_created_with_another_function(client, tmp_path):
+    # An older build persisted the ONNX function's name on the shared collection
+    client.get_or_create_collection(
+        collection_name(), embedding_function=embedding_functions.ONNXMiniLM_L6_V2(),
+        metadata={"hnsw:space": "cosine"})
+
+    rag = RAGSystem(client=client, embedder=fake_embedder, model_name=MODEL, embedding_backend="torch",
+                    index_dir=str(tmp_path / "vector_index"))
+    assert rag.collection_name == collection_name()
+    rag.collection.upsert(["a"], ["deploy api"], [{"task_type": "t"}])
+    assert rag.collection.query(query_texts=["deploy api"], n_results=1)["ids"][0] == ["a"]
+
+def test_backend_embeds_without_a_collection_function(client, tmp_path):
+    rag = RAGSystem(client=client, embedder=fake_embedder, model_name=MODEL, embedding_backend="torch",
+                    index_dir=str(tmp_path / "vector_index"))
+    documents = ["deploy api", "fix login bug", "write docs"]
+    rag.chroma_collection.upsert(ids=["a", "b", "c"], documents=documents,
+                                 metadatas=[{"task_type": "t"}] * 3, embeddings=fake_embedder(documents))
+
+    # Reopening in a second process must not trip Chroma's embedding function check
+    reopened = RAGSystem(client=chromadb.PersistentClient(path=str(tmp_path / "chroma_db")),
+                         embedder=fake_embedder, model_name=MODEL, embedding_backend="torch",
+                         index_dir=str(tmp_path / "vector_index"))
+    results = reopened.collection.query(query_texts=["fix login bug"], n_results=1)
+    assert results["ids"][0] == ["b"]
@@ -0,0 +1,57 @@
+# tests/test_index_queue.py
+import pytest
+
+pytest.importorskip("pydantic")
+
+from app.agents.index_queue import IndexQueue
+
+class NoProcessor:
+    """Stands in for the AsyncProcessor; tests call flush() themselves"""
+
+    def start(self):
+        pass
+
+    def submit_task(self, func, *args, **kwargs):
+        return None
+
+@pytest.fixture
+def queue():
+    queue = IndexQueue(flush_seconds=3600, max_batch=10, processor=NoProcessor())
+    yield queue
+    with queue._lock:
+        if queue._timer is not None:
+            queue._timer.cancel()
+
+def test_failed_flush_requeues_the_batch(queue, monkeypatch):
+    for task_id in ("T1", "T2", "T3"):
+        queue.enqueue(task_id)
+    enqueued_at = dict(queue._pending)
+
+    def fail(task_ids):
+        raise RuntimeError("chroma unavailable")
+    monkeypatch.setattr(queue, "_index_batch", fail)
+
+    assert queue.flush() == {"tasks": 0, "upserted": 0, "skipped": 0}
+    assert queue.failures == 1
+    # Same tasks, same enqueue times (freshness lag keeps counting from the completion)
+    assert dict(queue._pending) == enqueued_at
+    assert queue._timer is not None
+
+    indexed = []
+    def succeed(task_ids):
+        indexed.extend(task_ids)
+        return {"tasks": len(task_ids), "upserted": len(task_ids), "skipped": 0}
+    monkeypatch.setattr(queue, "_index_batch", succeed)
+
+    assert queue.flush()["tasks"] == 3
+    assert indexed == ["T1", "T2", "T3"]
+    assert queue.pending_count() == 0
+
+def test_enqueue_coalesces_repeated_completions(queue, monkeypatch):
+    batches = []
+    monkeypatch.setattr(queue, "_index_batch",
+                        lambda task_ids: batches.append(task_ids) or {"tasks": len(task_ids), "upserted": 0, "skipped": 0})
+    for task_id in ("T1", "T2", "T1", "T1"):
+        queue.enqueue(task_id)
+    queue.flush()
+    assert batches == [["T1", "T2"]]
@@ -0,0 +1,62 @@
+# tests/test_scheduler_lease.py
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.utils.scheduler import LEASE_GRACE_SECONDS, JobScheduler
+
+def test_lease_outlives_the_gap_between_runs():
+    scheduler = JobScheduler()
+    job = scheduler.add_job("daily", lambda: None, interval=86400, jitter=0.1)
+    # The holder's next run can be up to interval * (1 + jitter) away
+    assert job.lease_ttl >= 86400 * 1.1 + LEASE_GRACE_SECONDS - 1e-6
+    assert scheduler.add_job("custom", lambda: None, interval=60, lease_ttl=5).lease_ttl == 5
+
+@pytest.fixture
+def system_state():
+    connection = pytest.importorskip("mongoengine.connection")
+    mongomock = pytest.importorskip("mongomock")
+    from app.models.sample_data import SystemState
+
+    # mongoengine.connect itself is a no-op under tests (see conftest.py)
+    connection.disconnect()
+    connection.connect("scheduler_test", mongo_client_class=mongomock.MongoClient, tz_aware=True)
+    SystemState.objects().delete()
+    yield SystemState
+    connection.disconnect()
+
+def expire(system_state, name):
+    system_state.objects(key=f"lease:{name}").update_one(
+        set__value__expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+
+def test_lease_expiry_hands_the_job_over(system_state):
+    first, second = JobScheduler(), JobScheduler()
+    job = first.add_job("nightly", lambda: None, interval=3600)
+
+    assert first._acquire_lease(job)
+    assert not second._acquire_lease(job)
+    assert first._acquire_lease(job)  # renewal by the holder
+
+    expire(system_state, "nightly")
+    assert second._acquire_lease(job)
+    assert not first._acquire_lease(job)
+
+def test_holder_keeps_lease_after_run_and_releases_on_stop(system_state):
+    first, second = JobScheduler(), JobScheduler()
+    runs = []
+    job = first.add_job("report", lambda: runs.append(1), interval=3600)
+    other = second.add_job("report", lambda: runs.append(2), interval=3600)
+
+    first._execute(job)
+    second._execute(other)
+    assert runs == [1]
+    assert other.skipped == 1
+
+    first.stop()
+    second._execute(other)
+    assert runs == [1, 2]
+
+def test_one_shot_job_releases_its_lease(system_state):
+    first, second = JobScheduler(), JobScheduler()
+    first._execute(first.schedule_once("once", 0, lambda: None, leader_only=True))
+    assert second._acquire_lease(second.schedule_once("once", 0, lambda: None, leader_only=True))
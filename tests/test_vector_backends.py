@@ -0,0 +1,87 @@
+# tests/test_vector_backends.py
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.agents.quantization import make_quantizer
+from app.agents.vector_backends import NumpyBackend
+
+DIM = 16
+
+def unit_vectors(n, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def fill(backend, n, seed=0):
+    vectors = unit_vectors(n, seed)
+    ids = [f"T{i:04d}" for i in range(n)]
+    metadatas = [{"task_type": "bug" if i % 2 else "feature", "skills_count": i % 5, "user_id": f"U{i % 3}"}
+                 for i in range(n)]
+    backend.upsert(ids, [f"doc {i}" for i in range(n)], metadatas, embeddings=vectors)
+    return ids, vectors
+
+def exact_top_k(vectors, query, k, rows=None):
+    rows = np.arange(len(vectors)) if rows is None else np.asarray(rows)
+    scores = vectors[rows] @ query
+    return [f"T{r:04d}" for r in rows[np.argsort(-scores)[:k]]]
+
+@pytest.fixture
+def backend(tmp_path):
+    return NumpyBackend(str(tmp_path / "index"), embedder=None)
+
+def test_query_matches_brute_force(backend):
+    ids, vectors = fill(backend, 200)
+    found = backend.query(query_embeddings=[vectors[7]], n_results=5)
+    assert found["ids"][0] == exact_top_k(vectors, vectors[7], 5)
+    assert found["ids"][0][0] == "T0007"
+    assert found["distances"][0][0] == pytest.approx(0.0, abs=1e-5)
+    assert found["documents"][0][0] == "doc 7"
+
+def test_where_filter(backend):
+    _, vectors = fill(backend, 200)
+    where = {"$and": [{"task_type": "bug"}, {"skills_count": {"$gte": 3}}]}
+    found = backend.query(query_embeddings=[vectors[0]], n_results=10, where=where)
+    allowed = [i for i in range(200) if i % 2 and i % 5 >= 3]
+    assert found["ids"][0] == exact_top_k(vectors, vectors[0], 10, allowed)
+    assert all(meta["task_type"] == "bug" and meta["skills_count"] >= 3 for meta in found["metadatas"][0])
+
+    got = backend.get(where={"task_type": {"$in": ["feature"]}}, include=["metadatas"])
+    assert len(got["ids"]) == 100
+
+def test_upsert_replaces_existing_row(backend):
+    ids, vectors = fill(backend, 50)
+    backend.upsert(["T0003"], ["changed"], [{"task_type": "bug"}], embeddings=[vectors[10]])
+    assert backend.count() == 50
+    assert backend.get(ids=["T0003"], include=["documents"])["documents"] == ["changed"]
+
+def test_delete_and_compact(backend, tmp_path):
+    ids, vectors = fill(backend, 100)
+    backend.delete(ids[:40])
+    assert backend.count() == 60
+    found = backend.query(query_embeddings=[vectors[0]], n_results=5)
+    assert not set(found["ids"][0]) & set(ids[:40])
+
+    result = backend.compact()
+    assert result["after"]["rows"] == 60
+    assert backend.query(query_embeddings=[vectors[0]], n_results=5)["ids"] == found["ids"]
+
+    # Another process opening the directory sees the compacted index
+    reopened = NumpyBackend(str(tmp_path / "index"), embedder=None)
+    assert reopened.count() == 60
+    assert reopened.query(query_embeddings=[vectors[55]], n_results=1)["ids"][0] == ["T0055"]
+
+@pytest.mark.parametrize("storage", ["int8", "pca"])
+def test_quantized_storage_reranks_to_exact(tmp_path, storage):
+    backend = NumpyBackend(str(tmp_path / storage), embedder=None, storage=storage, pca_dim=8, rerank_factor=20)
+    _, vectors = fill(backend, 1500)
+    for row in (0, 700, 1499):
+        found = backend.query(query_embeddings=[vectors[row]], n_results=3)
+        assert found["ids"][0][0] == f"T{row:04d}"
+
+@pytest.mark.parametrize("kind", ["int8", "pca"])
+def test_quantizer_scores_track_cosine(kind):
+    vectors = unit_vectors(500, seed=1)
+    quantizer = make_quantizer(kind, pca_dim=DIM).fit(vectors)
+    approx = quantizer.scores(vectors[:5], quantizer.encode(vectors))
+    exact = vectors[:5] @ vectors.T
+    assert np.corrcoef(approx.ravel(), exact.ravel())[0, 1] > 0.95